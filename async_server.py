@@ -0,0 +1,244 @@
+"""
+VPS监控服务端（asyncio 模式，基于 aiohttp）
+与 server.py 共用存储、告警和通知逻辑：
+- /api/status 在事件循环中接收，数据库写入交给单独的写线程串行执行，通知作为后台任务发送
+- 其余接口（Web界面、历史查询、导出等）通过 WSGI 桥接到 server.py 的 Flask 应用，在线程池中执行
+慢速或大量空闲的客户端连接只占用协程，不占用线程。
+
+用法：
+    pip install aiohttp
+    python async_server.py [--host 0.0.0.0] [--port 9000] [--db monitor.db]
+"""
+import argparse
+import asyncio
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+import server
+
+logger = server.logger
+
+# 断联检测间隔（秒）：不再在每次上报时检测，改为后台定期执行
+CHECK_INTERVAL = 10
+# 转发给 Flask 应用的接口使用的线程数
+WSGI_THREADS = 8
+
+# 数据库写线程：所有上报写入在这一个线程中串行执行，事件循环从不阻塞在 SQLite 上
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+# 通知线程：PushPlus 请求和断联检测，慢速的外部请求不影响写入
+_notifier = ThreadPoolExecutor(max_workers=4, thread_name_prefix='notify')
+_wsgi_pool = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix='wsgi')
+# 保存后台任务的引用，避免任务未完成就被回收
+_background_tasks = set()
+
+def _spawn(awaitable):
+    task = asyncio.ensure_future(awaitable)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+async def receive_status(request):
+    """接收VPS状态信息（与 server.receive_status 的请求和响应格式一致）"""
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        data = await request.json()
+
+        # 验证密钥
+        if data.get('key') != server.SERVER_KEY:
+            return web.json_response({"error": "Invalid key"}, status=401)
+
+        status_data = data.get('data')
+        if not status_data:
+            return web.json_response({"error": "No data provided"}, status=400)
+        hostname = status_data.get('hostname')
+        if not server.owns_host(hostname):
+            return web.json_response({"error": "Host belongs to another shard",
+                                      "shard": server.shard_for(hostname or '', server.SHARD_COUNT)}, status=421)
+
+        # 在事件循环中占排队名额，已满时立即拒绝，不再往写线程里堆积
+        reserved_at = server.ingest_gate.reserve()
+        is_new_vps, fired, anomalies = await loop.run_in_executor(_writer, server.admitted_ingest,
+                                                                  status_data, reserved_at)
+        if is_new_vps or fired or anomalies:
+            _spawn(loop.run_in_executor(_notifier, server.send_report_notifications,
+                                        status_data, is_new_vps, fired, anomalies))
+
+        server.incr('http.status.200')
+        interval = server.suggested_report_interval()
+        return web.json_response({"success": True, "message": "Status received", "report_interval": interval},
+                                 headers={'X-Report-Interval': str(interval)})
+
+    except server.Overloaded as e:
+        server.incr(f'http.status.{e.status}')
+        return web.json_response({"error": "Server busy", "retry_after": e.retry_after}, status=e.status,
+                                 headers={'Retry-After': str(e.retry_after),
+                                          'X-Report-Interval': str(server.suggested_report_interval())})
+    except Exception as e:
+        logger.error("接收状态错误: %s", e, exc_info=True)
+        server.incr('ingest.errors')
+        return web.json_response({"error": str(e)}, status=500)
+    finally:
+        server.observe('http.receive_status', (time.perf_counter() - started) * 1000)
+
+def _wsgi_environ(request, body):
+    """由 aiohttp 请求构造 WSGI environ"""
+    host, _, port = (request.host or 'localhost').partition(':')
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'SCRIPT_NAME': '',
+        # WSGI 要求路径为按 latin-1 解码的原始字节
+        'PATH_INFO': request.path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': request.query_string,
+        'CONTENT_TYPE': request.headers.get('Content-Type', ''),
+        'CONTENT_LENGTH': str(len(body)),
+        'SERVER_NAME': host,
+        'SERVER_PORT': port or ('443' if request.secure else '80'),
+        'SERVER_PROTOCOL': f"HTTP/{request.version.major}.{request.version.minor}",
+        'REMOTE_ADDR': request.remote or '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': request.scheme,
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in request.headers.items():
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        if key in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+            continue
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def _run_flask(environ, loop, chunks, cancelled):
+    """在线程池中调用 Flask 应用并逐块取出响应体，经由 asyncio 队列交给事件循环
+
+    流式响应的生成器持有 SQLite 连接，必须在同一线程内迭代完，因此整个响应都在这个线程里产生。
+    队列有界：客户端读得慢时这里等待，不会把整个响应堆在内存里。
+    """
+    def put(item):
+        asyncio.run_coroutine_threadsafe(chunks.put(item), loop).result()
+
+    def start_response(status, headers, exc_info=None):
+        put(('start', int(status.split(' ', 1)[0]), headers))
+
+    result = None
+    try:
+        result = server.app(environ, start_response)
+        for chunk in result:
+            if cancelled.is_set():
+                break
+            if chunk:
+                put(('chunk', chunk))
+    except Exception as e:
+        put(('error', e))
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+        put(('end', None))
+
+# 由 aiohttp 自行处理的逐跳响应头
+_HOP_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'content-length'}
+
+async def wsgi_fallback(request):
+    """其余接口转发给 Flask 应用；只有一块数据的响应直接返回，流式响应（历史查询、导出）逐块转发"""
+    loop = asyncio.get_running_loop()
+    body = await request.read()
+    chunks = asyncio.Queue(maxsize=8)
+    cancelled = threading.Event()
+    worker = loop.run_in_executor(_wsgi_pool, _run_flask, _wsgi_environ(request, body), loop, chunks, cancelled)
+    try:
+        kind, *item = await chunks.get()
+        if kind != 'start':
+            raise item[0] if kind == 'error' else RuntimeError("WSGI application did not start a response")
+        status, headers = item
+        headers = [(name, value) for name, value in headers if name.lower() not in _HOP_HEADERS]
+        
+        first = await chunks.get()
+        following = await chunks.get() if first[0] == 'chunk' else first
+        if following[0] != 'chunk':
+            if following[0] == 'error':
+                raise following[1]
+            return web.Response(status=status, headers=headers, body=first[1] if first[0] == 'chunk' else b'')
+        
+        response = web.StreamResponse(status=status, headers=headers)
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        await response.write(first[1])
+        while following[0] == 'chunk':
+            await response.write(following[1])
+            following = await chunks.get()
+        if following[0] == 'error':
+            # 响应头已发出，只能中断连接
+            raise following[1]
+        await response.write_eof()
+        return response
+    finally:
+        # 客户端断开或出错时通知工作线程停止，并腾出队列空间让它退出
+        cancelled.set()
+        while not chunks.empty():
+            chunks.get_nowait()
+        await worker
+
+async def connection_checker(app):
+    """后台定期检查断联状态"""
+    loop = asyncio.get_running_loop()
+
+    async def run():
+        while True:
+            try:
+                await loop.run_in_executor(_notifier, server.check_connection_status)
+            except Exception as e:
+                logger.error("后台检查错误: %s", e, exc_info=True)
+            await asyncio.sleep(CHECK_INTERVAL)
+
+    task = asyncio.create_task(run())
+    yield
+    task.cancel()
+
+def create_app():
+    app = web.Application(client_max_size=4 * 1024 * 1024)
+    app.router.add_post('/api/status', receive_status)
+    app.router.add_route('*', '/{tail:.*}', wsgi_fallback)
+    app.cleanup_ctx.append(connection_checker)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description='VPS监控服务端（asyncio 模式）')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=server.SERVER_PORT)
+    parser.add_argument('--db', help='数据库文件（默认使用 config.json 中的 db_file）')
+    parser.add_argument('--no-notify', action='store_true', help='不发送启动通知')
+    parser.add_argument('--shard', help='作为分片节点运行，格式 序号/总数（如 0/3），只接收哈希到本分片的主机')
+    args = parser.parse_args()
+
+    server.setup_logging()
+    if args.db:
+        server.DB_FILE = args.db
+    if args.shard:
+        try:
+            index, count = (int(part) for part in args.shard.split('/'))
+        except ValueError:
+            parser.error('--shard 格式应为 序号/总数，如 0/3')
+        if not 0 <= index < count:
+            parser.error('--shard 序号必须小于总数')
+        server.SHARD_INDEX, server.SHARD_COUNT = index, count
+        logger.info("分片节点 %d/%d", server.SHARD_INDEX, server.SHARD_COUNT)
+    server.init_database()
+    server.load_host_cache()
+    if not args.no_notify:
+        threading.Thread(target=server.send_startup_notification, daemon=True).start()
+
+    logger.info("监控服务器启动（asyncio 模式）")
+    logger.info("访问 http://localhost:%s 查看监控界面", args.port)
+    web.run_app(create_app(), host=args.host, port=args.port, backlog=4096, access_log=None,
+                print=None, shutdown_timeout=5)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+上报接口对比：分别以 Flask 多线程模式（server.py）和 asyncio 模式（async_server.py）启动服务端，
+在同一份合成数据库上测量 /api/status 的吞吐、延迟，以及大量慢速/空闲连接下的内存和线程数
+
+用法：
+    python benchmarks/ingest_compare.py --concurrency 50 --idle 5000 --duration 15
+    python benchmarks/ingest_compare.py --modes async --idle 20000
+
+场景：
+    active  并发 --concurrency 个连接不间断上报
+    idle    先建立 --idle 个只发送了一半请求头、之后每隔几秒补一行的慢速连接，再运行 active
+大量连接需要足够的文件描述符（ulimit -n）。
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import aiohttp
+import psutil
+
+from synthetic import git_commit, percentiles, sample_report, seed_database, server
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+# Flask 模式：与 server.py 的 __main__ 相同，只是换了数据库和端口
+FLASK_BOOTSTRAP = """
+import sys
+sys.path.insert(0, {repo!r})
+import server
+server.DB_FILE = {db!r}
+server.setup_logging()
+server.init_database()
+server.load_host_cache()
+server.app.run(host='127.0.0.1', port={port}, threaded=True)
+"""
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(mode, db_file, port, workdir):
+    """以子进程启动服务端，等到端口可连接后返回 Popen"""
+    if mode == 'flask':
+        command = [sys.executable, '-c', FLASK_BOOTSTRAP.format(repo=REPO_DIR, db=db_file, port=port)]
+    else:
+        command = [sys.executable, os.path.join(REPO_DIR, 'async_server.py'),
+                   '--host', '127.0.0.1', '--port', str(port), '--db', db_file, '--no-notify']
+    # 日志文件写到工作目录，不污染仓库
+    process = subprocess.Popen(command, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError(f"{mode} 服务端启动失败（退出码 {process.returncode}）")
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{mode} 服务端启动超时")
+
+def process_usage(process):
+    info = psutil.Process(process.pid)
+    return {'rss_mb': round(info.memory_info().rss / 2**20, 1), 'threads': info.num_threads()}
+
+async def poster(session, url, hosts, deadline, samples, errors, seed):
+    """一个连接：不间断上报，直到 deadline"""
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        payload = {"key": server.SERVER_KEY, "data": sample_report(rng, rng.randrange(hosts))}
+        started = time.perf_counter()
+        try:
+            async with session.post(url, json=payload) as response:
+                await response.read()
+                ok = response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ok = False
+        samples.append((time.perf_counter() - started) * 1000)
+        if not ok:
+            errors.append(1)
+
+async def run_active(port, args):
+    samples, errors = [], []
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        url = f"http://127.0.0.1:{port}/api/status"
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(poster(session, url, args.hosts, deadline, samples, errors, args.seed + i)
+                               for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    result = percentiles(samples)
+    result['errors'] = len(errors)
+    result['throughput_per_s'] = round(len(samples) / elapsed, 2)
+    return result
+
+async def open_idle(port, count):
+    """建立 count 个慢速连接：请求头只发一半，返回 (writer 列表, 未能建立的连接数)"""
+    writers, failed = [], 0
+    for start in range(0, count, 500):
+        batch = await asyncio.gather(*(asyncio.open_connection('127.0.0.1', port)
+                                       for _ in range(start, min(count, start + 500))),
+                                     return_exceptions=True)
+        for item in batch:
+            if isinstance(item, BaseException):
+                failed += 1
+                continue
+            writer = item[1]
+            writer.write(b"POST /api/status HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n")
+            writers.append(writer)
+    return writers, failed
+
+async def trickle(writers, stop):
+    """每隔几秒给每个慢速连接补一行请求头，使其既不完成也不超时"""
+    while not stop.is_set():
+        for writer in writers:
+            if not writer.is_closing():
+                writer.write(b"X-Padding: 1\r\n")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            pass
+
+async def run_scenario(mode, scenario, db_file, args, workdir):
+    port = free_port()
+    process = start_server(mode, db_file, port, workdir)
+    try:
+        result = {'baseline': process_usage(process)}
+        writers, stop, trickler = [], asyncio.Event(), None
+        if scenario == 'idle':
+            writers, failed = await open_idle(port, args.idle)
+            await asyncio.sleep(2)
+            trickler = asyncio.ensure_future(trickle(writers, stop))
+            result['idle'] = {'requested': args.idle, 'open': len(writers), 'failed': failed,
+                              **process_usage(process)}
+        result['ingest'] = await run_active(port, args)
+        result['peak'] = process_usage(process)
+        stop.set()
+        if trickler:
+            await trickler
+        for writer in writers:
+            writer.close()
+        return result
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def print_results(results):
+    print(f"\n{'模式':<8}{'场景':<8}{'吞吐/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'错误':>8}"
+          f"{'空闲连接':>10}{'RSS MB':>10}{'线程':>8}")
+    for mode, scenarios in results['modes'].items():
+        for scenario, result in scenarios.items():
+            ingest = result['ingest']
+            idle = result.get('idle', {}).get('open', 0)
+            print(f"{mode:<8}{scenario:<8}{ingest['throughput_per_s']:>10}{ingest.get('p50_ms', '-'):>10}"
+                  f"{ingest.get('p99_ms', '-'):>10}{ingest['errors']:>8}{idle:>10}"
+                  f"{result['peak']['rss_mb']:>10}{result['peak']['threads']:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Flask 与 asyncio 模式的上报接口对比')
+    parser.add_argument('--modes', default='flask,async', help='要测试的模式，逗号分隔')
+    parser.add_argument('--scenarios', default='active,idle', help='要运行的场景，逗号分隔')
+    parser.add_argument('--hosts', type=int, default=200, help='主机数')
+    parser.add_argument('--days', type=float, default=1, help='预置历史天数')
+    parser.add_argument('--concurrency', type=int, default=50, help='并发上报连接数')
+    parser.add_argument('--idle', type=int, default=5000, help='idle 场景的慢速连接数')
+    parser.add_argument('--duration', type=float, default=15, help='每个场景的上报时长（秒）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--output', help='结果 JSON 路径（默认 benchmarks/results/ingest-<commit>.json）')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='vps-ingest-')
+    template = os.path.join(workdir, 'template.db')
+    print(f"生成合成数据: {args.hosts} 台主机 × {args.days} 天")
+    seed_info = seed_database(template, args.hosts, days=args.days, seed=args.seed)
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'time': datetime.now().strftime(server.TIME_FORMAT),
+            'python': sys.version.split()[0],
+            'cpus': os.cpu_count(),
+        },
+        'params': vars(args),
+        'seed': seed_info,
+        'modes': {},
+    }
+    try:
+        for mode in args.modes.split(','):
+            results['modes'][mode] = {}
+            for scenario in args.scenarios.split(','):
+                # 每个场景使用一份新的数据库副本，互不影响
+                db_file = os.path.join(workdir, f"{mode}-{scenario}.db")
+                shutil.copyfile(template, db_file)
+                print(f"运行 {mode} / {scenario} ...")
+                results['modes'][mode][scenario] = asyncio.run(run_scenario(mode, scenario, db_file, args, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results)
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"ingest-{results['meta']['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+压测：在本地启动服务端，预置合成历史数据，模拟大量客户端上报和仪表盘轮询
+
+用法：
+    python benchmarks/load_test.py --hosts 500 --days 30 --clients 16 --dashboards 4 --duration 60
+    python benchmarks/load_test.py --compare results/load-abc1234.json
+
+结果（吞吐、延迟分位数、数据库大小、服务端 /debug/stats）保存为 JSON，便于跨提交对比。
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+from werkzeug.serving import make_server
+
+from synthetic import file_sizes, git_commit, percentiles, sample_report, seed_database, server
+
+def client_worker(base_url, hosts, stop, samples, errors, seed):
+    """模拟客户端：轮流以各主机身份不间断上报"""
+    rng = random.Random(seed)
+    session = requests.Session()
+    while not stop.is_set():
+        index = rng.randrange(hosts)
+        payload = {"key": server.SERVER_KEY, "data": sample_report(rng, index)}
+        started = time.perf_counter()
+        try:
+            response = session.post(f"{base_url}/api/status", json=payload, timeout=30)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        samples.append((time.perf_counter() - started) * 1000)
+        if not ok:
+            errors.append(1)
+
+def dashboard_worker(base_url, stop, samples, errors, seed, think_time):
+    """模拟打开着的仪表盘：轮询最新状态、历史第一页和图表数据"""
+    rng = random.Random(seed)
+    session = requests.Session()
+    today = datetime.now()
+    requests_by_name = {
+        'latest': ('/api/latest', {}),
+        'history': ('/api/history', {'page': 1, 'page_size': 100}),
+        'chart': ('/api/history/chart', {
+            'start_date': (today - timedelta(days=1)).strftime('%Y-%m-%d'),
+            'end_date': today.strftime('%Y-%m-%d'),
+        }),
+    }
+    while not stop.is_set():
+        for name, (path, params) in requests_by_name.items():
+            started = time.perf_counter()
+            try:
+                response = session.get(f"{base_url}{path}", params=params, timeout=60)
+                response.content
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            samples[name].append((time.perf_counter() - started) * 1000)
+            if not ok:
+                errors[name].append(1)
+            if stop.wait(rng.uniform(0, think_time * 2)):
+                return
+
+def run(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix='vps-load-')
+    db_file = os.path.join(workdir, 'monitor.db')
+    if os.path.exists(db_file):
+        os.remove(db_file)
+
+    print(f"生成合成数据: {args.hosts} 台主机 × {args.days} 天 -> {db_file}")
+    seed_info = seed_database(db_file, args.hosts, days=args.days, interval=args.interval, seed=args.seed)
+    print(f"  {seed_info['reports']} 条上报, {seed_info['points']} 个数据点, 用时 {seed_info['seed_seconds']} 秒")
+    size_before = file_sizes(db_file)
+
+    # 压测期间不发送真实通知
+    server.send_pushplus_notification = lambda title, content: True
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    http_server = make_server('127.0.0.1', args.port, server.app, threaded=True)
+    base_url = f"http://127.0.0.1:{http_server.server_port}"
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+
+    stop = threading.Event()
+    ingest_samples, ingest_errors = [], []
+    dashboard_samples = {name: [] for name in ('latest', 'history', 'chart')}
+    dashboard_errors = {name: [] for name in dashboard_samples}
+    workers = [
+        threading.Thread(target=client_worker,
+                         args=(base_url, args.hosts, stop, ingest_samples, ingest_errors, args.seed + i))
+        for i in range(args.clients)
+    ] + [
+        threading.Thread(target=dashboard_worker,
+                         args=(base_url, stop, dashboard_samples, dashboard_errors, args.seed + 1000 + i, args.think_time))
+        for i in range(args.dashboards)
+    ]
+
+    print(f"压测 {args.duration} 秒: {args.clients} 个上报客户端, {args.dashboards} 个仪表盘")
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    time.sleep(args.duration)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    server_stats = requests.get(f"{base_url}/debug/stats", timeout=10).json()
+    http_server.shutdown()
+
+    def summarize(samples, errors):
+        result = percentiles(samples)
+        result['errors'] = len(errors)
+        result['throughput_per_s'] = round(len(samples) / elapsed, 2)
+        return result
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'time': datetime.now().strftime(server.TIME_FORMAT),
+            'python': sys.version.split()[0],
+        },
+        'params': vars(args),
+        'seed': seed_info,
+        'duration_s': round(elapsed, 2),
+        'results': {
+            'ingest': summarize(ingest_samples, ingest_errors),
+            **{name: summarize(dashboard_samples[name], dashboard_errors[name]) for name in dashboard_samples},
+        },
+        'db': {'before': size_before, 'after': file_sizes(db_file)},
+        'server_stats': server_stats,
+    }
+    return results
+
+def print_results(results, baseline=None):
+    print(f"\n{'请求':<10}{'吞吐/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'错误':>8}")
+    for name, result in results['results'].items():
+        line = (f"{name:<10}{result['throughput_per_s']:>10}{result.get('p50_ms', '-'):>10}"
+                f"{result.get('p95_ms', '-'):>10}{result.get('p99_ms', '-'):>10}{result['errors']:>8}")
+        old = (baseline or {}).get('results', {}).get(name)
+        if old and old.get('p95_ms') and result.get('p95_ms'):
+            line += f"   p95 {100 * (result['p95_ms'] / old['p95_ms'] - 1):+.1f}%"
+            line += f"  吞吐 {100 * (result['throughput_per_s'] / old['throughput_per_s'] - 1):+.1f}%"
+        print(line)
+    after = results['db']['after']
+    print(f"数据库: {after['file_bytes'] / 2**20:.1f} MiB (WAL {after['wal_bytes'] / 2**20:.1f} MiB)")
+
+def main():
+    parser = argparse.ArgumentParser(description='VPS监控服务端压测')
+    parser.add_argument('--hosts', type=int, default=200, help='主机数')
+    parser.add_argument('--days', type=float, default=7, help='预置历史天数')
+    parser.add_argument('--interval', type=int, default=900, help='预置数据的上报间隔（秒）')
+    parser.add_argument('--clients', type=int, default=8, help='并发上报客户端数')
+    parser.add_argument('--dashboards', type=int, default=2, help='并发仪表盘数')
+    parser.add_argument('--think-time', type=float, default=1.0, help='仪表盘两次请求之间的平均间隔（秒）')
+    parser.add_argument('--duration', type=float, default=30, help='压测时长（秒）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（相同参数可复现）')
+    parser.add_argument('--port', type=int, default=0, help='服务端口（默认随机）')
+    parser.add_argument('--workdir', help='数据库所在目录（默认临时目录）')
+    parser.add_argument('--output', help='结果 JSON 路径（默认 benchmarks/results/load-<commit>.json）')
+    parser.add_argument('--compare', help='与之前的结果 JSON 对比')
+    args = parser.parse_args()
+
+    results = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                         f"load-{results['meta']['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存: {output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+查询路径微基准：在不同规模的合成数据库上分别计时 server.py 的各个查询函数，
+并记录每个函数实际执行的 SQL 的 EXPLAIN QUERY PLAN，索引失效时从计划中一眼可见
+
+用法：
+    python benchmarks/query_bench.py                          # 10k 和 1M 条上报
+    python benchmarks/query_bench.py --sizes 10000,1000000,10000000
+    python benchmarks/query_bench.py --only get_all_statuses
+
+生成的数据库按规模缓存在 --workdir 中（默认 benchmarks/data），重复运行时直接复用。
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from synthetic import file_sizes, git_commit, sample_report, seed_database, server
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def reset_server_state(db_file):
+    """切换数据库时清空服务端的内存缓存"""
+    server.DB_FILE = db_file
+    server._host_cache.clear()
+    server._series_cache.clear()
+    server._host_cache_loaded = False
+    server._host_cache_version += 1
+
+def prepare_database(workdir, rows, seed):
+    """返回 (数据库路径, 生成信息)，已存在同规模的数据库时直接复用"""
+    hosts = min(1000, max(10, rows // 1000))
+    db_file = os.path.join(workdir, f"bench-{rows}.db")
+    info_file = db_file + '.json'
+    if os.path.exists(db_file) and os.path.exists(info_file):
+        with open(info_file, 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        server.DB_FILE = db_file
+        server.init_database()
+    else:
+        for path in (db_file, db_file + '-wal', db_file + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+        print(f"生成 {rows} 条上报的数据库（{hosts} 台主机）...")
+        info = seed_database(db_file, hosts, reports=rows, seed=seed)
+        with open(info_file, 'w', encoding='utf-8') as f:
+            json.dump(info, f)
+    reset_server_state(db_file)
+    return db_file, info
+
+def measure(func, min_rounds=5, max_rounds=1000, max_time=2.0):
+    """重复调用 func 计时（预热一次），返回 pytest-benchmark 风格的统计（毫秒）"""
+    func()
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < max_rounds and (len(samples) < min_rounds or time.perf_counter() - started < max_time):
+        t0 = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - t0) * 1000)
+    mean = statistics.fmean(samples)
+    return {
+        'rounds': len(samples),
+        'min_ms': round(min(samples), 3),
+        'max_ms': round(max(samples), 3),
+        'mean_ms': round(mean, 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'stddev_ms': round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+        'ops': round(1000 / mean, 2) if mean else None,
+    }
+
+def capture_statements(func):
+    """执行一次 func 并返回它经由 connect_db 执行的 SQL（参数已代入，相同语句去重）"""
+    statements = []
+    original = server.connect_db
+
+    def tracing_connect(**kwargs):
+        conn = original(**kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    server.connect_db = tracing_connect
+    try:
+        func()
+    finally:
+        server.connect_db = original
+
+    seen = {}
+    for sql in statements:
+        sql = ' '.join(sql.split())
+        if not re.match(r'(SELECT|WITH|UPDATE|DELETE|INSERT)\b', sql, re.IGNORECASE):
+            continue
+        # 仅参数不同的语句只保留一条
+        seen.setdefault(re.sub(r"\b\d+(\.\d+)?\b|'[^']*'", '?', sql), sql)
+    return list(seen.values())
+
+def explain(db_file, sql):
+    """EXPLAIN QUERY PLAN 的树形文本"""
+    conn = sqlite3.connect(db_file)
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    finally:
+        conn.close()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+def build_cases(info):
+    """各查询函数的基准用例 {名称: 无参可调用对象}"""
+    rng = random.Random(0)
+    hosts = info['hosts']
+    hostname = 'vps-node-00000'
+    now = datetime.now()
+    day_ago = (now - timedelta(days=1)).strftime(server.TIME_FORMAT)
+    now_str = now.strftime(server.TIME_FORMAT)
+
+    def history(**kwargs):
+        def run():
+            result = server.get_all_statuses(**kwargs)
+            for _ in result['data']:
+                pass
+            return result
+        return run
+
+    total = server.get_all_statuses(page=1, page_size=100)
+    for _ in total['data']:
+        pass
+    deep_page = max(1, total['total_pages'])
+
+    def insert():
+        server.insert_status(sample_report(rng, rng.randrange(hosts)))
+
+    return {
+        'insert_status': insert,
+        'get_all_statuses[page=1]': history(page=1, page_size=100),
+        f'get_all_statuses[page={deep_page}]': history(page=deep_page, page_size=100),
+        'get_all_statuses[hostname]': history(page=1, page_size=100, hostname=hostname),
+        'get_all_statuses[1 day]': history(page=1, page_size=100, start_date=day_ago, end_date=now_str),
+        'get_all_statuses[hostname+1 day,page=2]': history(page=2, page_size=20, hostname=hostname,
+                                                           start_date=day_ago, end_date=now_str),
+        'get_chart_data[1 day]': lambda: server.get_chart_data(start_date=day_ago, end_date=now_str),
+        'get_chart_data[hostname]': lambda: server.get_chart_data(hostname=hostname),
+        'get_latest_status_by_hostname': server.get_latest_status_by_hostname,
+        'check_connection_status': server.check_connection_status,
+    }
+
+def run_size(workdir, rows, args):
+    db_file, info = prepare_database(workdir, rows, args.seed)
+    # 断联检测首次运行会载入主机缓存，单独计时
+    started = time.perf_counter()
+    server.check_connection_status()
+    cache_load_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    results = {}
+    for name, func in build_cases(info).items():
+        if args.only and not name.startswith(args.only):
+            continue
+        timing = measure(func, min_rounds=args.min_rounds, max_time=args.max_time)
+        plans = [{'sql': sql, 'plan': explain(db_file, sql)} for sql in capture_statements(func)]
+        results[name] = {**timing, 'plans': plans}
+        print(f"  {name:<45}{timing['median_ms']:>12.3f}{timing['min_ms']:>12.3f}{timing['rounds']:>8}")
+    return {
+        'seed': info,
+        'db': file_sizes(db_file),
+        'cache_load_ms': cache_load_ms,
+        'benchmarks': results,
+    }
+
+def print_plans(size, result):
+    print(f"\n=== 查询计划: {size} 条上报 ===")
+    for name, bench in result['benchmarks'].items():
+        print(f"\n[{name}]")
+        for entry in bench['plans']:
+            sql = entry['sql']
+            print(f"  SQL: {sql[:160]}{'...' if len(sql) > 160 else ''}")
+            for line in entry['plan']:
+                print(f"    {line}")
+
+def main():
+    parser = argparse.ArgumentParser(description='查询函数微基准')
+    parser.add_argument('--sizes', default='10000,1000000', help='数据库规模（上报条数），逗号分隔')
+    parser.add_argument('--only', help='只运行名称以此开头的用例')
+    parser.add_argument('--min-rounds', type=int, default=5, help='每个用例最少执行次数')
+    parser.add_argument('--max-time', type=float, default=2.0, help='每个用例的计时时长（秒）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--workdir', default=os.path.join(BENCH_DIR, 'data'), help='生成的数据库存放目录')
+    parser.add_argument('--output', help='结果 JSON 路径（默认 benchmarks/results/queries-<commit>.json）')
+    parser.add_argument('--no-plans', action='store_true', help='不打印查询计划（仍写入 JSON）')
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'time': datetime.now().strftime(server.TIME_FORMAT),
+            'python': sys.version.split()[0],
+            'sqlite': sqlite3.sqlite_version,
+        },
+        'sizes': {},
+    }
+    for rows in (int(size) for size in args.sizes.split(',')):
+        print(f"\n规模 {rows} 条上报")
+        print(f"  {'用例':<43}{'中位数 ms':>12}{'最小 ms':>12}{'次数':>6}")
+        results['sizes'][str(rows)] = run_size(args.workdir, rows, args)
+
+    if not args.no_plans:
+        for size, result in results['sizes'].items():
+            print_plans(size, result)
+
+    output = args.output or os.path.join(BENCH_DIR, 'results', f"queries-{results['meta']['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存: {output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+合成数据：按 server.py 的表结构生成 N 台主机 × M 天的历史上报，供压测和微基准使用
+"""
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import server
+
+# 每次上报写入的指标（与客户端默认采集项一致）
+SEED_METRICS = ['cpu_percent', 'memory_used_gb', 'memory_percent', 'disk_used_gb', 'disk_percent', 'uptime_seconds']
+
+def hostname_for(index):
+    return f"vps-node-{index:05d}"
+
+def _host_values(rng, steps, interval):
+    """一台主机在 steps 次上报中的各指标取值（随机游走），返回 {metric: [value]}"""
+    memory_total = rng.choice([1.0, 2.0, 4.0, 8.0, 16.0])
+    disk_total = rng.choice([20.0, 40.0, 80.0, 160.0])
+    cpu = rng.uniform(1, 40)
+    memory = rng.uniform(20, 70)
+    disk = rng.uniform(10, 80)
+    uptime = rng.randrange(3600, 90 * 86400)
+    values = {metric: [] for metric in SEED_METRICS}
+    for _ in range(steps):
+        cpu = min(100.0, max(0.0, cpu + rng.gauss(0, 5)))
+        memory = min(100.0, max(0.0, memory + rng.gauss(0, 1)))
+        disk = min(100.0, disk + abs(rng.gauss(0, 0.01)))
+        uptime += interval
+        values['cpu_percent'].append(round(cpu, 1))
+        values['memory_percent'].append(round(memory, 1))
+        values['memory_used_gb'].append(round(memory_total * memory / 100, 2))
+        values['disk_percent'].append(round(disk, 1))
+        values['disk_used_gb'].append(round(disk_total * disk / 100, 2))
+        values['uptime_seconds'].append(uptime)
+    return memory_total, disk_total, values
+
+def seed_database(db_file, hosts, days=None, reports=None, interval=900, seed=0, end_ts=None):
+    """生成合成历史数据并返回统计信息
+
+    给定 days 时每台主机每 interval 秒一次上报；给定 reports（总上报数）时按主机数折算天数。
+    上报记录按时间交错写入（与真实上报一致），指标数据点按序列顺序批量写入。
+    结束时间默认为当前时间，所有主机都处于在线状态。
+    """
+    steps = max(1, reports // hosts) if reports else int(days * 86400 // interval)
+    interval_ms = interval * 1000
+    end_ts = end_ts or int(time.time() * 1000)
+    start_ts = end_ts - steps * interval_ms
+    # 每台主机在一个上报周期内的固定偏移，保证时间戳互不相同
+    offsets = [(index * 7919) % interval_ms for index in range(hosts)]
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    
+    server.DB_FILE = db_file
+    server.init_database()
+    conn = sqlite3.connect(db_file)
+    conn.execute('PRAGMA synchronous=OFF')
+    cursor = conn.cursor()
+    
+    host_ids = []
+    for index in range(hosts):
+        memory_total, disk_total, values = _host_values(rng, steps, interval)
+        cursor.execute('INSERT INTO host (hostname) VALUES (?)', (hostname_for(index),))
+        host_id = cursor.lastrowid
+        cursor.execute('''
+            INSERT INTO host_version (host_id, valid_from, local_ip, boot_time, memory_total_gb, disk_total_gb)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (host_id, start_ts, f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}",
+              datetime.fromtimestamp(start_ts / 1000).strftime(server.TIME_FORMAT), memory_total, disk_total))
+        host_ids.append((host_id, cursor.lastrowid))
+        for metric in SEED_METRICS:
+            cursor.execute('INSERT INTO metric_series (host_id, metric) VALUES (?, ?)', (host_id, metric))
+            series_id = cursor.lastrowid
+            base = start_ts + offsets[index]
+            cursor.executemany(
+                'INSERT INTO metric_points (series_id, ts, value) VALUES (?, ?, ?)',
+                ((series_id, base + step * interval_ms, value) for step, value in enumerate(values[metric]))
+            )
+        conn.commit()
+    
+    def iter_reports():
+        for step in range(steps):
+            step_ts = start_ts + step * interval_ms
+            for index, (host_id, version_id) in enumerate(host_ids):
+                ts = step_ts + offsets[index]
+                client_timestamp = datetime.fromtimestamp(ts / 1000).strftime(server.TIME_FORMAT)
+                yield host_id, version_id, client_timestamp, ts, 'online'
+    
+    cursor.executemany('''
+        INSERT INTO status_report (host_id, version_id, client_timestamp, ts, status)
+        VALUES (?, ?, ?, ?, ?)
+    ''', iter_reports())
+    conn.commit()
+    conn.close()
+    
+    # 再次初始化：根据上报记录回填可用性区间
+    server.init_database()
+    return {
+        'hosts': hosts,
+        'reports': hosts * steps,
+        'points': hosts * steps * len(SEED_METRICS),
+        'days': round(steps * interval / 86400, 2),
+        'seed_seconds': round(time.perf_counter() - started, 2),
+    }
+
+def sample_report(rng, index):
+    """模拟客户端上报的数据（与 client.py 的 get_system_info 结构一致）"""
+    memory_total = 4.0
+    disk_total = 80.0
+    memory_percent = round(rng.uniform(20, 90), 1)
+    disk_percent = round(rng.uniform(10, 90), 1)
+    return {
+        'hostname': hostname_for(index),
+        'local_ip': f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}",
+        'timestamp': datetime.now().strftime(server.TIME_FORMAT),
+        'cpu_percent': round(rng.uniform(0, 100), 1),
+        'memory_total_gb': memory_total,
+        'memory_used_gb': round(memory_total * memory_percent / 100, 2),
+        'memory_percent': memory_percent,
+        'disk_total_gb': disk_total,
+        'disk_used_gb': round(disk_total * disk_percent / 100, 2),
+        'disk_percent': disk_percent,
+        'uptime_seconds': rng.randrange(3600, 90 * 86400),
+        'boot_time': '2026-01-01 00:00:00',
+        'metrics': {
+            'disk_percent:C:\\': disk_percent,
+            'net_rx_bytes_per_sec:eth0': round(rng.uniform(0, 1e6), 1),
+            'net_tx_bytes_per_sec:eth0': round(rng.uniform(0, 1e6), 1),
+            'load_1': round(rng.uniform(0, 4), 2),
+        },
+    }
+
+def percentiles(samples):
+    """延迟样本（毫秒）的汇总"""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))], 3)
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered), 3),
+        'p50_ms': pick(50),
+        'p95_ms': pick(95),
+        'p99_ms': pick(99),
+        'max_ms': round(ordered[-1], 3),
+    }
+
+def file_sizes(db_file):
+    size = lambda path: os.path.getsize(path) if os.path.exists(path) else 0
+    return {'file_bytes': size(db_file), 'wal_bytes': size(db_file + '-wal')}
+
+def git_commit():
+    """当前代码版本，记录在结果中以便跨提交对比"""
+    try:
+        import subprocess
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, text=True).strip()
+    except Exception:
+        return None
@@ -1,6 +1,7 @@
 """
 VPS监控客户端脚本
-每15分钟向服务器发送系统状态信息
+每15分钟向服务器发送系统状态信息（各主机按主机名错开上报时刻，服务端可通过响应调整间隔）
+采集项可插拔注册，各自按采样间隔由调度器并发执行，上报时汇总最近结果
 """
 import requests
 import psutil
@@ -8,116 +9,480 @@ import socket
 import json
 import time
 import platform
-from datetime import datetime
+import sched
+import zlib
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timezone
+from threading import Lock
 import logging
+import logging.handlers
+import queue
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('monitor_client.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# 日志配置：调用方只把记录放进内存队列，由后台线程写控制台和滚动日志文件（JSON 行），
+# 磁盘或控制台变慢时不阻塞采集和上报
+LOG_FILE = 'monitor_client.log'
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+# 同一处代码的 WARNING 及以上日志，每个窗口内最多输出的条数（例如服务器不可达时的重复错误）
+LOG_RATE_LIMIT = 10
+LOG_RATE_WINDOW = 300
+
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """每条记录输出为一行 JSON：时间、级别、消息、异常和 extra 字段"""
+    
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S') + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class RateLimitFilter(logging.Filter):
+    """按代码位置限制重复的 WARNING 及以上日志，被丢弃的条数记在下一窗口第一条的 suppressed 字段"""
+    
+    def __init__(self, limit, window):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._windows = {}  # (pathname, lineno) -> [窗口开始时间, 已输出条数, 已丢弃条数]
+    
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        state = self._windows.get(key)
+        if state is None or record.created - state[0] >= self.window:
+            suppressed = state[2] if state else 0
+            self._windows[key] = [record.created, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        if state[1] < self.limit:
+            state[1] += 1
+            return True
+        state[2] += 1
+        return False
+
+def setup_logging():
+    """配置根 logger：QueueHandler -> QueueListener(控制台文本, 滚动文件 JSON)"""
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    file_handler = logging.handlers.RotatingFileHandler(
+        LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter())
+    
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(LOG_RATE_LIMIT, LOG_RATE_WINDOW))
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(logging.INFO)
+    
+    listener = logging.handlers.QueueListener(log_queue, console, file_handler)
+    listener.start()
+    return listener
 
 # 服务器配置
 SERVER_URL = "http://your-server-ip:5000/api/status"  # 修改为你的服务器IP和端口
 SERVER_KEY = "your-secret-key"  # 可选：用于身份验证的密钥
+REPORT_INTERVAL = 15 * 60  # 上报间隔：15分钟 = 900秒（服务端可在响应中建议新的间隔）
+# 服务端建议的间隔只在此范围内采用
+MIN_REPORT_INTERVAL = 60
+MAX_REPORT_INTERVAL = 60 * 60
+# 启动后首次上报的延迟上限（秒）：大量主机同时重启时按主机名错开，避免同一秒涌向服务端
+STARTUP_SPREAD = 60
+# 服务端过载（429/503）时的重试：最多重试次数，以及未给出 Retry-After 时的首次等待（秒，之后翻倍）
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 30
+RETRY_SPREAD = 30  # 在 Retry-After 之上按主机名错开的最大秒数
 
-def get_system_info():
-    """获取系统状态信息"""
+# 当前生效的上报间隔（服务端建议值优先）
+_report_interval = REPORT_INTERVAL
+
+# 采集线程池：各采集项并发执行，互不阻塞
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='collector')
+# 发送线程：网络请求不占用调度线程
+_sender = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sender')
+
+# 服务检查配置：名称 -> (主机, 端口)，为空则不检查
+SERVICE_CHECKS = {
+    # "ssh": ("127.0.0.1", 22),
+}
+TOP_PROCESS_COUNT = 5  # 上报CPU占用最高的进程数
+
+# 采集项注册表：名称 -> 采集函数、采样间隔（秒）、耗时预算（毫秒）及最近一次结果
+COLLECTORS = {}
+_registry_lock = Lock()
+MAX_BACKOFF = 8  # 超出耗时预算时，采样间隔最多放大到原来的8倍
+
+def collector(name, interval, budget_ms, top_level=False):
+    """注册采集项
+
+    top_level 为 True 的采集项结果直接放在上报数据顶层（兼容旧字段），
+    其余结果放在 data["metrics"] 中，以 "指标名:标签" 命名。
+    """
+    def decorator(func):
+        COLLECTORS[name] = {
+            "func": func,
+            "interval": interval,
+            "budget_ms": budget_ms,
+            "top_level": top_level,
+            "backoff": 1,
+            "cost_ms": None,
+            "result": {},
+        }
+        return func
+    return decorator
+
+# 计数器类采集项的上一次读数，用于计算速率
+_last_counters = {}
+
+def _rates(key, counters):
+    """根据两次读数计算每秒速率，首次调用返回空字典"""
+    now = time.monotonic()
+    previous = _last_counters.get(key)
+    _last_counters[key] = (now, counters)
+    if not previous:
+        return {}
+    elapsed = now - previous[0]
+    if elapsed <= 0:
+        return {}
+    rates = {}
+    for name, value in counters.items():
+        if name in previous[1]:
+            rates[name] = round(max(value - previous[1][name], 0) / elapsed, 2)
+    return rates
+
+def prime_cpu_percent():
+    """初始化CPU采样基准，之后 cpu_percent(interval=None) 返回两次调用间的增量"""
+    psutil.cpu_percent(interval=None)
+
+@collector("cpu", interval=60, budget_ms=5, top_level=True)
+def collect_cpu():
+    """CPU使用率（非阻塞，基于上次调用以来的增量）"""
+    return {"cpu_percent": round(psutil.cpu_percent(interval=None), 2)}
+
+@collector("memory", interval=60, budget_ms=5, top_level=True)
+def collect_memory():
+    """内存信息"""
+    memory = psutil.virtual_memory()
+    return {
+        "memory_total_gb": round(memory.total / (1024**3), 2),
+        "memory_used_gb": round(memory.used / (1024**3), 2),
+        "memory_percent": round(memory.percent, 2),
+    }
+
+@collector("disk", interval=300, budget_ms=20, top_level=True)
+def collect_disk():
+    """系统盘信息（Windows使用C盘）"""
+    disk_path = 'C:\\' if platform.system() == 'Windows' else '/'
+    disk = psutil.disk_usage(disk_path)
+    return {
+        "disk_total_gb": round(disk.total / (1024**3), 2),
+        "disk_used_gb": round(disk.used / (1024**3), 2),
+        "disk_percent": round(disk.percent, 2),
+    }
+
+@collector("host", interval=3600, budget_ms=500, top_level=True)
+def collect_host():
+    """主机名和IP（DNS解析可能阻塞，低频刷新）"""
+    hostname = socket.gethostname()
     try:
-        # CPU使用率
-        cpu_percent = psutil.cpu_percent(interval=1)
-        
-        # 内存信息
-        memory = psutil.virtual_memory()
-        
-        # 磁盘信息（Windows使用C盘）
-        disk_path = 'C:\\' if platform.system() == 'Windows' else '/'
-        disk = psutil.disk_usage(disk_path)
-        
-        # 网络信息
-        hostname = socket.gethostname()
         local_ip = socket.gethostbyname(hostname)
-        
-        # 系统启动时间
-        boot_time = datetime.fromtimestamp(psutil.boot_time()).strftime('%Y-%m-%d %H:%M:%S')
-        
-        info = {
-            "hostname": hostname,
-            "local_ip": local_ip,
-            "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            "cpu_percent": round(cpu_percent, 2),
-            "memory_total_gb": round(memory.total / (1024**3), 2),
-            "memory_used_gb": round(memory.used / (1024**3), 2),
-            "memory_percent": round(memory.percent, 2),
-            "disk_total_gb": round(disk.total / (1024**3), 2),
-            "disk_used_gb": round(disk.used / (1024**3), 2),
-            "disk_percent": round(disk.percent, 2),
-            "boot_time": boot_time,
-            "uptime_seconds": int(time.time() - psutil.boot_time())
-        }
-        
+    except socket.error as e:
+        logging.warning(f"解析本机IP失败: {e}")
+        local_ip = COLLECTORS["host"]["result"].get("local_ip")
+    return {"hostname": hostname, "local_ip": local_ip}
+
+@collector("boot", interval=3600, budget_ms=5, top_level=True)
+def collect_boot():
+    """系统启动时间"""
+    boot_ts = psutil.boot_time()
+    return {
+        "boot_time": datetime.fromtimestamp(boot_ts).strftime('%Y-%m-%d %H:%M:%S'),
+        "uptime_seconds": int(time.time() - boot_ts),
+    }
+
+@collector("disks", interval=600, budget_ms=100)
+def collect_disks():
+    """所有分区的使用率"""
+    metrics = {}
+    for part in psutil.disk_partitions(all=False):
+        try:
+            usage = psutil.disk_usage(part.mountpoint)
+        except (PermissionError, OSError):
+            continue  # 光驱、未就绪的设备等
+        metrics[f"disk_percent:{part.mountpoint}"] = round(usage.percent, 2)
+        metrics[f"disk_used_gb:{part.mountpoint}"] = round(usage.used / (1024**3), 2)
+        metrics[f"disk_total_gb:{part.mountpoint}"] = round(usage.total / (1024**3), 2)
+    return metrics
+
+@collector("net", interval=60, budget_ms=20)
+def collect_net():
+    """各网卡收发速率（字节/秒）"""
+    counters = {}
+    for nic, io in psutil.net_io_counters(pernic=True).items():
+        counters[f"net_rx_bytes_per_sec:{nic}"] = io.bytes_recv
+        counters[f"net_tx_bytes_per_sec:{nic}"] = io.bytes_sent
+    return _rates("net", counters)
+
+@collector("diskio", interval=60, budget_ms=20)
+def collect_diskio():
+    """磁盘IO速率（字节/秒、次/秒）"""
+    io = psutil.disk_io_counters()
+    if io is None:
+        return {}
+    return _rates("diskio", {
+        "disk_read_bytes_per_sec": io.read_bytes,
+        "disk_write_bytes_per_sec": io.write_bytes,
+        "disk_read_ops_per_sec": io.read_count,
+        "disk_write_ops_per_sec": io.write_count,
+    })
+
+@collector("load", interval=60, budget_ms=5)
+def collect_load():
+    """系统负载（Windows上由psutil模拟，首次调用返回0）"""
+    load1, load5, load15 = psutil.getloadavg()
+    return {"load_1": round(load1, 2), "load_5": round(load5, 2), "load_15": round(load15, 2)}
+
+@collector("processes", interval=900, budget_ms=500)
+def collect_processes():
+    """CPU占用最高的进程（遍历全部进程，开销较大，低频执行）"""
+    procs = []
+    for proc in psutil.process_iter(['name', 'cpu_percent', 'memory_percent']):
+        info = proc.info
+        if info.get('cpu_percent') is not None:
+            procs.append(info)
+    procs.sort(key=lambda p: p['cpu_percent'], reverse=True)
+    metrics = {"process_count": len(procs)}
+    # 按排名而不是进程名作为指标名：进程名随进程启停不断变化，会让服务端的序列数无限增长，
+    # 达到每台主机的序列上限后连系统指标的新序列也会被丢弃
+    for rank, info in enumerate(procs[:TOP_PROCESS_COUNT], 1):
+        metrics[f"process_cpu_percent:top{rank}"] = round(info['cpu_percent'], 2)
+        metrics[f"process_memory_percent:top{rank}"] = round(info.get('memory_percent') or 0, 2)
+    return metrics
+
+@collector("services", interval=120, budget_ms=3000)
+def collect_services():
+    """服务端口可用性检查"""
+    metrics = {}
+    for name, (host, port) in SERVICE_CHECKS.items():
+        started = time.perf_counter()
+        try:
+            with socket.create_connection((host, port), timeout=2):
+                up = 1
+        except OSError:
+            up = 0
+        metrics[f"service_up:{name}"] = up
+        metrics[f"service_latency_ms:{name}"] = round((time.perf_counter() - started) * 1000, 2)
+    return metrics
+
+def run_collector(name):
+    """执行一个采集项，记录结果和自身耗时；超出预算时拉长采样间隔"""
+    entry = COLLECTORS[name]
+    started = time.perf_counter()
+    try:
+        result = entry["func"]()
+    except Exception as e:
+        logging.error("采集项 %s 执行失败: %s", name, e, extra={"collector": name})
+        return
+    cost_ms = (time.perf_counter() - started) * 1000
+    with _registry_lock:
+        entry["result"] = result
+        entry["cost_ms"] = round(cost_ms, 3)
+        if cost_ms > entry["budget_ms"]:
+            if entry["backoff"] < MAX_BACKOFF:
+                entry["backoff"] *= 2
+                logging.warning(f"采集项 {name} 耗时 {cost_ms:.1f} ms 超出预算 {entry['budget_ms']} ms，"
+                                f"采样间隔调整为 {entry['interval'] * entry['backoff']} 秒")
+        else:
+            entry["backoff"] = 1
+
+def collect_all(timeout=5):
+    """并发执行所有采集项并等待完成（用于启动时填充首份数据）
+
+    最多等待 timeout 秒，未完成的采集项（如卡住的磁盘、网络读取）本轮跳过，
+    在后台完成后结果照常写入，不阻止客户端启动。
+    """
+    futures = {name: _executor.submit(run_collector, name) for name in COLLECTORS}
+    deadline = time.monotonic() + timeout
+    for name, future in futures.items():
+        try:
+            future.result(timeout=max(0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            logging.warning("采集项 %s 超过 %s 秒未完成，本轮跳过", name, timeout, extra={"collector": name})
+
+def get_system_info():
+    """汇总各采集项最近一次结果为上报数据"""
+    try:
+        info = {"timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        metrics = {}
+        with _registry_lock:
+            for name, entry in COLLECTORS.items():
+                if entry["top_level"]:
+                    info.update(entry["result"])
+                else:
+                    metrics.update(entry["result"])
+                if entry["cost_ms"] is not None:
+                    metrics[f"collector_cost_ms:{name}"] = entry["cost_ms"]
+        if "hostname" not in info:
+            raise RuntimeError("主机信息尚未采集")
+        info["metrics"] = metrics
         return info
     except Exception as e:
         logging.error(f"获取系统信息失败: {e}")
         return None
 
-def send_status():
-    """发送状态信息到服务器"""
-    info = get_system_info()
-    if not info:
-        logging.error("无法获取系统信息，跳过本次发送")
-        return False
-    
+def host_phase():
+    """本机在上报周期中的固定相位（0~1），由主机名决定：重启前后不变，不同主机均匀分布"""
+    return zlib.crc32(socket.gethostname().encode('utf-8')) / 2**32
+
+def next_report_delay(interval):
+    """距离本机下一个上报时刻的秒数
+
+    上报时刻按墙上时间对齐到 相位×间隔 + k×间隔，因此无论何时启动，各主机都落在各自固定的时刻上。
+    至少间隔1秒，调度器提前几毫秒唤醒时不会重复上报。
+    """
+    offset = host_phase() * interval
+    return (offset - time.time() - 1) % interval + 1
+
+def parse_retry_after(value):
+    """解析 Retry-After 响应头（秒数或 HTTP 日期），无法解析时返回 None"""
+    if not value:
+        return None
     try:
-        payload = {
-            "key": SERVER_KEY,
-            "data": info
-        }
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+def apply_suggested_interval(response):
+    """采用服务端在响应中建议的上报间隔（X-Report-Interval 响应头）"""
+    global _report_interval
+    try:
+        suggested = int(response.headers.get('X-Report-Interval', ''))
+    except ValueError:
+        return
+    suggested = min(max(suggested, MIN_REPORT_INTERVAL), MAX_REPORT_INTERVAL)
+    if suggested != _report_interval:
+        logging.info("服务端建议上报间隔: %s 秒（原 %s 秒）", suggested, _report_interval,
+                     extra={"report_interval": suggested})
+        _report_interval = suggested
+
+def send_status():
+    """发送状态信息到服务器
+
+    服务端过载（429/503）时按 Retry-After 加上本机固定的错开量重试，
+    重试会晚于下一次定时上报时放弃，由定时上报接替。
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        started = time.perf_counter()
+        info = get_system_info()
+        collect_ms = (time.perf_counter() - started) * 1000
+        if not info:
+            logging.error("无法获取系统信息，跳过本次发送")
+            return False
         
-        response = requests.post(
-            SERVER_URL,
-            json=payload,
-            timeout=10
-        )
+        try:
+            payload = {
+                "key": SERVER_KEY,
+                "data": info
+            }
+            
+            sent_at = time.perf_counter()
+            response = requests.post(
+                SERVER_URL,
+                json=payload,
+                timeout=10
+            )
+            send_ms = (time.perf_counter() - sent_at) * 1000
+            apply_suggested_interval(response)
+            
+            if response.status_code == 200:
+                logging.info("状态发送成功: %s (采集 %.1f ms, 发送 %.1f ms)", info['timestamp'], collect_ms, send_ms,
+                             extra={"collect_ms": round(collect_ms, 1), "send_ms": round(send_ms, 1)})
+                return True
+            if response.status_code not in (429, 503):
+                logging.warning("服务器返回错误: %s - %s", response.status_code, response.text,
+                                extra={"status_code": response.status_code})
+                return False
+            
+        except requests.exceptions.RequestException as e:
+            logging.error(f"发送状态失败: {e}")
+            return False
         
-        if response.status_code == 200:
-            logging.info(f"状态发送成功: {info['timestamp']}")
-            return True
-        else:
-            logging.warning(f"服务器返回错误: {response.status_code} - {response.text}")
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if retry_after is None:
+            retry_after = RETRY_BASE_DELAY * 2 ** attempt
+        delay = retry_after + host_phase() * RETRY_SPREAD
+        if attempt == MAX_RETRIES or delay >= next_report_delay(_report_interval):
+            logging.warning("服务器繁忙 (%s)，放弃本次上报", response.status_code,
+                            extra={"status_code": response.status_code, "retry_after": retry_after})
             return False
-            
-    except requests.exceptions.RequestException as e:
-        logging.error(f"发送状态失败: {e}")
-        return False
+        logging.warning("服务器繁忙 (%s)，%.0f 秒后重试", response.status_code, delay,
+                        extra={"status_code": response.status_code, "retry_after": retry_after, "attempt": attempt + 1})
+        time.sleep(delay)
+    return False
+
+def collector_job(scheduler, name, next_run):
+    """调度任务：把采集项提交到线程池，并按其自身间隔安排下一次"""
+    _executor.submit(run_collector, name)
+    entry = COLLECTORS[name]
+    next_run = max(next_run + entry["interval"] * entry["backoff"], time.monotonic())
+    scheduler.enterabs(next_run, 1, collector_job, (scheduler, name, next_run))
+
+def report_job(scheduler):
+    """调度任务：上报一次，并安排到本机的下一个上报时刻（不受采集/发送耗时漂移影响，休眠唤醒后自动重新对齐）"""
+    _sender.submit(send_status)
+    scheduler.enter(next_report_delay(_report_interval), 0, report_job, (scheduler,))
 
 def main():
     """主循环"""
+    listener = setup_logging()
     logging.info("监控客户端启动")
     logging.info(f"服务器地址: {SERVER_URL}")
-    logging.info("每15分钟发送一次状态信息")
+    logging.info(f"每{REPORT_INTERVAL // 60}分钟发送一次状态信息")
     
-    # 立即发送一次
-    send_status()
+    # 预热CPU采样基准和计数器类采集项，稍等片刻后采集首份完整数据
+    prime_cpu_percent()
+    collect_all()
+    time.sleep(1)
+    collect_all()
     
-    # 每15分钟发送一次
-    interval = 15 * 60  # 15分钟 = 900秒
+    scheduler = sched.scheduler(time.monotonic, time.sleep)
+    start = time.monotonic()
+    for name, entry in COLLECTORS.items():
+        scheduler.enterabs(start + entry["interval"], 1, collector_job, (scheduler, name, start + entry["interval"]))
+    # 启动后尽快发送一次，按主机名在 STARTUP_SPREAD 秒内错开
+    first_delay = host_phase() * STARTUP_SPREAD
+    logging.info("首次上报将在 %.1f 秒后发送", first_delay)
+    scheduler.enterabs(start + first_delay, 0, report_job, (scheduler,))
     
-    while True:
-        try:
-            time.sleep(interval)
-            send_status()
-        except KeyboardInterrupt:
-            logging.info("收到停止信号，退出程序")
-            break
-        except Exception as e:
-            logging.error(f"主循环错误: {e}")
-            time.sleep(60)  # 出错后等待1分钟再继续
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        logging.info("收到停止信号，退出程序")
+    finally:
+        _executor.shutdown(wait=False)
+        _sender.shutdown(wait=False)
+        listener.stop()
 
 if __name__ == "__main__":
     main()
-
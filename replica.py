@@ -0,0 +1,201 @@
+"""
+VPS监控只读副本
+从主库的变更流（/api/changes）追赶上报、状态切换和删除，写入自己的数据库副本和内存缓存，
+对外提供与主库相同的查询接口（/api/latest、/api/history、图表、导出、/metrics 等），
+仪表盘和历史查询不再占用主库的上报处理能力。上报和删除请求返回 403。
+
+主库需在 config.json 中设置 "change_feed": true。用法：
+    python replica.py --primary http://primary:9000 --db replica.db --port 9001
+
+首次启动（或落后超出主库的变更保留范围）时先下载主库的数据库快照，之后长轮询变更流。
+复制延迟见 /replica/status 和 /metrics（vps_replica_lag_seconds、vps_replica_lag_changes）。
+"""
+import argparse
+import os
+import threading
+import time
+
+import requests
+
+import server
+
+logger = server.logger
+
+# 长轮询等待时间（秒）、每次拉取的变更条数、出错后的重试间隔（秒）
+POLL_WAIT = 10
+POLL_LIMIT = 1000
+RETRY_DELAY = 5
+
+STATE_TABLE_SQL = 'CREATE TABLE IF NOT EXISTS replica_state (key TEXT PRIMARY KEY, value INTEGER)'
+
+class Replicator:
+    """追赶主库变更流的后台线程"""
+
+    def __init__(self, primary, db_file, key):
+        self.primary = primary.rstrip('/')
+        self.db_file = db_file
+        self.key = key
+        self.cursor = 0          # 已重放的最后一条变更 id
+        self.head = 0            # 主库最新变更 id
+        self.applied = 0
+        self.last_applied_ts = None  # 最后重放的变更在主库的时间（毫秒）
+        self.last_sync = None        # 最近一次成功拉取的时间
+        self.session = requests.Session()
+
+    # 游标保存在副本数据库中，重启后从断点继续
+    def _load_cursor(self):
+        conn = server.connect_db()
+        try:
+            conn.execute(STATE_TABLE_SQL)
+            row = conn.execute("SELECT value FROM replica_state WHERE key = 'cursor'").fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def _save_cursor(self):
+        conn = server.connect_db()
+        try:
+            conn.execute(STATE_TABLE_SQL)
+            conn.execute("INSERT OR REPLACE INTO replica_state (key, value) VALUES ('cursor', ?)", (self.cursor,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def bootstrap(self):
+        """下载主库快照替换本地数据库，游标从快照包含的最后一条变更开始"""
+        logger.info("从主库下载快照: %s", self.primary)
+        partial = self.db_file + '.download'
+        with self.session.get(f"{self.primary}/api/changes/snapshot", params={'key': self.key},
+                              stream=True, timeout=60) as response:
+            response.raise_for_status()
+            cursor = int(response.headers['X-Change-Cursor'])
+            with open(partial, 'wb') as f:
+                for chunk in response.iter_content(1024 * 1024):
+                    f.write(chunk)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_file + suffix):
+                os.remove(self.db_file + suffix)
+        os.replace(partial, self.db_file)
+
+        # 副本不需要主库的变更记录
+        conn = server.connect_db()
+        conn.execute('DELETE FROM change_log')
+        conn.commit()
+        conn.close()
+        server.init_database()
+        with server.db_lock:
+            server._host_cache.clear()
+            server._series_cache.clear()
+            server.load_host_cache()
+        self.cursor = cursor
+        self._save_cursor()
+        logger.info("快照载入完成，变更游标 %d，%d 台主机", cursor, len(server._host_cache))
+
+    def start(self):
+        cursor = self._load_cursor() if os.path.exists(self.db_file) else None
+        if cursor is None:
+            self.bootstrap()
+        else:
+            self.cursor = cursor
+            server.init_database()
+            server.load_host_cache()
+            logger.info("从变更游标 %d 继续", cursor)
+        self.head = self.cursor
+        threading.Thread(target=self.run, name='replicator', daemon=True).start()
+
+    def poll(self):
+        """拉取并重放一批变更，返回本批条数"""
+        response = self.session.get(f"{self.primary}/api/changes", params={
+            'key': self.key, 'after': self.cursor, 'limit': POLL_LIMIT, 'wait': POLL_WAIT,
+        }, timeout=POLL_WAIT + 30)
+        if response.status_code == 410:
+            logger.warning("变更游标 %d 已超出主库保留范围，重新下载快照", self.cursor)
+            self.bootstrap()
+            return 0
+        response.raise_for_status()
+        result = response.json()
+        changes = result['changes']
+        for change in changes:
+            server.apply_change(change)
+            self.cursor = change['id']
+            self.last_applied_ts = change['ts']
+        self.head = max(result['head'], self.cursor)
+        self.applied += len(changes)
+        self.last_sync = time.time()
+        if changes:
+            self._save_cursor()
+        return len(changes)
+
+    def run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error("复制错误: %s", e, exc_info=True, extra={'event': 'replica_error'})
+                time.sleep(RETRY_DELAY)
+
+    def lag(self):
+        """(落后的变更条数, 落后的秒数)：已追平时秒数为 0，否则为最后重放的变更距今的时间"""
+        lag_changes = self.head - self.cursor
+        if lag_changes <= 0:
+            return 0, 0.0
+        if self.last_applied_ts is None:
+            return lag_changes, None
+        return lag_changes, max(0.0, time.time() - self.last_applied_ts / 1000)
+
+    def status(self):
+        lag_changes, lag_seconds = self.lag()
+        return {
+            'primary': self.primary,
+            'cursor': self.cursor,
+            'head': self.head,
+            'applied': self.applied,
+            'lag_changes': lag_changes,
+            'lag_seconds': round(lag_seconds, 3) if lag_seconds is not None else None,
+            'seconds_since_sync': round(time.time() - self.last_sync, 3) if self.last_sync else None,
+        }
+
+    def metric_lines(self):
+        status = self.status()
+        lines = [
+            '# HELP vps_replica_lag_changes Changes on the primary not yet applied by this replica.',
+            '# TYPE vps_replica_lag_changes gauge',
+            f"vps_replica_lag_changes {status['lag_changes']}",
+        ]
+        if status['lag_seconds'] is not None:
+            lines += [
+                '# HELP vps_replica_lag_seconds Age of the last applied change while behind the primary.',
+                '# TYPE vps_replica_lag_seconds gauge',
+                f"vps_replica_lag_seconds {status['lag_seconds']}",
+            ]
+        if status['seconds_since_sync'] is not None:
+            lines += [
+                '# HELP vps_replica_seconds_since_sync Seconds since the change feed was last read successfully.',
+                '# TYPE vps_replica_seconds_since_sync gauge',
+                f"vps_replica_seconds_since_sync {status['seconds_since_sync']}",
+            ]
+        return lines
+
+def main():
+    parser = argparse.ArgumentParser(description='VPS监控只读副本')
+    parser.add_argument('--primary', required=True, help='主库地址，如 http://primary:9000')
+    parser.add_argument('--db', default='replica.db', help='副本数据库文件')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=server.SERVER_PORT)
+    args = parser.parse_args()
+
+    server.setup_logging()
+    server.READ_ONLY = True
+    server.CHANGE_FEED_ENABLED = False
+    server.DB_FILE = args.db
+    replicator = Replicator(args.primary, args.db, server.SERVER_KEY)
+    replicator.start()
+    server._metric_renderers.append(replicator.metric_lines)
+    server.app.add_url_rule('/replica/status', 'replica_status', lambda: server.jsonify(replicator.status()))
+
+    logger.info("只读副本启动，主库 %s", args.primary)
+    server.app.run(host=args.host, port=args.port, threaded=True)
+
+if __name__ == '__main__':
+    main()
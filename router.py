@@ -0,0 +1,373 @@
+"""
+VPS监控查询路由（分片部署）
+多个服务端节点各自负责按主机名哈希划分的一部分主机、各用自己的 SQLite 数据库（互不共享），
+本路由不保存数据：
+- /api/status、/api/delete 以及带 hostname 参数的查询转发给该主机所属的分片
+- /api/latest（含分页和增量查询）和 /api/latest/summary 并发查询所有分片后合并；/api/history 并发查询后按时间 k 路归并再分页
+- 页面等其余非 API 路径转发给第一个分片
+
+本地试用（三个分片 + 路由）：
+    python async_server.py --port 9001 --db shard0.db --shard 0/3 --no-notify
+    python async_server.py --port 9002 --db shard1.db --shard 1/3 --no-notify
+    python async_server.py --port 9003 --db shard2.db --shard 2/3 --no-notify
+    python router.py --port 9000 --shards http://127.0.0.1:9001,http://127.0.0.1:9002,http://127.0.0.1:9003
+分片的顺序即分片序号，必须与各节点的 --shard 一致。
+"""
+import argparse
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from flask import Flask, Response, jsonify, request
+
+import server
+
+app = Flask(__name__)
+app.json = server.FastJSONProvider(app)
+app.after_request(server.compress_response)
+logger = server.logger
+
+# 分片地址列表，下标即分片序号
+SHARDS = server._config.get("shards", [])
+# 转发请求的超时（秒）
+SHARD_TIMEOUT = 10
+# 历史查询归并时每个分片最多读取的行数（page × page_size），更深的翻页请按 hostname 或日期缩小范围
+MAX_MERGE_WINDOW = 10000
+
+_session = requests.Session()
+_session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=64))
+_fanout = ThreadPoolExecutor(max_workers=32, thread_name_prefix='fanout')
+
+# 转发时不复制的请求头/响应头（响应的 Content-Encoding 除外）
+_SKIP_HEADERS = {'host', 'content-length', 'connection', 'keep-alive', 'transfer-encoding', 'content-encoding',
+                 'server', 'date'}
+
+def shard_url(hostname):
+    return SHARDS[server.shard_for(hostname or '', len(SHARDS))]
+
+def forward(base_url, path=None, params=None):
+    """把当前请求原样转发给一个分片，返回 Flask 响应（响应体流式转发）"""
+    upstream = _session.request(
+        request.method, base_url + (path or request.full_path.rstrip('?')),
+        params=params,
+        data=request.get_data(),
+        headers={name: value for name, value in request.headers.items() if name.lower() not in _SKIP_HEADERS},
+        timeout=SHARD_TIMEOUT, stream=True,
+    )
+    # 响应体不解压直接转发，保留分片的 Content-Encoding（导出接口 gzip=1）
+    headers = [(name, value) for name, value in upstream.raw.headers.items()
+               if name.lower() not in _SKIP_HEADERS or name.lower() == 'content-encoding']
+
+    def body():
+        try:
+            yield from upstream.raw.stream(64 * 1024, decode_content=False)
+        finally:
+            upstream.close()
+    return Response(body(), status=upstream.status_code, headers=headers)
+
+class ShardClientError(Exception):
+    """分片以 4xx 拒绝了请求（参数错误等）：各分片的判断相同，原样返回给客户端"""
+
+    def __init__(self, status, body):
+        super().__init__(status)
+        self.status = status
+        self.body = body
+
+@app.errorhandler(ShardClientError)
+def _shard_client_error(error):
+    return jsonify(error.body), error.status
+
+def fan_out(path, params):
+    """并发向所有分片发 GET 请求，返回 [(分片序号, JSON 或 None, 错误信息)]；params 为列表时按分片序号取各自的参数
+
+    只有连接失败和 5xx 计入错误信息；分片返回 4xx 时抛出 ShardClientError。
+    """
+    def fetch(index):
+        try:
+            response = _session.get(SHARDS[index] + path, params=params[index] if isinstance(params, list) else params,
+                                    timeout=SHARD_TIMEOUT)
+            if 400 <= response.status_code < 500:
+                try:
+                    body = response.json()
+                except ValueError:
+                    body = {"error": response.text}
+                return index, ShardClientError(response.status_code, body), None
+            response.raise_for_status()
+            return index, response.json(), None
+        except (requests.RequestException, ValueError) as e:
+            logger.warning("分片 %d 查询失败: %s", index, e, extra={'event': 'shard_error', 'shard': index})
+            return index, None, str(e)
+    results = list(_fanout.map(fetch, range(len(SHARDS))))
+    for _, result, _ in results:
+        if isinstance(result, ShardClientError):
+            raise result
+    return results
+
+@app.route('/api/status', methods=['POST'])
+def receive_status():
+    """按上报中的主机名转发给所属分片（密钥由分片校验）"""
+    data = request.get_json(silent=True) or {}
+    hostname = (data.get('data') or {}).get('hostname')
+    try:
+        return forward(shard_url(hostname))
+    except requests.RequestException as e:
+        logger.error("转发上报失败: %s", e, extra={'hostname': hostname})
+        return jsonify({"error": "Shard unavailable"}), 502
+
+@app.route('/api/delete/<path:hostname>', methods=['DELETE', 'POST'])
+def delete_vps(hostname):
+    from urllib.parse import unquote
+    try:
+        return forward(shard_url(unquote(hostname)))
+    except requests.RequestException:
+        return jsonify({"error": "Shard unavailable"}), 502
+
+def _columnar_requested():
+    """format 参数：分片总是按行返回，路由合并之后再转为列式"""
+    response_format = request.args.get('format', 'rows')
+    if response_format not in server.RESPONSE_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(server.RESPONSE_FORMATS)}")
+    return response_format == 'columnar'
+
+def _to_columnar(rows, columns):
+    """合并后的行（字典）转为 {"columns", "values"}；columns 为没有任何行时使用的列名"""
+    columns = list(rows[0]) if rows else columns
+    return server.columnar(columns, [tuple(row.get(column) for column in columns) for row in rows])
+
+def _shape(result, columns):
+    """format=columnar 时把结果中的 data 换为 columns 和 values"""
+    if _columnar_requested():
+        result.update(_to_columnar(result.pop('data'), columns))
+    return result
+
+# 分页查询的排序字段对应的结果列（与 server.LATEST_SORTS 一致）
+_LATEST_SORT_COLUMNS = {'last_seen': 'server_timestamp', 'hostname': 'hostname', 'cpu': 'cpu_percent',
+                        'memory': 'memory_percent', 'disk': 'disk_percent'}
+
+def _latest_page():
+    """分页查询：各分片取前 page × page_size 个主机，按同样的排序归并后取出本页"""
+    page = max(request.args.get('page', 1, type=int), 1)
+    page_size = min(max(request.args.get('page_size', 50, type=int), 1), server.LATEST_MAX_PAGE_SIZE)
+    sort = request.args.get('sort', 'last_seen')
+    if sort not in _LATEST_SORT_COLUMNS:
+        return jsonify({"error": f"sort must be one of: {', '.join(_LATEST_SORT_COLUMNS)}"}), 400
+    window = page * page_size
+    if window > MAX_MERGE_WINDOW:
+        return jsonify({"error": f"page * page_size must not exceed {MAX_MERGE_WINDOW}"}), 400
+    params = request.args.to_dict()
+    params.update(page=1, page_size=window)
+    params.pop('format', None)
+
+    runs, total, versions, errors = [], 0, [], []
+    for index, result, error in fan_out('/api/latest', params):
+        if error:
+            errors.append({'shard': index, 'error': error})
+            versions.append('')
+            continue
+        runs.append(result['data'])
+        total += result['total']
+        versions.append(result['version'])
+    column = _LATEST_SORT_COLUMNS[sort]
+    order = request.args.get('order')
+    descending = order == 'desc' if order else sort != 'hostname'
+    missing = '' if column in ('server_timestamp', 'hostname') else -1
+    merged = heapq.merge(*runs, key=lambda row: (row.get(column) if row.get(column) is not None else missing,
+                                                 row.get('hostname') or ''),
+                         reverse=descending)
+    result = {
+        'total': total,
+        'page': page,
+        'page_size': page_size,
+        'total_pages': (total + page_size - 1) // page_size,
+        'version': '/'.join(versions),
+        'data': list(merged)[(page - 1) * page_size:window],
+    }
+    if errors:
+        result['shard_errors'] = errors
+    return jsonify(_shape(result, server.LATEST_COLUMNS))
+
+def _latest_delta(since):
+    """增量查询：版本为各分片版本以 / 连接，各分片按自己的版本做增量后合并；
+    任一分片需要全量（或版本与分片数不符）时所有分片都返回全量，reset 为 true"""
+    versions = since.split('/')
+    if len(versions) != len(SHARDS):
+        versions = [''] * len(SHARDS)
+    results = fan_out('/api/latest', [{'since': version} for version in versions])
+    if any(error for _, _, error in results):
+        return jsonify({"error": "Shard unavailable"}), 502
+    if any(result['reset'] for _, result, _ in results) and not all(result['reset'] for _, result, _ in results):
+        results = fan_out('/api/latest', {'since': ''})
+        if any(error for _, _, error in results):
+            return jsonify({"error": "Shard unavailable"}), 502
+    return jsonify(_shape({
+        'version': '/'.join(result['version'] for _, result, _ in results),
+        'reset': results[0][1]['reset'] if results else False,
+        'data': [row for _, result, _ in results for row in result['data']],
+        'deleted': [hostname for _, result, _ in results for hostname in result['deleted']],
+    }, server.LATEST_COLUMNS))
+
+@app.route('/api/latest', methods=['GET'])
+def get_latest():
+    """合并各分片的最新状态（与单节点相同，按服务端时间倒序）；有分片失败时在 X-Shard-Errors 头中给出数量"""
+    try:
+        as_columnar = _columnar_requested()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if 'since' in request.args:
+        return _latest_delta(request.args.get('since'))
+    if any(arg in request.args for arg in server.LATEST_QUERY_ARGS):
+        return _latest_page()
+    params = request.args.to_dict()
+    params.pop('format', None)
+    merged, failed = [], 0
+    for _, result, error in fan_out('/api/latest', params):
+        if error:
+            failed += 1
+        else:
+            merged.extend(result)
+    merged.sort(key=lambda row: row.get('server_timestamp') or '', reverse=True)
+    response = jsonify(_to_columnar(merged, server.LATEST_COLUMNS) if as_columnar else merged)
+    if failed:
+        response.headers['X-Shard-Errors'] = str(failed)
+    return response
+
+@app.route('/api/latest/summary', methods=['GET'])
+def get_latest_summary():
+    """各分片汇总相加，平均值按各分片的样本数加权"""
+    results = fan_out('/api/latest/summary', {})
+    if any(error for _, _, error in results):
+        return jsonify({"error": "Shard unavailable"}), 502
+    summary = {key: sum(result[key] for _, result, _ in results) for key in ('total', 'online', 'offline')}
+    summary['metrics'] = {}
+    for metric in server.SUMMARY_METRICS:
+        parts = [result['metrics'][metric] for _, result, _ in results if result['metrics'][metric]['count']]
+        count = sum(part['count'] for part in parts)
+        summary['metrics'][metric] = {
+            'avg': round(sum(part['avg'] * part['count'] for part in parts) / count, 2) if count else None,
+            'max': max((part['max'] for part in parts), default=None),
+            'count': count,
+        }
+    return jsonify(summary)
+
+@app.route('/api/hosts', methods=['GET'])
+def get_hosts():
+    """合并各分片的主机名单（各分片结果已排序，归并后取前 limit 个）；版本为各分片版本的组合"""
+    params = request.args.to_dict()
+    since = params.pop('since', None)
+    results = fan_out('/api/hosts', params)
+    if any(error for _, _, error in results):
+        return jsonify({"error": "Shard unavailable"}), 502
+    version = '/'.join(result['version'] for _, result, _ in results)
+    if since == version:
+        return jsonify({"version": version, "unchanged": True})
+    limit = min(max(request.args.get('limit', server.HOSTS_DEFAULT_LIMIT, type=int), 1), server.HOSTS_MAX_LIMIT)
+    merged = heapq.merge(*(result['hosts'] for _, result, _ in results))
+    return jsonify({
+        "version": version,
+        "total": sum(result['total'] for _, result, _ in results),
+        "hosts": [hostname for hostname, _ in zip(merged, range(limit))],
+    })
+
+def _history_key(item):
+    """归并键：毫秒接收时间，同一毫秒内再按分片序号和分片内的 id 区分（各分片的 id 互相独立）"""
+    index, row = item
+    return (row.get('server_ts_ms') or 0, index, row.get('id') or 0)
+
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """历史记录：指定 hostname 时直接转发；否则各分片取前 page × page_size 条，按时间 k 路归并后取出本页"""
+    hostname = request.args.get('hostname')
+    if hostname:
+        try:
+            return forward(shard_url(hostname))
+        except requests.RequestException:
+            return jsonify({"error": "Shard unavailable"}), 502
+
+    try:
+        as_columnar = _columnar_requested()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    limit = request.args.get('limit', 100, type=int)
+    page = max(request.args.get('page', 1, type=int), 1)
+    page_size = request.args.get('page_size', limit, type=int)
+    window = page * page_size
+    if window > MAX_MERGE_WINDOW:
+        return jsonify({"error": f"page * page_size must not exceed {MAX_MERGE_WINDOW} without hostname"}), 400
+
+    params = request.args.to_dict()
+    params.update(page=1, page_size=window, limit=window)
+    params.pop('format', None)
+    # 归并需要毫秒时间和 id，未选时临时加上，返回前去掉
+    requested = [field.strip() for field in params['fields'].split(',')] if params.get('fields') else None
+    if requested:
+        params['fields'] = ','.join(requested + [key for key in ('server_ts_ms', 'id') if key not in requested])
+
+    runs, total, errors = [], 0, []
+    for index, result, error in fan_out('/api/history', params):
+        if error:
+            errors.append({'shard': index, 'error': error})
+            continue
+        runs.append([(index, row) for row in result['data']])
+        total += result['total']
+    # 每个分片的结果已按时间倒序，k 路归并只需读到本页末尾
+    merged = heapq.merge(*runs, key=_history_key, reverse=True)
+    rows = [row for _, row in itertools.islice(merged, (page - 1) * page_size, window)]
+    if requested:
+        rows = [{field: row.get(field) for field in requested} for row in rows]
+
+    result = {
+        'total': total,
+        'page': page,
+        'page_size': page_size,
+        'total_pages': (total + page_size - 1) // page_size if page_size > 0 else 1,
+        'data': rows,
+    }
+    if errors:
+        result['shard_errors'] = errors
+    if as_columnar:
+        result.update(_to_columnar(result.pop('data'), requested or server.HISTORY_FIELDS))
+    return jsonify(result)
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """路由自身及各分片的存活状态"""
+    shards = [{'shard': index, 'url': SHARDS[index], 'ok': error is None}
+              for index, _, error in fan_out('/healthz', {})]
+    return jsonify({"status": "ok" if all(shard['ok'] for shard in shards) else "degraded", "shards": shards})
+
+@app.route('/', defaults={'path': ''}, methods=['GET'])
+@app.route('/<path:path>', methods=['GET'])
+def passthrough(path):
+    """带 hostname 参数的查询转发给所属分片；其余 API 需要全部分片的数据，路由暂不支持；页面转发给第一个分片"""
+    hostname = request.args.get('hostname')
+    if hostname:
+        target = shard_url(hostname)
+    elif path.startswith('api/') or path.startswith('debug/') or path == 'metrics':
+        return jsonify({"error": f"/{path} requires a hostname parameter when served through the router; "
+                                 "query the shards directly for fleet-wide data"}), 400
+    else:
+        target = SHARDS[0]
+    try:
+        return forward(target)
+    except requests.RequestException:
+        return jsonify({"error": "Shard unavailable"}), 502
+
+def main():
+    global SHARDS
+    parser = argparse.ArgumentParser(description='VPS监控查询路由（分片部署）')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=server.SERVER_PORT)
+    parser.add_argument('--shards', help='分片地址，逗号分隔，顺序即分片序号（默认使用 config.json 中的 shards）')
+    args = parser.parse_args()
+    if args.shards:
+        SHARDS = [url.strip().rstrip('/') for url in args.shards.split(',') if url.strip()]
+    if not SHARDS:
+        parser.error('未配置分片地址（--shards 或 config.json 中的 shards）')
+
+    server.setup_logging()
+    logger.info("查询路由启动，%d 个分片: %s", len(SHARDS), ', '.join(SHARDS))
+    app.run(host=args.host, port=args.port, threaded=True)
+
+if __name__ == '__main__':
+    main()
@@ -2,23 +2,60 @@
 VPS监控服务端脚本
 接收VPS状态信息并提供Web界面显示
 """
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, g, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 import json
 import os
 from datetime import datetime, timedelta
 import sqlite3
-from threading import Lock, Thread
+import math
+import csv
+import io
+import zlib
+import gzip
+import hashlib
+import itertools
+import bisect
+import functools
+import random
+import cProfile
+import pstats
+import operator
+import atexit
+import copy
+import logging
+import logging.handlers
+import queue
+import tempfile
+from collections import OrderedDict
+from threading import Condition, Lock, Thread
 import requests
 import time
 
+try:
+    import numpy as np
+except ImportError:  # 可选依赖：仅 /api/analytics 需要
+    np = None
+
+try:
+    import brotli
+except ImportError:  # 可选依赖：未安装时只使用 gzip 压缩
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # 可选依赖：未安装时使用标准库 json
+    orjson = None
+
 app = Flask(__name__)
+logger = logging.getLogger('vps_monitor')
 
 # Load configuration from config.json
 def load_config():
     """Load configuration from config.json file"""
     config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
     if not os.path.exists(config_path):
-        print(f"Warning: config.json not found, using default values")
+        logger.warning("config.json not found, using default values")
         return {}
     with open(config_path, 'r', encoding='utf-8') as f:
         return json.load(f)
@@ -31,97 +68,737 @@ SERVER_KEY = _config.get("server_key", "your-secret-key")
 ALERT_INTERVAL_MINUTES = _config.get("alert_interval_minutes", 20)
 TIMEZONE_OFFSET_HOURS = _config.get("timezone_offset_hours", 0)
 SERVER_PORT = _config.get("server_port", 9000)
+# 客户端上报间隔（秒），在 /api/status 响应的 X-Report-Interval 头中下发给客户端
+REPORT_INTERVAL_SECONDS = _config.get("report_interval_seconds", 900)
+# 期望的全机群平均上报速率上限（次/秒），主机数多时自动拉长下发的间隔；0 表示不限制
+MAX_INGEST_RATE = _config.get("max_ingest_rate", 0)
+
+# 分片：多个服务端各自负责按主机名哈希划分的一部分主机（shard_count 为 1 时不分片）
+SHARD_INDEX = _config.get("shard_index", 0)
+SHARD_COUNT = _config.get("shard_count", 1)
+
+# 变更流：主库把每次上报、状态切换和删除追加到 change_log，供只读副本（replica.py）追赶；默认关闭
+CHANGE_FEED_ENABLED = _config.get("change_feed", False)
+# change_log 保留的最近变更条数，落后更多的副本需要重新拉取快照
+CHANGE_FEED_RETENTION = _config.get("change_feed_retention", 100000)
+# 只读副本模式（由 replica.py 设置）：拒绝上报和删除，不做断联检测和通知
+READ_ONLY = False
+
+# ---------------------------------------------------------------------------
+# JSON 序列化：安装了 orjson 时 jsonify 和流式接口都用 orjson，否则使用标准库
+# ---------------------------------------------------------------------------
+
+# auto：有 orjson 就用；json：始终使用标准库
+JSON_BACKEND = _config.get("json_backend", "auto")
+
+def _use_orjson():
+    return orjson is not None and JSON_BACKEND != 'json'
+
+def dumps_json(obj):
+    """紧凑的 JSON 文本（非 ASCII 字符不转义）"""
+    if _use_orjson():
+        return orjson.dumps(obj, default=DefaultJSONProvider.default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(obj, default=DefaultJSONProvider.default, ensure_ascii=False, separators=(',', ':'))
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify 的序列化后端：使用 orjson 时直接输出字节，不再经过 str；否则与 Flask 默认实现相同
+
+    orjson 不对键排序，响应中字段的顺序即字典的插入顺序。
+    """
+    def dumps(self, obj, **kwargs):
+        if not _use_orjson() or kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps_json(obj)
+
+    def response(self, *args, **kwargs):
+        if not _use_orjson():
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+app.json = FastJSONProvider(app)
+
+def columnar(columns, rows):
+    """列式结果：{"columns": [列名...], "values": [[第1列的值...], [第2列的值...]]}，直接由行元组转置，不构造字典"""
+    return {"columns": list(columns), "values": [list(column) for column in zip(*rows)] if rows else [[] for _ in columns]}
 
 # PushPlus notification config
 PUSHPLUS_TOKEN = _config.get("pushplus_token", "")
 PUSHPLUS_URL = _config.get("pushplus_url", "https://www.pushplus.plus/send")
 
+# ---------------------------------------------------------------------------
+# 日志：调用方只把记录放进内存队列，由后台 QueueListener 线程写控制台和滚动文件（JSON 行）
+# ---------------------------------------------------------------------------
+
+LOG_LEVEL = _config.get("log_level", "INFO")
+LOG_FILE = _config.get("log_file", "monitor_server.log")
+LOG_MAX_BYTES = _config.get("log_max_bytes", 10 * 1024 * 1024)
+LOG_BACKUP_COUNT = _config.get("log_backup_count", 5)
+# 同一处代码的 WARNING 及以上日志，每个窗口内最多输出的条数
+LOG_RATE_LIMIT = _config.get("log_rate_limit", 10)
+LOG_RATE_WINDOW = _config.get("log_rate_window_seconds", 60)
+LOG_QUEUE_SIZE = 10000
+
+# LogRecord 自带的属性，其余属性（extra=...）作为结构化字段输出
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """每条记录输出为一行 JSON：时间、级别、logger、消息、异常和 extra 字段"""
+    
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).strftime(TIME_FORMAT) + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class RateLimitFilter(logging.Filter):
+    """限制重复错误：按代码位置计数，窗口内超出 limit 的 WARNING 及以上记录被丢弃，
+    下一个窗口的第一条记录带上 suppressed 字段说明丢弃了多少条"""
+    
+    def __init__(self, limit, window):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._windows = {}  # (pathname, lineno) -> [窗口开始时间, 已输出条数, 已丢弃条数]
+    
+    def filter(self, record):
+        if record.levelno < logging.WARNING or not self.limit:
+            return True
+        key = (record.pathname, record.lineno)
+        state = self._windows.get(key)
+        if state is None or record.created - state[0] >= self.window:
+            suppressed = state[2] if state else 0
+            self._windows[key] = [record.created, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        if state[1] < self.limit:
+            state[1] += 1
+            return True
+        state[2] += 1
+        return False
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时丢弃记录而不是阻塞调用方；入队前把消息和异常格式化为字符串"""
+    
+    dropped = 0
+    
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+_log_queue = None
+_log_listener = None
+
+def setup_logging():
+    """配置根 logger：经由队列异步写入控制台（文本）和滚动日志文件（JSON 行）"""
+    global _log_queue, _log_listener
+    if _log_listener is not None:
+        return
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    handlers = [console]
+    if LOG_FILE:
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    
+    _log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(_log_queue)
+    queue_handler.addFilter(RateLimitFilter(LOG_RATE_LIMIT, LOG_RATE_WINDOW))
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    
+    _log_listener = logging.handlers.QueueListener(_log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
+# ---------------------------------------------------------------------------
+# 自身运行统计：固定桶直方图 + 计数器，/debug/stats 查看
+# ---------------------------------------------------------------------------
+
+# 直方图桶上界（毫秒），最后一个桶收集所有更慢的样本
+LATENCY_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class Histogram:
+    """固定桶直方图：记录一次观测只是一次二分查找和几次加法，内存与样本数无关"""
+    
+    __slots__ = ('counts', 'count', 'total', 'max')
+    
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+    
+    def percentile(self, q):
+        """按桶内线性插值估计分位数"""
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = LATENCY_BUCKETS_MS[index - 1] if index else 0.0
+                upper = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max
+                return round(min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max), 3)
+            seen += bucket_count
+        return round(self.max, 3)
+    
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count, 3) if self.count else None,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': round(self.max, 3),
+        }
+
+_stats_lock = Lock()
+_histograms = {}
+_counters = {}
+_started_at = time.time()
+
+def observe(name, value_ms):
+    """记录一次耗时（毫秒）"""
+    with _stats_lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(value_ms)
+
+def incr(name, amount=1):
+    """计数器加一"""
+    with _stats_lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def timed(name):
+    """装饰器：把函数耗时记入直方图 name"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, (time.perf_counter() - start) * 1000)
+        return wrapper
+    return decorator
+
+class InstrumentedLock:
+    """带统计的互斥锁：记录等待者数量（队列深度）、等待时间和持有时间"""
+    
+    def __init__(self, name):
+        self.name = name
+        self.waiting = 0
+        self._lock = Lock()
+        self._acquired_at = 0.0
+    
+    def __enter__(self):
+        start = time.perf_counter()
+        with _stats_lock:
+            self.waiting += 1
+        self._lock.acquire()
+        with _stats_lock:
+            self.waiting -= 1
+        self._acquired_at = time.perf_counter()
+        observe(f'{self.name}.wait', (self._acquired_at - start) * 1000)
+        return self
+    
+    def __exit__(self, *exc_info):
+        held = time.perf_counter() - self._acquired_at
+        self._lock.release()
+        observe(f'{self.name}.hold', held * 1000)
+        return False
+
+class TrackedConnection(sqlite3.Connection):
+    """统计关闭次数的连接（打开次数在 connect_db 中统计）"""
+    
+    def close(self):
+        incr('db.connections_closed')
+        super().close()
+
+def connect_db(**kwargs):
+    """打开数据库连接（所有连接都经由这里，便于统计）"""
+    incr('db.connections_opened')
+    return sqlite3.connect(DB_FILE, factory=TrackedConnection, **kwargs)
+
 # 数据库锁
-db_lock = Lock()
+db_lock = InstrumentedLock('db_lock')
 
-def init_database():
-    """初始化数据库"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+class Overloaded(Exception):
+    """准入控制拒绝请求：status 为应返回的 HTTP 状态码（429 排队已满 / 503 排队超时）"""
     
-    # 检查表是否存在
-    cursor.execute('''
-        SELECT name FROM sqlite_master 
-        WHERE type='table' AND name='status_log'
+    def __init__(self, status, retry_after):
+        super().__init__(f"server overloaded ({status}), retry after {retry_after}s")
+        self.status = status
+        self.retry_after = retry_after
+
+class AdmissionGate:
+    """准入控制：最多 max_in_flight 个请求同时执行，另有 queue_size 个排队名额
+
+    排队名额用完时立即拒绝（429），排队超过 queue_timeout 秒仍未轮到也拒绝（503），
+    避免请求在锁后面越积越多、直到客户端超时重发。
+    reserve() 占排队名额、start() 等待执行名额、finish() 归还，可以在不同线程中调用。
+    """
+    
+    def __init__(self, name, max_in_flight, queue_size, queue_timeout):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._service_ms = None  # 单个请求执行耗时的指数移动平均，用于估算 Retry-After
+        self._cond = Condition()
+    
+    def retry_after(self):
+        """按当前积压量和平均执行耗时估算排空所需的秒数"""
+        service_ms = self._service_ms if self._service_ms is not None else 1000
+        backlog = self.in_flight + self.waiting
+        seconds = math.ceil(backlog * service_ms / max(self.max_in_flight, 1) / 1000)
+        return min(max(seconds, 1), REPORT_INTERVAL_SECONDS)
+    
+    def _shed(self, status, reason):
+        incr(f'{self.name}.shed.{reason}')
+        return Overloaded(status, self.retry_after())
+    
+    def reserve(self):
+        """占用一个排队名额，返回占用时刻；已满时抛出 Overloaded(429)"""
+        with self._cond:
+            if self.in_flight + self.waiting >= self.max_in_flight + self.queue_size:
+                raise self._shed(429, 'queue_full')
+            self.waiting += 1
+        return time.perf_counter()
+    
+    def start(self, reserved_at):
+        """等待执行名额，返回开始执行的时刻；排队超时抛出 Overloaded(503)"""
+        deadline = reserved_at + self.queue_timeout
+        with self._cond:
+            while self.in_flight >= self.max_in_flight or time.perf_counter() >= deadline:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self.waiting -= 1
+                    raise self._shed(503, 'timeout')
+                self._cond.wait(remaining)
+            self.waiting -= 1
+            self.in_flight += 1
+        started = time.perf_counter()
+        observe(f'{self.name}.queue_wait', (started - reserved_at) * 1000)
+        return started
+    
+    def finish(self, started_at):
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        with self._cond:
+            self.in_flight -= 1
+            self._service_ms = elapsed_ms if self._service_ms is None else 0.8 * self._service_ms + 0.2 * elapsed_ms
+            self._cond.notify()
+
+# 时间格式（服务端统一使用本地时间）
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 指标存储限制：防止客户端上报的任意指标名导致序列数量失控
+MAX_SERIES_PER_HOST = _config.get("max_series_per_host", 1000)
+MAX_METRIC_NAME_LENGTH = 128
+
+# 旧版 status_log 中按列存储的数值指标（顺序与旧表列顺序一致）
+LEGACY_METRICS = [
+    'cpu_percent',
+    'memory_total_gb',
+    'memory_used_gb',
+    'memory_percent',
+    'disk_total_gb',
+    'disk_used_gb',
+    'disk_percent',
+]
+# 旧版中的整数指标
+LEGACY_INT_METRICS = ['uptime_seconds']
+
+# 几乎不变的主机属性：存放在 host_version 中，变化时才新增一个版本
+HOST_ATTRIBUTES = ['local_ip', 'boot_time', 'memory_total_gb', 'disk_total_gb']
+
+# /metrics 导出的最新指标：上报指标名 -> (Prometheus 指标名, 说明)
+PROMETHEUS_GAUGES = {
+    'cpu_percent': ('vps_cpu_percent', 'CPU usage percent.'),
+    'memory_percent': ('vps_memory_percent', 'Memory usage percent.'),
+    'disk_percent': ('vps_disk_percent', 'Disk usage percent.'),
+    'uptime_seconds': ('vps_uptime_seconds', 'Host uptime in seconds.'),
+}
+
+# 主机缓存：hostname -> {"host_id", "version_id", "attrs", "last_ts", "last_report_id", "status", "interval", "gauges"}
+# last_ts 为该主机最近一次上报的时间戳，保证同一主机的时间戳严格递增；
+# status 为最近一条上报记录的状态；interval 为当前未结束的可用性区间 (id, state)；
+# gauges 为最近一次上报中 PROMETHEUS_GAUGES 的取值
+_host_cache = {}
+_host_cache_loaded = False
+# 主机缓存版本：缓存内容变化时递增（需在 db_lock 内修改），用于判断 /metrics 是否需要重新渲染
+_host_cache_version = 0
+# 主机名单版本：只在主机加入或移出缓存时递增，/api/hosts 据此判断名单是否变化
+_host_registry_version = 0
+_host_names = (None, [])  # (名单版本, 排序后的主机名)
+
+# 最新状态变更日志：hostname -> (序号, 是否已删除)，按序号递增排列，每台主机只保留最后一次变更；
+# 上报、在线状态切换和删除时追加，/api/latest?since=<version> 据此只返回变化的主机和被删除的主机
+_latest_log = OrderedDict()
+_latest_seq = 0
+_latest_floor = 0  # 不大于它的变更已无法区分（重新载入缓存或墓碑被清理），since 更早时返回全量
+_latest_log_lock = Lock()
+# 保留的已删除主机（墓碑）数上限
+LATEST_TOMBSTONE_LIMIT = 10000
+
+# 序列ID缓存：host_id -> {metric: series_id}
+_series_cache = {}
+
+def to_epoch_ms(time_str):
+    """把 'YYYY-MM-DD HH:MM:SS' 本地时间字符串转换为毫秒时间戳，格式错误抛出ValueError"""
+    return int(datetime.strptime(time_str, TIME_FORMAT).timestamp()) * 1000
+
+def _metric_column_sql(metric, cast_int=False):
+    """生成视图中还原旧版指标列的子查询"""
+    value = 'CAST(p.value AS INTEGER)' if cast_int else 'p.value'
+    return f'''(SELECT {value} FROM metric_series s
+            JOIN metric_points p ON p.series_id = s.series_id AND p.ts = r.ts
+            WHERE s.host_id = r.host_id AND s.metric = '{metric}') AS {metric}'''
+
+def _create_status_log_view(cursor):
+    """创建兼容视图 status_log，列与旧版表保持一致"""
+    cursor.execute('DROP VIEW IF EXISTS status_log')
+    cursor.execute(f'''
+        CREATE VIEW status_log AS
+        SELECT
+            r.id,
+            h.hostname,
+            v.local_ip,
+            r.client_timestamp,
+            strftime('%Y-%m-%d %H:%M:%S', r.ts / 1000, 'unixepoch', 'localtime') AS server_timestamp,
+            r.ts AS server_ts_ms,
+            {_metric_column_sql('cpu_percent')},
+            v.memory_total_gb,
+            {_metric_column_sql('memory_used_gb')},
+            {_metric_column_sql('memory_percent')},
+            v.disk_total_gb,
+            {_metric_column_sql('disk_used_gb')},
+            {_metric_column_sql('disk_percent')},
+            v.boot_time,
+            {_metric_column_sql('uptime_seconds', cast_int=True)},
+            r.status
+        FROM status_report r
+        JOIN host h ON h.host_id = r.host_id
+        LEFT JOIN host_version v ON v.version_id = r.version_id
     ''')
-    table_exists = cursor.fetchone() is not None
+
+def _migrate_legacy_columns(cursor):
+    """旧版 status_log 表的字段迁移（timestamp/received_at -> client_timestamp/server_timestamp）"""
+    cursor.execute('PRAGMA table_info(status_log)')
+    columns = [col[1] for col in cursor.fetchall()]
     
-    if not table_exists:
-        # 创建新表
+    if 'timestamp' in columns and 'server_timestamp' not in columns:
+        # 迁移旧数据：将timestamp改为client_timestamp，received_at改为server_timestamp
         cursor.execute('''
-            CREATE TABLE status_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                hostname TEXT NOT NULL,
-                local_ip TEXT,
-                client_timestamp TEXT NOT NULL,
-                server_timestamp TEXT NOT NULL,
-                cpu_percent REAL,
-                memory_total_gb REAL,
-                memory_used_gb REAL,
-                memory_percent REAL,
-                disk_total_gb REAL,
-                disk_used_gb REAL,
-                disk_percent REAL,
-                boot_time TEXT,
-                uptime_seconds INTEGER,
-                status TEXT DEFAULT 'online'
-            )
+            ALTER TABLE status_log 
+            RENAME COLUMN timestamp TO client_timestamp
         ''')
         cursor.execute('''
-            CREATE INDEX idx_server_timestamp ON status_log(server_timestamp DESC)
+            ALTER TABLE status_log 
+            RENAME COLUMN received_at TO server_timestamp
         ''')
+    elif 'server_timestamp' not in columns:
+        # 添加新字段
         cursor.execute('''
-            CREATE INDEX idx_hostname ON status_log(hostname)
+            ALTER TABLE status_log 
+            ADD COLUMN server_timestamp TEXT
         ''')
-    else:
-        # 检查是否需要迁移旧数据
-        cursor.execute('PRAGMA table_info(status_log)')
-        columns = [col[1] for col in cursor.fetchall()]
-        
-        if 'timestamp' in columns and 'server_timestamp' not in columns:
-            # 迁移旧数据：将timestamp改为client_timestamp，received_at改为server_timestamp
-            cursor.execute('''
-                ALTER TABLE status_log 
-                RENAME COLUMN timestamp TO client_timestamp
-            ''')
-            cursor.execute('''
-                ALTER TABLE status_log 
-                RENAME COLUMN received_at TO server_timestamp
-            ''')
-            cursor.execute('DROP INDEX IF EXISTS idx_timestamp')
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_server_timestamp 
-                ON status_log(server_timestamp DESC)
-            ''')
-        elif 'server_timestamp' not in columns:
-            # 添加新字段
-            cursor.execute('''
-                ALTER TABLE status_log 
-                ADD COLUMN server_timestamp TEXT
-            ''')
-            cursor.execute('''
-                ALTER TABLE status_log 
-                ADD COLUMN client_timestamp TEXT
-            ''')
-            # 迁移数据
-            cursor.execute('''
-                UPDATE status_log 
-                SET server_timestamp = received_at,
-                    client_timestamp = timestamp
-                WHERE server_timestamp IS NULL
-            ''')
-            cursor.execute('DROP INDEX IF EXISTS idx_timestamp')
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_server_timestamp 
-                ON status_log(server_timestamp DESC)
-            ''')
+        cursor.execute('''
+            ALTER TABLE status_log 
+            ADD COLUMN client_timestamp TEXT
+        ''')
+        # 迁移数据
+        cursor.execute('''
+            UPDATE status_log 
+            SET server_timestamp = received_at,
+                client_timestamp = timestamp
+            WHERE server_timestamp IS NULL
+        ''')
+
+def _load_reports(cursor, rows):
+    """迁移用：按 (hostname, ts) 顺序写入 host、host_version 和 status_report
+
+    rows 的每一项为 (id, hostname, client_timestamp, ts, status, local_ip, boot_time,
+    memory_total_gb, disk_total_gb)，主机属性变化时才新增版本。
+    """
+    writer = cursor.connection.cursor()
+    host_id = version_id = None
+    current_host = current_attrs = None
+    for row in rows:
+        report_id, hostname, client_timestamp, ts, status = row[:5]
+        attrs = tuple(row[5:])
+        if hostname != current_host:
+            writer.execute('INSERT INTO host (hostname) VALUES (?)', (hostname,))
+            host_id = writer.lastrowid
+            current_host, current_attrs = hostname, None
+        if attrs != current_attrs:
+            writer.execute('''
+                INSERT INTO host_version (host_id, valid_from, local_ip, boot_time, memory_total_gb, disk_total_gb)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (host_id, ts) + attrs)
+            version_id = writer.lastrowid
+            current_attrs = attrs
+        writer.execute('''
+            INSERT INTO status_report (id, host_id, version_id, client_timestamp, ts, status)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (report_id, host_id, version_id, client_timestamp, ts, status))
+
+def _migrate_status_log_table(cursor):
+    """把旧版按列存储的 status_log 表迁移到 host + status_report + metric_points"""
+    _migrate_legacy_columns(cursor)
+    
+    # 服务端时间为本地时间字符串，'utc' 修饰符将其换算为UTC时间戳；
+    # 旧数据只精确到秒，用 id 填充毫秒位，避免同一秒内的多条记录在 metric_points 中冲突
+    cursor.execute('''
+        CREATE TEMP TABLE legacy_ts AS
+        SELECT id, CAST(strftime('%s', COALESCE(server_timestamp, client_timestamp), 'utc') AS INTEGER) * 1000 + id % 1000 AS ts
+        FROM status_log
+        WHERE COALESCE(server_timestamp, client_timestamp) IS NOT NULL
+    ''')
+    reader = cursor.connection.cursor()
+    reader.execute('''
+        SELECT l.id, l.hostname, l.client_timestamp, t.ts, COALESCE(l.status, 'online'),
+               l.local_ip, l.boot_time, l.memory_total_gb, l.disk_total_gb
+        FROM status_log l JOIN legacy_ts t ON t.id = l.id
+        ORDER BY l.hostname, t.ts
+    ''')
+    _load_reports(cursor, reader)
+    
+    for metric in LEGACY_METRICS + LEGACY_INT_METRICS:
+        if metric in HOST_ATTRIBUTES:
+            continue
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO metric_series (host_id, metric)
+            SELECT DISTINCT h.host_id, '{metric}'
+            FROM status_log l JOIN host h ON h.hostname = l.hostname
+            WHERE l.{metric} IS NOT NULL
+        ''')
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO metric_points (series_id, ts, value)
+            SELECT s.series_id, r.ts, l.{metric}
+            FROM status_log l
+            JOIN status_report r ON r.id = l.id
+            JOIN metric_series s ON s.host_id = r.host_id AND s.metric = '{metric}'
+            WHERE l.{metric} IS NOT NULL
+        ''')
+    cursor.execute('DROP TABLE legacy_ts')
+    cursor.execute('DROP TABLE status_log')
+    logger.info("已将旧版 status_log 表迁移为通用指标存储")
+
+def _migrate_hostname_tables(cursor):
+    """把以 hostname 为键的 status_report/metric_series 迁移到 host 维度表（整数 host_id）
+
+    metric_points 的 series_id 和 ts 保持不变，只需重建序列字典。
+    """
+    reader = cursor.connection.cursor()
+    reader.execute(f'''
+        SELECT r.id, r.hostname, r.client_timestamp, r.ts, r.status, r.local_ip, r.boot_time,
+            (SELECT p.value FROM metric_series_v1 s JOIN metric_points p ON p.series_id = s.series_id AND p.ts = r.ts
+             WHERE s.hostname = r.hostname AND s.metric = 'memory_total_gb'),
+            (SELECT p.value FROM metric_series_v1 s JOIN metric_points p ON p.series_id = s.series_id AND p.ts = r.ts
+             WHERE s.hostname = r.hostname AND s.metric = 'disk_total_gb')
+        FROM status_report_v1 r
+        ORDER BY r.hostname, r.ts
+    ''')
+    _load_reports(cursor, reader)
+    
+    cursor.execute('''
+        INSERT INTO metric_series (series_id, host_id, metric)
+        SELECT s.series_id, h.host_id, s.metric
+        FROM metric_series_v1 s JOIN host h ON h.hostname = s.hostname
+    ''')
+    cursor.execute('DROP TABLE status_report_v1')
+    cursor.execute('DROP TABLE metric_series_v1')
+    logger.info("已将主机属性迁移到 host 维度表")
+
+def _backfill_availability(cursor):
+    """根据历史上报的时间间隔重建可用性区间（间隔超过断联阈值即为一段断联）"""
+    threshold = ALERT_INTERVAL_MINUTES * 60000
+    now_ts = int(time.time() * 1000)
+    writer = cursor.connection.cursor()
+    
+    reader = cursor.connection.cursor()
+    reader.execute('SELECT host_id, ts FROM status_report ORDER BY host_id, ts')
+    current_host = last_ts = interval_id = None
+    for host_id, ts in itertools.chain(reader, [(None, None)]):
+        if host_id == current_host and ts - last_ts <= threshold:
+            last_ts = ts
+            continue
+        if current_host is not None and (host_id == current_host or now_ts - last_ts > threshold):
+            # 上一段在线在超过阈值时结束，之后是断联（同一主机则持续到本次上报）
+            writer.execute('UPDATE host_availability SET end_ts = ? WHERE id = ?', (last_ts + threshold, interval_id))
+            writer.execute('''
+                INSERT INTO host_availability (host_id, state, start_ts, end_ts) VALUES (?, 'offline', ?, ?)
+            ''', (current_host, last_ts + threshold, ts if host_id == current_host else None))
+        if host_id is not None:
+            writer.execute('''
+                INSERT INTO host_availability (host_id, state, start_ts) VALUES (?, 'online', ?)
+            ''', (host_id, ts))
+            interval_id = writer.lastrowid
+        current_host, last_ts = host_id, ts
+    logger.info("已根据历史上报记录回填可用性区间")
+
+def init_database():
+    """初始化数据库"""
+    conn = connect_db(isolation_level=None)
+    cursor = conn.cursor()
+    # WAL模式：长时间的读（导出、历史查询）不阻塞写入，写入也不阻塞读
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('BEGIN')
+    
+    # 检查现有表结构，判断需要哪种迁移
+    cursor.execute("SELECT name, type FROM sqlite_master WHERE name IN ('status_log', 'status_report')")
+    existing = dict(cursor.fetchall())
+    legacy_table = existing.get('status_log') == 'table'
+    hostname_keyed = False
+    if 'status_report' in existing:
+        cursor.execute('PRAGMA table_info(status_report)')
+        hostname_keyed = 'hostname' in [col[1] for col in cursor.fetchall()]
+    if hostname_keyed:
+        # 以 hostname 为键的上一版结构：先改名，建好新表后再迁移
+        cursor.execute('DROP VIEW IF EXISTS status_log')
+        cursor.execute('DROP INDEX IF EXISTS idx_report_ts')
+        cursor.execute('DROP INDEX IF EXISTS idx_report_hostname_ts')
+        cursor.execute('ALTER TABLE status_report RENAME TO status_report_v1')
+        cursor.execute('ALTER TABLE metric_series RENAME TO metric_series_v1')
+    
+    # 主机维度表：hostname 只存一次，事实表中用整数 host_id 引用
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS host (
+            host_id INTEGER PRIMARY KEY,
+            hostname TEXT NOT NULL UNIQUE
+        )
+    ''')
+    # 主机属性版本：IP、启动时间、内存/磁盘总量变化时才新增一行
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS host_version (
+            version_id INTEGER PRIMARY KEY,
+            host_id INTEGER NOT NULL,
+            valid_from INTEGER NOT NULL,
+            local_ip TEXT,
+            boot_time TEXT,
+            memory_total_gb REAL,
+            disk_total_gb REAL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_host_version_host ON host_version(host_id, valid_from)')
+    
+    # 上报记录：每次上报一行，只保存主机/版本引用和状态；ts 为服务端毫秒时间戳
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS status_report (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            host_id INTEGER NOT NULL,
+            version_id INTEGER,
+            client_timestamp TEXT,
+            ts INTEGER NOT NULL,
+            status TEXT DEFAULT 'online'
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_report_ts ON status_report(ts)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_report_host_ts ON status_report(host_id, ts)')
+    
+    # 序列字典：每个 (主机, 指标名) 对应一个整数序列ID
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS metric_series (
+            series_id INTEGER PRIMARY KEY,
+            host_id INTEGER NOT NULL,
+            metric TEXT NOT NULL,
+            UNIQUE(host_id, metric)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_series_metric ON metric_series(metric)')
+    # 指标数据点：主键 (series_id, ts) 即覆盖索引，按序列的时间范围查询只需一次范围扫描
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS metric_points (
+            series_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            value REAL,
+            PRIMARY KEY (series_id, ts)
+        ) WITHOUT ROWID
+    ''')
+    
+    # 可用性区间：每个主机的在线/断联时段，只在状态切换时写入；end_ts 为空表示尚未结束
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS host_availability (
+            id INTEGER PRIMARY KEY,
+            host_id INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            start_ts INTEGER NOT NULL,
+            end_ts INTEGER
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_availability_host ON host_availability(host_id, start_ts)')
+    
+    # 变更流：kind 为 report（payload 为上报数据）/ status（payload 为新状态和起始时间）/ delete
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            hostname TEXT NOT NULL,
+            payload TEXT
+        )
+    ''')
+    
+    if legacy_table:
+        _migrate_status_log_table(cursor)
+    elif hostname_keyed:
+        _migrate_hostname_tables(cursor)
+    
+    # 已有上报记录但还没有可用性区间时，根据上报间隔回填
+    cursor.execute('SELECT EXISTS(SELECT 1 FROM host_availability), EXISTS(SELECT 1 FROM status_report)')
+    has_intervals, has_reports = cursor.fetchone()
+    if has_reports and not has_intervals:
+        _backfill_availability(cursor)
+    
+    # 兼容视图：现有查询和外部工具仍可使用 status_log
+    _create_status_log_view(cursor)
     
     # 创建通知记录表（用于避免重复发送通知）
+    # 旧表的唯一键不含 alert_type，同一时刻触发的多条规则告警会互相覆盖，需要重建
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'alert_log'")
+    row = cursor.fetchone()
+    legacy_alert_log = row is not None and 'UNIQUE(hostname, alert_time)' in row[0]
+    if legacy_alert_log:
+        cursor.execute('DROP INDEX IF EXISTS idx_alert_hostname')
+        cursor.execute('ALTER TABLE alert_log RENAME TO alert_log_v1')
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS alert_log (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -129,154 +806,723 @@ def init_database():
             alert_time TEXT NOT NULL,
             alert_type TEXT DEFAULT 'offline',
             sent INTEGER DEFAULT 1,
-            UNIQUE(hostname, alert_time)
+            UNIQUE(hostname, alert_time, alert_type)
         )
     ''')
     cursor.execute('''
         CREATE INDEX IF NOT EXISTS idx_alert_hostname ON alert_log(hostname)
     ''')
+    if legacy_alert_log:
+        cursor.execute('''
+            INSERT INTO alert_log (id, hostname, alert_time, alert_type, sent)
+            SELECT id, hostname, alert_time, alert_type, sent FROM alert_log_v1
+        ''')
+        cursor.execute('DROP TABLE alert_log_v1')
     
     conn.commit()
     conn.close()
 
-def insert_status(data):
-    """插入状态记录，返回是否是新VPS"""
-    conn = sqlite3.connect(DB_FILE)
+def _is_metric_value(value):
+    """只接受有限的数值（bool 不算）"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def extract_metrics(data):
+    """从上报数据中提取数值指标：旧版顶层字段 + data['metrics'] 中的任意指标
+
+    主机属性（内存/磁盘总量等）存放在 host_version 中，不作为指标序列。
+    """
+    metrics = {}
+    for metric in LEGACY_METRICS + LEGACY_INT_METRICS:
+        value = data.get(metric)
+        if metric not in HOST_ATTRIBUTES and _is_metric_value(value):
+            metrics[metric] = value
+    extra = data.get('metrics')
+    if isinstance(extra, dict):
+        for metric, value in extra.items():
+            if (isinstance(metric, str) and 0 < len(metric) <= MAX_METRIC_NAME_LENGTH
+                    and _is_metric_value(value)):
+                metrics[metric] = value
+    return metrics
+
+def _load_host(cursor, host_id):
+    """从数据库读取一个主机的缓存项（均为按索引的单行查询）"""
+    cursor.execute(f'''
+        SELECT version_id, {", ".join(HOST_ATTRIBUTES)} FROM host_version
+        WHERE host_id = ? ORDER BY valid_from DESC, version_id DESC LIMIT 1
+    ''', (host_id,))
+    version = cursor.fetchone()
+    cursor.execute('''
+        SELECT id, ts, status FROM status_report
+        WHERE host_id = ? ORDER BY ts DESC LIMIT 1
+    ''', (host_id,))
+    report = cursor.fetchone() or (None, 0, None)
+    cursor.execute('''
+        SELECT id, state FROM host_availability
+        WHERE host_id = ? AND end_ts IS NULL ORDER BY start_ts DESC LIMIT 1
+    ''', (host_id,))
+    interval = cursor.fetchone() or (None, None)
+    cursor.execute(f'''
+        SELECT s.metric, p.value FROM metric_series s
+        JOIN metric_points p ON p.series_id = s.series_id AND p.ts = ?
+        WHERE s.host_id = ? AND s.metric IN ({", ".join("?" * len(PROMETHEUS_GAUGES))})
+    ''', [report[1], host_id] + list(PROMETHEUS_GAUGES))
+    gauges = dict(cursor.fetchall())
+    return {
+        "host_id": host_id,
+        "version_id": version[0] if version else None,
+        "attrs": tuple(version[1:]) if version else None,
+        "last_ts": report[1],
+        "last_report_id": report[0],
+        "status": report[2],
+        "interval": tuple(interval),
+        "gauges": gauges,
+    }
+
+def _get_host(cursor, hostname):
+    """获取主机缓存项，主机不存在时返回 None"""
+    host = _host_cache.get(hostname)
+    if host is not None:
+        return host
+    cursor.execute('SELECT host_id FROM host WHERE hostname = ?', (hostname,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    global _host_registry_version
+    host = _host_cache[hostname] = _load_host(cursor, row[0])
+    _host_registry_version += 1
+    return host
+
+@timed('sql.load_host_cache')
+def load_host_cache():
+    """把所有主机载入缓存（启动时执行一次），断联检测之后只读内存，不再扫描上报记录"""
+    global _host_cache_loaded, _host_cache_version, _host_registry_version
+    conn = connect_db()
     cursor = conn.cursor()
+    cursor.execute('SELECT host_id, hostname FROM host')
+    for host_id, hostname in cursor.fetchall():
+        if hostname not in _host_cache:
+            _host_cache[hostname] = _load_host(cursor, host_id)
+    conn.close()
+    _host_cache_loaded = True
+    _host_cache_version += 1
+    _host_registry_version += 1
+    _reset_latest_log()
+
+def _note_latest_change(hostname, deleted=False):
+    """在最新状态变更日志中记录一台主机的变化（在数据库提交之后调用）"""
+    global _latest_seq, _latest_floor
+    with _latest_log_lock:
+        _latest_seq += 1
+        _latest_log.pop(hostname, None)
+        _latest_log[hostname] = (_latest_seq, deleted)
+        while len(_latest_log) > len(_host_cache) + LATEST_TOMBSTONE_LIMIT:
+            _, (seq, _) = _latest_log.popitem(last=False)
+            _latest_floor = seq
+
+def _reset_latest_log():
+    """主机缓存整体重新载入后，之前的版本都无法再做增量"""
+    global _latest_seq, _latest_floor
+    with _latest_log_lock:
+        _latest_seq += 1
+        _latest_floor = _latest_seq
+        _latest_log.clear()
+
+def latest_version():
+    # 进程重启后序号从头计数，带上启动时间避免误判
+    return f"{int(_started_at)}.{_latest_seq}"
+
+def latest_changes_since(version):
+    """返回 (当前版本, 变化的主机名列表, 删除的主机名列表)；version 无效或早于保留范围时两个列表为 None"""
+    with _latest_log_lock:
+        current = latest_version()
+        started, _, seq = (version or '').partition('.')
+        if started != str(int(_started_at)) or not seq.isdigit() or not _latest_floor <= int(seq) <= _latest_seq:
+            return current, None, None
+        changed, deleted = [], []
+        for hostname, (change_seq, is_deleted) in reversed(_latest_log.items()):
+            if change_seq <= int(seq):
+                break
+            (deleted if is_deleted else changed).append(hostname)
+    return current, changed, deleted
+
+def host_names():
+    """排序后的主机名列表（返回 (名单版本, 列表)），只在主机加入或删除后重新排序"""
+    global _host_names
+    version, names = _host_names
+    if version != _host_registry_version:
+        version = _host_registry_version
+        names = sorted(_host_cache)
+        _host_names = (version, names)
+    return version, names
+
+def _open_interval(cursor, host, state, start_ts):
+    """结束主机当前的可用性区间，并从 start_ts 开始一个新区间（状态未变化时不做任何事）"""
+    interval_id, current_state = host["interval"]
+    if current_state == state:
+        return
+    if interval_id is not None:
+        cursor.execute('UPDATE host_availability SET end_ts = ? WHERE id = ?', (start_ts, interval_id))
+    cursor.execute('''
+        INSERT INTO host_availability (host_id, state, start_ts) VALUES (?, ?, ?)
+    ''', (host["host_id"], state, start_ts))
+    host["interval"] = (cursor.lastrowid, state)
+
+def _availability_on_report(cursor, host, ts):
+    """收到上报时维护可用性区间：断联 -> 在线"""
+    threshold = ALERT_INTERVAL_MINUTES * 60000
+    state = host["interval"][1]
+    if state == 'online' and host["last_ts"] and ts - host["last_ts"] > threshold:
+        # 断联检测没来得及运行（例如服务端停机期间），补记这段断联
+        _open_interval(cursor, host, 'offline', host["last_ts"] + threshold)
+        state = 'offline'
+    if state != 'online':
+        _open_interval(cursor, host, 'online', ts)
+
+def _get_series_ids(cursor, host_id, metrics):
+    """获取（必要时创建）主机各指标的序列ID，超出序列上限的新指标被忽略"""
+    cache = _series_cache.get(host_id)
+    if cache is None:
+        cursor.execute('SELECT metric, series_id FROM metric_series WHERE host_id = ?', (host_id,))
+        cache = _series_cache[host_id] = dict(cursor.fetchall())
     
-    hostname = data.get('hostname')
+    series_ids = {}
+    for metric in metrics:
+        series_id = cache.get(metric)
+        if series_id is None:
+            if len(cache) >= MAX_SERIES_PER_HOST:
+                continue
+            cursor.execute('INSERT INTO metric_series (host_id, metric) VALUES (?, ?)', (host_id, metric))
+            series_id = cache[metric] = cursor.lastrowid
+        series_ids[metric] = series_id
+    return series_ids
+
+_change_cond = Condition()
+_change_head = None  # change_log 最大 id，首次使用时从数据库读取
+
+def _record_change(cursor, kind, hostname, ts, payload=None):
+    """在调用方的事务中追加一条变更，返回其 id（变更流关闭时返回 None）；每1000条清理一次超出保留范围的旧变更"""
+    if not CHANGE_FEED_ENABLED:
+        return None
+    cursor.execute('INSERT INTO change_log (ts, kind, hostname, payload) VALUES (?, ?, ?, ?)',
+                   (ts, kind, hostname, json.dumps(payload, ensure_ascii=False) if payload is not None else None))
+    change_id = cursor.lastrowid
+    if change_id % 1000 == 0:
+        cursor.execute('DELETE FROM change_log WHERE id <= ?', (change_id - CHANGE_FEED_RETENTION,))
+    return change_id
+
+def current_change_head():
+    global _change_head
+    if _change_head is None:
+        conn = connect_db()
+        _change_head = conn.execute('SELECT COALESCE(MAX(id), 0) FROM change_log').fetchone()[0]
+        conn.close()
+    return _change_head
+
+def _publish_changes(change_id):
+    """事务提交后更新最新变更 id，并唤醒等待新变更的长轮询请求"""
+    global _change_head
+    if change_id is None:
+        return
+    with _change_cond:
+        _change_head = max(_change_head or 0, change_id)
+        _change_cond.notify_all()
+
+def wait_for_changes(after, timeout):
+    """等待直到有 id 大于 after 的变更或超时，返回最新变更 id"""
+    head = current_change_head()
+    if head > after or timeout <= 0:
+        return head
+    with _change_cond:
+        _change_cond.wait_for(lambda: (_change_head or 0) > after, timeout)
+        return _change_head or head
+
+@timed('sql.insert_status')
+def insert_status(data, ts=None):
+    """插入状态记录，返回是否是新VPS
+
+    ts 为服务端时间（毫秒），只读副本重放变更流时传入主库的时间，其余情况由本函数取当前时间。
+    """
+    global _host_cache_version, _host_registry_version
+    conn = connect_db()
+    cursor = conn.cursor()
     
+    hostname = data.get('hostname')
+    cached = _get_host(cursor, hostname)
     # 检查是否是新VPS（首次出现）
-    cursor.execute('SELECT COUNT(*) FROM status_log WHERE hostname = ?', (hostname,))
-    is_new_vps = cursor.fetchone()[0] == 0
-    
-    # 使用服务端时间作为主要时间戳
-    server_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    client_timestamp = data.get('timestamp', server_timestamp)
+    is_new_vps = cached is None
+    host = dict(cached) if cached else {
+        "host_id": None, "version_id": None, "attrs": None,
+        "last_ts": 0, "last_report_id": None, "status": None, "interval": (None, None),
+        "gauges": {},
+    }
     
-    cursor.execute('''
-        INSERT INTO status_log (
-            hostname, local_ip, client_timestamp, server_timestamp, cpu_percent,
-            memory_total_gb, memory_used_gb, memory_percent,
-            disk_total_gb, disk_used_gb, disk_percent,
-            boot_time, uptime_seconds, status
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        hostname,
-        data.get('local_ip'),
-        client_timestamp,
-        server_timestamp,
-        data.get('cpu_percent'),
-        data.get('memory_total_gb'),
-        data.get('memory_used_gb'),
-        data.get('memory_percent'),
-        data.get('disk_total_gb'),
-        data.get('disk_used_gb'),
-        data.get('disk_percent'),
-        data.get('boot_time'),
-        data.get('uptime_seconds'),
-        'online'
-    ))
+    # 使用服务端时间作为主要时间戳（毫秒，同一主机严格递增，作为指标数据点的键）
+    if ts is None:
+        ts = max(int(time.time() * 1000), host["last_ts"] + 1)
+    client_timestamp = data.get('timestamp', datetime.fromtimestamp(ts / 1000).strftime(TIME_FORMAT))
     
-    conn.commit()
-    conn.close()
+    try:
+        if is_new_vps:
+            cursor.execute('INSERT INTO host (hostname) VALUES (?)', (hostname,))
+            host["host_id"] = cursor.lastrowid
+        
+        # 主机属性变化时才新增版本
+        attrs = tuple(data.get(attr) for attr in HOST_ATTRIBUTES)
+        if attrs != host["attrs"]:
+            cursor.execute(f'''
+                INSERT INTO host_version (host_id, valid_from, {", ".join(HOST_ATTRIBUTES)})
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (host["host_id"], ts) + attrs)
+            host["version_id"] = cursor.lastrowid
+            host["attrs"] = attrs
+        
+        cursor.execute('''
+            INSERT INTO status_report (
+                host_id, version_id, client_timestamp, ts, status
+            ) VALUES (?, ?, ?, ?, ?)
+        ''', (
+            host["host_id"],
+            host["version_id"],
+            client_timestamp,
+            ts,
+            'online'
+        ))
+        host["last_report_id"] = cursor.lastrowid
+        host["status"] = 'online'
+        _availability_on_report(cursor, host, ts)
+        
+        metrics = extract_metrics(data)
+        series_ids = _get_series_ids(cursor, host["host_id"], metrics)
+        cursor.executemany(
+            'INSERT OR REPLACE INTO metric_points (series_id, ts, value) VALUES (?, ?, ?)',
+            [(series_id, ts, metrics[metric]) for metric, series_id in series_ids.items()]
+        )
+        change_id = _record_change(cursor, 'report', hostname, ts, data)
+        conn.commit()
+        _publish_changes(change_id)
+        host["last_ts"] = ts
+        host["gauges"] = {metric: metrics[metric] for metric in PROMETHEUS_GAUGES if metric in metrics}
+        _host_cache[hostname] = host
+        _host_cache_version += 1
+        if is_new_vps:
+            _host_registry_version += 1
+        _note_latest_change(hostname)
+    except Exception:
+        # 回滚后新建的序列ID无效，清除该主机的缓存
+        conn.rollback()
+        _series_cache.pop(host["host_id"], None)
+        raise
+    finally:
+        conn.close()
     
     return is_new_vps
 
-def get_all_statuses(limit=1000, page=1, page_size=100, start_date=None, end_date=None, hostname=None):
-    """获取所有状态记录，支持分页和日期区间查询"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # 构建查询条件
+def _build_report_filters(start_date=None, end_date=None, hostname=None):
+    """构建 status_report（别名 r）的查询条件（时间参数为本地时间字符串）"""
     where_clauses = []
     params = []
     
     if start_date:
-        where_clauses.append("COALESCE(server_timestamp, client_timestamp) >= ?")
-        params.append(start_date)
+        where_clauses.append("r.ts >= ?")
+        params.append(to_epoch_ms(start_date))
     
     if end_date:
-        where_clauses.append("COALESCE(server_timestamp, client_timestamp) <= ?")
-        params.append(end_date)
+        where_clauses.append("r.ts <= ?")
+        params.append(to_epoch_ms(end_date) + 999)
     
     if hostname:
-        where_clauses.append("hostname = ?")
+        where_clauses.append("r.host_id = (SELECT host_id FROM host WHERE hostname = ?)")
         params.append(hostname)
     
     where_sql = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+    return where_sql, params
+
+# /api/history 可选择返回的字段（即兼容视图 status_log 的列）
+# server_ts_ms 为服务端接收时间的毫秒时间戳，server_timestamp 只精确到秒
+HISTORY_FIELDS = [
+    'id', 'hostname', 'local_ip', 'client_timestamp', 'server_timestamp', 'server_ts_ms',
+    'cpu_percent', 'memory_total_gb', 'memory_used_gb', 'memory_percent',
+    'disk_total_gb', 'disk_used_gb', 'disk_percent',
+    'boot_time', 'uptime_seconds', 'status',
+]
+# /api/latest 的列：视图的列加上断联时间和显示用的时间戳
+LATEST_COLUMNS = HISTORY_FIELDS + ['minutes_since_last', 'display_timestamp']
+# 流式输出时每批从游标读取的行数
+STREAM_BATCH_SIZE = 500
+
+def parse_fields(fields_arg, allowed):
+    """解析逗号分隔的 fields= 参数，未指定时返回全部字段，含未知字段时抛出ValueError"""
+    if not fields_arg:
+        return list(allowed)
+    fields = []
+    for field in fields_arg.split(','):
+        field = field.strip()
+        if field not in allowed:
+            raise ValueError(f"Unknown field: {field}")
+        if field not in fields:
+            fields.append(field)
+    return fields
+
+def iter_cursor(conn, cursor, batch_size=STREAM_BATCH_SIZE, stat=None, elapsed=0.0):
+    """逐批读取游标中的行，读完或调用方提前中止时关闭连接
+
+    指定 stat 时，在关闭连接时把 elapsed（秒，调用方已花费的查询时间）加上读取游标的累计耗时
+    记入直方图 stat；调用方处理每批行的时间不计入。
+    """
+    try:
+        while True:
+            start = time.perf_counter()
+            rows = cursor.fetchmany(batch_size)
+            elapsed += time.perf_counter() - start
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+        if stat:
+            observe(stat, elapsed * 1000)
+
+def stream_json_rows(meta, key, columns, batches):
+    """把 meta 字段和逐批产生的行流式序列化为一个 JSON 对象，行放在 key 对应的数组中
+
+    每批行只在序列化期间转换为字典，内存占用与结果总行数无关。
+    """
+    head = dumps_json(meta)[:-1]
+    yield f'{head},"{key}":[' if meta else f'{{"{key}":['
+    first = True
+    for rows in batches:
+        chunk = dumps_json([dict(zip(columns, row)) for row in rows])[1:-1]
+        yield chunk if first else ',' + chunk
+        first = False
+    yield ']}'
+
+def get_all_statuses(limit=1000, page=1, page_size=100, start_date=None, end_date=None, hostname=None, fields=None):
+    """获取所有状态记录，支持分页、日期区间查询和字段选择
+
+    返回的 'data' 是逐批读取游标的生成器（每批为行元组列表），'columns' 为对应的字段名；
+    生成器读完后自动关闭数据库连接。行是在读取生成器时才从数据库取出的，
+    所以耗时由 iter_cursor 在读完时记入 sql.get_all_statuses，而不是在本函数返回时。
+    """
+    start = time.perf_counter()
+    fields = fields or HISTORY_FIELDS
+    conn = connect_db()
+    cursor = conn.cursor()
+    
+    # 构建查询条件
+    where_sql, params = _build_report_filters(start_date, end_date, hostname)
     
     # 获取总数
-    count_sql = f"SELECT COUNT(*) FROM status_log{where_sql}"
+    count_sql = f"SELECT COUNT(*) FROM status_report r{where_sql}"
     cursor.execute(count_sql, params)
     total_count = cursor.fetchone()[0]
     
     # 计算分页
     offset = (page - 1) * page_size
     
-    # 查询数据
+    # 先在 status_report 上按索引定位本页记录，再通过兼容视图还原所选字段（未选字段的子查询不会执行）
     query_sql = f'''
-        SELECT * FROM status_log
-        {where_sql}
-        ORDER BY COALESCE(server_timestamp, client_timestamp) DESC
-        LIMIT ? OFFSET ?
+        SELECT {", ".join(fields)} FROM status_log
+        WHERE id IN (
+            SELECT r.id FROM status_report r
+            {where_sql}
+            ORDER BY r.ts DESC, r.id DESC
+            LIMIT ? OFFSET ?
+        )
+        ORDER BY server_ts_ms DESC, id DESC
     '''
     params.extend([page_size, offset])
     cursor.execute(query_sql, params)
     
-    columns = [description[0] for description in cursor.description]
-    results = []
-    for row in cursor.fetchall():
-        results.append(dict(zip(columns, row)))
-    
-    conn.close()
-    
     return {
-        'data': results,
+        'columns': fields,
+        'data': iter_cursor(conn, cursor, stat='sql.get_all_statuses', elapsed=time.perf_counter() - start),
         'total': total_count,
         'page': page,
         'page_size': page_size,
         'total_pages': (total_count + page_size - 1) // page_size if page_size > 0 else 1
     }
 
-def get_chart_data(start_date=None, end_date=None, hostname=None):
-    """获取图表数据，按时间顺序显示VPS状态"""
-    conn = sqlite3.connect(DB_FILE)
+# 导出时每批读取的行数：每批是一次独立的短查询，不会长时间占用读事务
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = ('csv', 'ndjson', 'columnar')
+
+def iter_export_batches(start_date=None, end_date=None, hostname=None, fields=None, batch_size=EXPORT_BATCH_SIZE):
+    """按 id 键集分页逐批读取状态记录（时间升序），每批为行元组列表
+
+    与 OFFSET 分页不同，每批都从上一批最后的 id 之后通过主键定位，代价与导出位置无关。
+    """
+    fields = fields or HISTORY_FIELDS
+    where_sql, params = _build_report_filters(start_date, end_date, hostname)
+    where_sql = f"{where_sql} AND r.id > ?" if where_sql else " WHERE r.id > ?"
+    query_sql = f'''
+        SELECT id, {", ".join(fields)} FROM status_log
+        WHERE id IN (
+            SELECT r.id FROM status_report r
+            {where_sql}
+            ORDER BY r.id
+            LIMIT ?
+        )
+        ORDER BY id
+    '''
+    conn = connect_db()
+    try:
+        last_id = 0
+        while True:
+            rows = conn.execute(query_sql, params + [last_id, batch_size]).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            yield [row[1:] for row in rows]
+    finally:
+        conn.close()
+
+def export_csv(columns, batches):
+    """CSV格式：首行为表头"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+def export_ndjson(columns, batches):
+    """NDJSON格式：每行一个JSON对象"""
+    for rows in batches:
+        yield ''.join(dumps_json(dict(zip(columns, row))) + '\n' for row in rows)
+
+def export_columnar(columns, batches):
+    """列式格式：每批一行JSON，{"columns": [...], "values": [[第1列的值...], [第2列的值...]]}
+
+    同一列的值相邻存放，压缩率明显高于按行存储。
+    """
+    for rows in batches:
+        yield dumps_json(columnar(columns, rows)) + '\n'
+
+def gzip_stream(chunks, level=6):
+    """把文本块流式压缩为gzip"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+# 响应压缩：这些类型、且不小于 COMPRESS_MIN_SIZE 字节的响应按客户端的 Accept-Encoding 压缩（流式响应总是压缩）
+COMPRESS_MIN_SIZE = _config.get("compress_min_size", 1024)
+COMPRESS_MIMETYPES = {'text/html', 'application/json', 'text/css', 'application/javascript'}
+# 动态响应用较快的压缩级别；启动时预先压缩的页面和静态资源用最高级别
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+def accepted_encoding():
+    """客户端接受的压缩方式（br 或 gzip），都不接受时返回 None"""
+    return request.accept_encodings.best_match(['br', 'gzip'] if brotli else ['gzip'])
+
+def compress_bytes(data, encoding, best=False):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if best else BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=9 if best else GZIP_LEVEL, mtime=0)
+
+def compress_stream(chunks, encoding):
+    """流式压缩（文本块或字节块）"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        compress, flush = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        compress, flush = compressor.compress, compressor.flush
+    for chunk in chunks:
+        data = compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield flush()
+
+def compress_response(response):
+    """after_request：按 Accept-Encoding 压缩 HTML/JSON 等文本响应（已压缩、文件传输和错误状态的响应除外）"""
+    if (response.mimetype not in COMPRESS_MIMETYPES or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers or response.direct_passthrough):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = accepted_encoding()
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(compress_bytes(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+@timed('sql.get_series')
+def get_series(hostname, metric, start_date=None, end_date=None, limit=10000):
+    """按时间范围查询单个序列的数据点（升序），返回毫秒时间戳和值两个数组"""
+    conn = connect_db()
     cursor = conn.cursor()
     
-    # 构建查询条件
-    where_clauses = []
-    params = []
+    cursor.execute('''
+        SELECT s.series_id FROM metric_series s JOIN host h ON h.host_id = s.host_id
+        WHERE h.hostname = ? AND s.metric = ?
+    ''', (hostname, metric))
+    row = cursor.fetchone()
+    if row is None:
+        conn.close()
+        return None
     
-    if start_date:
-        where_clauses.append("COALESCE(server_timestamp, client_timestamp) >= ?")
-        params.append(start_date)
+    start_ts = to_epoch_ms(start_date) if start_date else 0
+    end_ts = to_epoch_ms(end_date) + 999 if end_date else 2**62
+    cursor.execute('''
+        SELECT ts, value FROM metric_points
+        WHERE series_id = ? AND ts BETWEEN ? AND ?
+        ORDER BY ts ASC
+        LIMIT ?
+    ''', (row[0], start_ts, end_ts, limit))
+    rows = cursor.fetchall()
+    conn.close()
     
-    if end_date:
-        where_clauses.append("COALESCE(server_timestamp, client_timestamp) <= ?")
-        params.append(end_date)
+    return {
+        'hostname': hostname,
+        'metric': metric,
+        'timestamps': [r[0] for r in rows],
+        'values': [r[1] for r in rows],
+    }
+
+@timed('sql.get_metric_names')
+def get_metric_names(hostname):
+    """获取主机上报过的所有指标名"""
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT s.metric FROM metric_series s JOIN host h ON h.host_id = s.host_id
+        WHERE h.hostname = ? ORDER BY s.metric
+    ''', (hostname,))
+    names = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return names
+
+@timed('sql.load_metric_arrays')
+def load_metric_arrays(metric, start_ts, end_ts, hostname=None):
+    """把一个指标在时间范围内所有主机的数据点读入NumPy数组
+
+    返回 (series_ids, timestamps, values, hostnames)，数组按 (series_id, ts) 排序，
+    正好是 metric_points 主键的物理顺序；hostnames 为 series_id -> hostname。
+    """
+    conn = connect_db()
+    cursor = conn.cursor()
+    host_sql = " AND h.hostname = ?" if hostname else ""
+    params = [metric] + ([hostname] if hostname else [])
+    cursor.execute(f'''
+        SELECT s.series_id, h.hostname FROM metric_series s JOIN host h ON h.host_id = s.host_id
+        WHERE s.metric = ?{host_sql}
+    ''', params)
+    hostnames = dict(cursor.fetchall())
     
-    if hostname:
-        where_clauses.append("hostname = ?")
-        params.append(hostname)
+    # 逐个序列按主键做范围扫描，结果天然按 (series_id, ts) 排序
+    def iter_points():
+        for series_id in sorted(hostnames):
+            yield from cursor.execute('''
+                SELECT series_id, ts, value FROM metric_points
+                WHERE series_id = ? AND ts BETWEEN ? AND ? AND value IS NOT NULL
+            ''', (series_id, start_ts, end_ts))
     
-    where_sql = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+    points = np.fromiter(iter_points(), dtype=[('series_id', 'i8'), ('ts', 'i8'), ('value', 'f8')])
+    conn.close()
+    return points['series_id'], points['ts'], points['value'], hostnames
+
+def compute_analytics(series_ids, timestamps, values, quantiles=(50, 95, 99), window=4, limit=100.0):
+    """对按序列分组的数据一次性向量化计算统计量
+
+    每个序列：样本数、均值、最小/最大值、分位数（线性插值，与 np.percentile 一致）、
+    最近 window 个点的移动平均、最小二乘线性趋势（每天变化量）以及按趋势到达 limit 的天数。
+    """
+    starts = np.flatnonzero(np.r_[True, series_ids[1:] != series_ids[:-1]])
+    counts = np.diff(np.r_[starts, len(series_ids)])
+    ends = starts + counts
+    
+    result = {
+        'series_id': series_ids[starts],
+        'count': counts,
+        'mean': np.add.reduceat(values, starts) / counts,
+        'min': np.minimum.reduceat(values, starts),
+        'max': np.maximum.reduceat(values, starts),
+        'last': values[ends - 1],
+    }
+    
+    # 分位数：组内排序后按位置插值
+    group = np.repeat(np.arange(len(starts)), counts)
+    sorted_values = values[np.lexsort((values, group))]
+    for q in quantiles:
+        position = (counts - 1) * (q / 100.0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, counts - 1)
+        fraction = position - lower
+        result[f'p{q:g}'] = (sorted_values[starts + lower] * (1 - fraction)
+                             + sorted_values[starts + upper] * fraction)
+    
+    # 移动平均：用前缀和取每个序列最后 window 个点的均值
+    cumsum = np.r_[0.0, np.cumsum(values)]
+    window_start = np.maximum(ends - window, starts)
+    result['moving_average'] = (cumsum[ends] - cumsum[window_start]) / (ends - window_start)
+    
+    # 线性趋势：x 为距本组第一个点的天数
+    x = (timestamps - np.repeat(timestamps[starts], counts)) / 86400000.0
+    sum_x = np.add.reduceat(x, starts)
+    sum_y = np.add.reduceat(values, starts)
+    sum_xx = np.add.reduceat(x * x, starts)
+    sum_xy = np.add.reduceat(x * values, starts)
+    denominator = counts * sum_xx - sum_x * sum_x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(denominator > 0, (counts * sum_xy - sum_x * sum_y) / denominator, 0.0)
+        intercept = (sum_y - slope * sum_x) / counts
+        fitted_last = intercept + slope * x[ends - 1]
+        days_to_limit = np.where(slope > 0, (limit - fitted_last) / slope, np.inf)
+    result['trend_per_day'] = slope
+    result['days_to_limit'] = np.maximum(days_to_limit, 0.0)
+    return result
+
+def moving_average(values, window):
+    """单个序列的滑动平均（前 window-1 个点使用已有的点数）"""
+    cumsum = np.r_[0.0, np.cumsum(values)]
+    index = np.arange(1, len(values) + 1)
+    lower = np.maximum(index - window, 0)
+    return (cumsum[index] - cumsum[lower]) / (index - lower)
+
+@timed('sql.get_chart_data')
+def get_chart_data(start_date=None, end_date=None, hostname=None, as_columnar=False):
+    """获取图表数据，按时间顺序显示VPS状态
+
+    默认按主机名分组；as_columnar 时不分组，直接返回 hostname、timestamp、status 三列。
+    """
+    conn = connect_db()
+    cursor = conn.cursor()
+    
+    # 构建查询条件
+    where_sql, params = _build_report_filters(start_date, end_date, hostname)
     
     # 查询数据，按时间升序排列（用于图表）
     query_sql = f'''
         SELECT 
-            hostname,
-            COALESCE(server_timestamp, client_timestamp) as timestamp,
-            status
-        FROM status_log
+            h.hostname,
+            strftime('%Y-%m-%d %H:%M:%S', r.ts / 1000, 'unixepoch', 'localtime') as timestamp,
+            r.status
+        FROM status_report r
+        JOIN host h ON h.host_id = r.host_id
         {where_sql}
-        ORDER BY COALESCE(server_timestamp, client_timestamp) ASC
+        ORDER BY r.ts ASC
         LIMIT 1000
     '''
     cursor.execute(query_sql, params)
     
     results = cursor.fetchall()
     conn.close()
+    if as_columnar:
+        return columnar(('hostname', 'timestamp', 'status'), results)
     
     # 按主机名分组
     chart_data = {}
@@ -294,66 +1540,199 @@ def get_chart_data(start_date=None, end_date=None, hostname=None):
     
     return chart_data
 
-def get_latest_status_by_hostname():
-    """获取每个主机的最新状态，并计算断联时间（基于服务端时间）"""
-    conn = sqlite3.connect(DB_FILE)
+@timed('sql.get_latest_status_by_hostname')
+def get_latest_rows(report_ids=None):
+    """获取每个主机的最新状态，并计算断联时间（基于服务端时间），返回 (列名, 行元组列表)
+
+    列为 status_log 的各列加上 minutes_since_last、display_timestamp，status 按最后上报时间重新判断。
+    report_ids 为要读取的最新记录 id 列表（分页查询只读本页主机），结果按其顺序返回。
+    """
+    conn = connect_db()
     cursor = conn.cursor()
     
-    # 使用server_timestamp作为主要判断依据
-    cursor.execute('''
-        SELECT s1.* FROM status_log s1
-        INNER JOIN (
-            SELECT hostname, MAX(COALESCE(server_timestamp, client_timestamp)) as max_timestamp
-            FROM status_log
-            GROUP BY hostname
-        ) s2 ON s1.hostname = s2.hostname 
-        AND COALESCE(s1.server_timestamp, s1.client_timestamp) = s2.max_timestamp
-        ORDER BY COALESCE(s1.server_timestamp, s1.client_timestamp) DESC
-    ''')
+    if report_ids is None:
+        # 每个主机取最后一条上报记录（id随服务端时间递增）
+        cursor.execute('''
+            SELECT * FROM status_log
+            WHERE id IN (SELECT MAX(id) FROM status_report GROUP BY host_id)
+            ORDER BY server_timestamp DESC
+        ''')
+    elif report_ids:
+        cursor.execute(f"SELECT * FROM status_log WHERE id IN ({', '.join('?' * len(report_ids))})", report_ids)
+    else:
+        conn.close()
+        return LATEST_COLUMNS, []
     
     columns = [description[0] for description in cursor.description]
+    id_index = columns.index('id')
+    status_index = columns.index('status')
+    server_index = columns.index('server_timestamp')
+    client_index = columns.index('client_timestamp')
     results = []
     now = datetime.now()
     
     for row in cursor.fetchall():
-        status_dict = dict(zip(columns, row))
-        
         # 使用server_timestamp计算时间差（如果没有则使用client_timestamp）
-        timestamp_key = 'server_timestamp' if status_dict.get('server_timestamp') else 'client_timestamp'
-        timestamp_str = status_dict.get(timestamp_key) or status_dict.get('timestamp')
-        
-        # 兼容旧字段名
-        if not timestamp_str:
-            timestamp_str = status_dict.get('timestamp') or status_dict.get('received_at')
-        
-        try:
-            if timestamp_str:
-                status_time = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-                time_diff = now - status_time
-                minutes_diff = time_diff.total_seconds() / 60
-                
+        timestamp_str = row[server_index] or row[client_index]
+        minutes_since_last = None
+        if timestamp_str:
+            try:
+                minutes_diff = (now - datetime.strptime(timestamp_str, TIME_FORMAT)).total_seconds() / 60
                 # 更新状态和添加时间差信息
-                status_dict['status'] = 'offline' if minutes_diff > ALERT_INTERVAL_MINUTES else 'online'
-                status_dict['minutes_since_last'] = round(minutes_diff, 1)
-                status_dict['display_timestamp'] = timestamp_str  # 用于显示的主要时间戳
-            else:
-                status_dict['minutes_since_last'] = None
-                status_dict['display_timestamp'] = None
-        except Exception as e:
-            status_dict['minutes_since_last'] = None
-            status_dict['display_timestamp'] = timestamp_str
-        
-        # 确保有client_timestamp和server_timestamp字段
-        if 'client_timestamp' not in status_dict:
-            status_dict['client_timestamp'] = status_dict.get('timestamp', '')
-        if 'server_timestamp' not in status_dict:
-            status_dict['server_timestamp'] = status_dict.get('received_at', '')
-        
-        results.append(status_dict)
+                row = row[:status_index] + ('offline' if minutes_diff > ALERT_INTERVAL_MINUTES else 'online',) + row[status_index + 1:]
+                minutes_since_last = round(minutes_diff, 1)
+            except ValueError:
+                pass
+        # display_timestamp 为用于显示的主要时间戳
+        results.append(row + (minutes_since_last, timestamp_str or None))
     
     conn.close()
-    return results
+    if report_ids:
+        position = {report_id: index for index, report_id in enumerate(report_ids)}
+        results.sort(key=lambda row: position[row[id_index]])
+    return columns + ['minutes_since_last', 'display_timestamp'], results
+
+def get_latest_status_by_hostname(report_ids=None, as_columnar=False):
+    """获取每个主机的最新状态（见 get_latest_rows）：字典列表，as_columnar 时为 {"columns", "values"}"""
+    columns, rows = get_latest_rows(report_ids)
+    if as_columnar:
+        return columnar(columns, rows)
+    return [dict(zip(columns, row)) for row in rows]
+
+# 最新状态分页查询的排序字段：名称 -> (取值函数, 默认是否倒序)
+LATEST_SORTS = {
+    'last_seen': (lambda hostname, host: host["last_ts"], True),
+    'hostname': (lambda hostname, host: hostname, False),
+    'cpu': (lambda hostname, host: host["gauges"].get('cpu_percent', -1), True),
+    'memory': (lambda hostname, host: host["gauges"].get('memory_percent', -1), True),
+    'disk': (lambda hostname, host: host["gauges"].get('disk_percent', -1), True),
+}
+LATEST_MAX_PAGE_SIZE = 500
+
+def _host_state(host, now_ts):
+    """按最近一次上报时间判断主机是否在线（与 get_latest_status_by_hostname 的判断一致）"""
+    return 'offline' if now_ts - host["last_ts"] > ALERT_INTERVAL_MINUTES * 60000 else 'online'
+
+def query_latest(status=None, search=None, min_cpu=None, max_cpu=None, sort='last_seen', descending=None,
+                 page=1, page_size=50, as_columnar=False):
+    """最新状态的筛选、排序和分页
+
+    筛选和排序只用内存中的主机缓存（状态、最后上报时间、最近一次的 CPU/内存/磁盘），
+    数据库只读取本页主机的最新记录，主机再多每次也只查询 page_size 行。
+    as_columnar 时本页数据为 "columns"、"values" 两个字段，而不是 "data"。
+    """
+    if not _host_cache_loaded:
+        load_host_cache()
+    value_of, default_descending = LATEST_SORTS[sort]
+    descending = default_descending if descending is None else descending
+    search = search.lower() if search else None
+    now_ts = int(time.time() * 1000)
+    
+    matched = []
+    for hostname, host in list(_host_cache.items()):
+        if not host["last_report_id"]:
+            continue
+        if status and _host_state(host, now_ts) != status:
+            continue
+        if search and search not in hostname.lower():
+            continue
+        cpu = host["gauges"].get('cpu_percent')
+        if min_cpu is not None and (cpu is None or cpu < min_cpu):
+            continue
+        if max_cpu is not None and (cpu is None or cpu > max_cpu):
+            continue
+        matched.append((value_of(hostname, host), hostname, host["last_report_id"]))
+    matched.sort(reverse=descending)
+    
+    total = len(matched)
+    offset = (page - 1) * page_size
+    report_ids = [report_id for _, _, report_id in matched[offset:offset + page_size]]
+    result = {
+        'total': total,
+        'page': page,
+        'page_size': page_size,
+        'total_pages': (total + page_size - 1) // page_size if page_size > 0 else 1,
+    }
+    if as_columnar:
+        result.update(get_latest_status_by_hostname(report_ids, as_columnar=True))
+    else:
+        result['data'] = get_latest_status_by_hostname(report_ids)
+    return result
+
+# 增量查询时每条 SQL 读取的记录数（不超过 SQLite 的参数个数上限）
+LATEST_DELTA_BATCH = 500
+
+def latest_delta(since, as_columnar=False):
+    """/api/latest?since= 的结果：since 之后上报过、在线状态切换过的主机的最新状态，以及被删除的主机名
+
+    since 无效或已超出变更日志的保留范围时返回全部主机（reset 为 true），调用方应整体替换本地数据。
+    as_columnar 时主机数据为 "columns"、"values" 两个字段，而不是 "data"。
+    """
+    if not _host_cache_loaded:
+        load_host_cache()
+    version, changed, deleted = latest_changes_since(since)
+    if changed is None:
+        result = {'version': version, 'reset': True, 'deleted': []}
+        if as_columnar:
+            result.update(get_latest_status_by_hostname(as_columnar=True))
+        else:
+            result['data'] = get_latest_status_by_hostname()
+        return result
+    report_ids = []
+    for hostname in changed:
+        host = _host_cache.get(hostname)
+        if host is None:
+            # 读取日志之后刚被删除，下一次增量会带上它的墓碑
+            continue
+        if host["last_report_id"]:
+            report_ids.append(host["last_report_id"])
+    columns, rows = LATEST_COLUMNS, []
+    for start in range(0, len(report_ids), LATEST_DELTA_BATCH):
+        columns, batch = get_latest_rows(report_ids[start:start + LATEST_DELTA_BATCH])
+        rows.extend(batch)
+    result = {'version': version, 'reset': False, 'deleted': deleted}
+    if as_columnar:
+        result.update(columnar(columns, rows))
+    else:
+        result['data'] = [dict(zip(columns, row)) for row in rows]
+    return result
+
+# 仪表盘汇总的指标
+SUMMARY_METRICS = ('cpu_percent', 'memory_percent', 'disk_percent')
+
+def latest_summary():
+    """全部主机的在线/断联数量，以及在线主机的 CPU/内存/磁盘平均值和最大值（只读内存缓存）"""
+    if not _host_cache_loaded:
+        load_host_cache()
+    now_ts = int(time.time() * 1000)
+    online = offline = 0
+    values = {metric: [] for metric in SUMMARY_METRICS}
+    for host in list(_host_cache.values()):
+        if not host["last_report_id"]:
+            continue
+        if _host_state(host, now_ts) == 'offline':
+            offline += 1
+            continue
+        online += 1
+        for metric in SUMMARY_METRICS:
+            value = host["gauges"].get(metric)
+            if value is not None:
+                values[metric].append(value)
+    return {
+        'total': online + offline,
+        'online': online,
+        'offline': offline,
+        'metrics': {
+            metric: {
+                'avg': round(sum(samples) / len(samples), 2) if samples else None,
+                'max': max(samples) if samples else None,
+                'count': len(samples),
+            }
+            for metric, samples in values.items()
+        },
+    }
 
+@timed('notify.pushplus')
 def send_pushplus_notification(title, content):
     """发送PushPlus通知（通用函数）"""
     try:
@@ -367,21 +1746,26 @@ def send_pushplus_notification(title, content):
             try:
                 result = response.json()
                 if result.get('code') == 200:
-                    print(f"PushPlus通知发送成功: {title}")
+                    logger.info("PushPlus通知发送成功: %s", title, extra={'event': 'notify'})
+                    incr('notify.sent')
                     return True
                 else:
-                    print(f"PushPlus通知发送失败: {result.get('msg', '未知错误')}")
+                    logger.warning("PushPlus通知发送失败: %s", result.get('msg', '未知错误'), extra={'event': 'notify'})
+                    incr('notify.failed')
                     return False
             except:
                 # 如果返回的不是JSON，也认为成功（某些API可能返回纯文本）
-                print(f"PushPlus通知发送成功: {title} (HTTP {response.status_code})")
+                logger.info("PushPlus通知发送成功: %s (HTTP %s)", title, response.status_code, extra={'event': 'notify'})
+                incr('notify.sent')
                 return True
         else:
-            print(f"PushPlus通知请求失败: HTTP {response.status_code}")
+            logger.warning("PushPlus通知请求失败: HTTP %s", response.status_code, extra={'event': 'notify'})
+            incr('notify.failed')
             return False
             
     except Exception as e:
-        print(f"发送PushPlus通知错误: {e}")
+        logger.error("发送PushPlus通知错误: %s", e, extra={'event': 'notify'})
+        incr('notify.failed')
         return False
 
 def send_offline_notification(hostname, minutes_offline):
@@ -404,86 +1788,493 @@ def send_delete_vps_notification(hostname, deleted_count):
     content = f"VPS已删除\n主机名: {hostname}\n删除记录数: {deleted_count} 条\n删除时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
     return send_pushplus_notification("VPS删除", content)
 
-def has_sent_alert_recently(hostname, alert_time_str):
-    """检查是否在最近1小时内已发送过通知（避免重复发送）"""
-    conn = sqlite3.connect(DB_FILE)
+@timed('sql.has_sent_alert_recently')
+def has_sent_alert_recently(hostname, alert_time_str, alert_type='offline'):
+    """检查是否在最近1小时内已发送过同类通知（避免重复发送）"""
+    conn = connect_db()
     cursor = conn.cursor()
     
     # 检查1小时内是否已发送过通知
     cursor.execute('''
         SELECT COUNT(*) FROM alert_log
         WHERE hostname = ? 
+        AND alert_type = ?
         AND alert_time >= datetime('now', '-1 hour')
         AND sent = 1
-    ''', (hostname,))
+    ''', (hostname, alert_type))
     
     count = cursor.fetchone()[0]
     conn.close()
     return count > 0
 
-def record_alert(hostname, alert_time_str):
+@timed('sql.record_alert')
+def record_alert(hostname, alert_time_str, alert_type='offline'):
     """记录已发送的通知"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = connect_db()
     cursor = conn.cursor()
     
     try:
         cursor.execute('''
             INSERT OR IGNORE INTO alert_log (hostname, alert_time, alert_type, sent)
             VALUES (?, ?, ?, ?)
-        ''', (hostname, alert_time_str, 'offline', 1))
+        ''', (hostname, alert_time_str, alert_type, 1))
         conn.commit()
     except Exception as e:
-        print(f"记录通知错误: {e}")
+        logger.error("记录通知错误: %s", e)
     finally:
         conn.close()
 
+# 阈值告警规则：config.json 中的 alert_rules，例如
+#   {"metric": "cpu_percent", "op": ">", "threshold": 90, "for": 3}
+# 启动时编译为按指标分组的判定表 metric -> [(rule_id, name, predicate, threshold, for)]，
+# 每次上报只评估上报中出现的、配置了规则的指标
+ALERT_OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+def compile_alert_rules(rules):
+    """把规则配置编译为按指标分组的判定表，无效规则打印警告后忽略"""
+    table = {}
+    for rule_id, rule in enumerate(rules):
+        try:
+            metric = rule['metric']
+            op = rule.get('op', '>')
+            threshold = rule['threshold']
+            count = int(rule.get('for', 1))
+            if op not in ALERT_OPERATORS or not _is_metric_value(threshold) or count < 1:
+                raise ValueError(rule)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            logger.warning("忽略无效的告警规则: %s", rule)
+            continue
+        name = rule.get('name') or f"{metric} {op} {threshold}"
+        table.setdefault(metric, []).append((rule_id, name, ALERT_OPERATORS[op], threshold, count))
+    return table
+
+ALERT_RULES = compile_alert_rules(_config.get("alert_rules", []))
+
+# 规则状态：hostname -> {rule_id: [连续满足次数, 是否已告警]}
+_rule_state = {}
+
+@timed('ingest.alert_rules')
+def evaluate_alert_rules(hostname, metrics):
+    """用一次上报的指标增量评估告警规则，返回本次新触发的 [(规则名, 指标, 值, 阈值)]
+
+    连续 for 次满足条件时触发一次，条件不再满足后复位，下一次持续越限再重新告警。
+    需在 db_lock 内调用。
+    """
+    if not ALERT_RULES:
+        return []
+    state = _rule_state.setdefault(hostname, {})
+    fired = []
+    for metric, value in metrics.items():
+        rules = ALERT_RULES.get(metric)
+        if rules is None:
+            continue
+        for rule_id, name, predicate, threshold, count in rules:
+            entry = state.get(rule_id)
+            if entry is None:
+                entry = state[rule_id] = [0, False]
+            if not predicate(value, threshold):
+                entry[0] = 0
+                entry[1] = False
+                continue
+            entry[0] += 1
+            if entry[0] >= count and not entry[1]:
+                entry[1] = True
+                fired.append((name, metric, value, threshold))
+    return fired
+
+def send_rule_notification(hostname, rule_name, metric, value, threshold):
+    """发送PushPlus阈值告警通知"""
+    content = f"VPS指标告警\n主机名: {hostname}\n规则: {rule_name}\n当前值: {metric} = {value:g}（阈值 {threshold:g}）\n检测时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n请及时检查VPS状态！"
+    return send_pushplus_notification("warning", content)
+
+def notify_rule_alerts(hostname, fired):
+    """发送规则告警（按 主机+规则 去重，1小时内同一规则只通知一次）"""
+    timestamp_str = datetime.now().strftime(TIME_FORMAT)
+    for rule_name, metric, value, threshold in fired:
+        alert_type = f"rule:{rule_name}"
+        if has_sent_alert_recently(hostname, timestamp_str, alert_type):
+            continue
+        logger.warning("触发告警规则: %s, %s, 当前值 %g", hostname, rule_name, value,
+                       extra={'event': 'alert_rule', 'hostname': hostname, 'rule': rule_name, 'value': value})
+        if send_rule_notification(hostname, rule_name, metric, value, threshold):
+            record_alert(hostname, timestamp_str, alert_type)
+
+# 异常检测：对每个主机的每个指标维护 EWMA 均值和方差（常数内存，不查询历史），
+# 新值偏离自身基线超过 z_threshold 个标准差时告警。配置示例（config.json）：
+#   "anomaly_detection": {"metrics": ["cpu_percent", "memory_percent"], "alpha": 0.1, "z_threshold": 4}
+_anomaly_config = _config.get("anomaly_detection", {})
+ANOMALY_METRICS = frozenset(_anomaly_config.get("metrics", ["cpu_percent", "memory_percent"])
+                            if _anomaly_config.get("enabled", True) else [])
+ANOMALY_ALPHA = _anomaly_config.get("alpha", 0.1)
+ANOMALY_Z_THRESHOLD = _anomaly_config.get("z_threshold", 4.0)
+# 样本数达到 warmup 之前只学习基线，不判定
+ANOMALY_WARMUP = _anomaly_config.get("warmup", 20)
+# 标准差下限：避免长期平稳的指标因为方差接近 0 而对微小波动报警
+ANOMALY_MIN_STD = _anomaly_config.get("min_std", 2.0)
+
+# 检测状态：hostname -> {metric: [均值, 方差, 样本数, 是否处于异常]}
+_anomaly_state = {}
+
+@timed('ingest.anomalies')
+def detect_anomalies(hostname, metrics):
+    """用一次上报的指标更新 EWMA 基线，返回本次新出现的异常 [(指标, 值, 基线均值, z)]
+
+    先用更新前的基线判定再更新，持续异常只在开始时返回一次。需在 db_lock 内调用。
+    """
+    if not ANOMALY_METRICS:
+        return []
+    state = _anomaly_state.setdefault(hostname, {})
+    alpha = ANOMALY_ALPHA
+    anomalies = []
+    for metric in ANOMALY_METRICS.intersection(metrics):
+        value = metrics[metric]
+        entry = state.get(metric)
+        if entry is None:
+            state[metric] = [value, 0.0, 1, False]
+            continue
+        mean, var, count, anomalous = entry
+        diff = value - mean
+        if count >= ANOMALY_WARMUP:
+            z = diff / max(math.sqrt(var), ANOMALY_MIN_STD)
+            is_anomaly = abs(z) > ANOMALY_Z_THRESHOLD
+            if is_anomaly and not anomalous:
+                anomalies.append((metric, value, mean, z))
+            entry[3] = is_anomaly
+        incr = alpha * diff
+        entry[0] = mean + incr
+        entry[1] = (1 - alpha) * (var + diff * incr)
+        entry[2] = count + 1
+    return anomalies
+
+def send_anomaly_notification(hostname, metric, value, mean, z):
+    """发送PushPlus异常检测通知"""
+    content = f"VPS指标异常\n主机名: {hostname}\n指标: {metric}\n当前值: {value:g}（基线 {mean:.1f}，偏离 {z:+.1f}σ）\n检测时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n请及时检查VPS状态！"
+    return send_pushplus_notification("warning", content)
+
+def notify_anomalies(hostname, anomalies):
+    """发送异常通知（按 主机+指标 去重，1小时内同一指标只通知一次）"""
+    timestamp_str = datetime.now().strftime(TIME_FORMAT)
+    for metric, value, mean, z in anomalies:
+        alert_type = f"anomaly:{metric}"
+        if has_sent_alert_recently(hostname, timestamp_str, alert_type):
+            continue
+        logger.warning("检测到指标异常: %s, %s = %g, 基线 %.1f, z = %+.1f", hostname, metric, value, mean, z,
+                       extra={'event': 'anomaly', 'hostname': hostname, 'metric': metric, 'value': value, 'z': round(z, 2)})
+        if send_anomaly_notification(hostname, metric, value, mean, z):
+            record_alert(hostname, timestamp_str, alert_type)
+
+@timed('check_connection_status')
 def check_connection_status():
-    """检查连接状态，更新断联记录（基于服务端时间）"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    """检查连接状态，更新断联记录（基于服务端时间）
+
+    只遍历内存中的主机缓存；仅在状态切换时写库：更新最新记录的状态并记录可用性区间。
+    """
+    global _host_cache_version
+    if READ_ONLY:
+        # 副本的状态切换来自主库的变更流
+        return
+    if not _host_cache_loaded:
+        load_host_cache()
     
-    latest_statuses = get_latest_status_by_hostname()
-    now = datetime.now()
+    now_ts = int(time.time() * 1000)
+    threshold = ALERT_INTERVAL_MINUTES * 60000
+    went_offline = []
+    switched = []
+    change_id = None
     
-    for status in latest_statuses:
-        try:
-            # 使用server_timestamp作为判断依据
-            timestamp_str = status.get('server_timestamp') or status.get('client_timestamp') or status.get('timestamp')
-            if not timestamp_str:
-                continue
+    # 绝大多数时候没有状态切换：先不加锁扫描一遍，无需写库时直接返回，
+    # 仪表盘读接口不必排在上报写入后面等待 db_lock
+    if not any(
+        host["last_report_id"]
+        and (host["status"] or 'online') != ('offline' if now_ts - host["last_ts"] > threshold else 'online')
+        for host in list(_host_cache.values())
+    ):
+        return
+    
+    with db_lock:
+        conn = connect_db()
+        cursor = conn.cursor()
+        for hostname, host in list(_host_cache.items()):
+            try:
+                if not host["last_report_id"]:
+                    continue
+                old_status = host["status"] or 'online'
+                new_status = 'offline' if now_ts - host["last_ts"] > threshold else 'online'
+                if old_status == new_status:
+                    continue
                 
-            status_time = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-            time_diff = now - status_time
-            minutes_diff = time_diff.total_seconds() / 60
-            
-            old_status = status.get('status', 'online')
-            new_status = 'offline' if minutes_diff > ALERT_INTERVAL_MINUTES else 'online'
-            
-            # 更新该主机的所有最新记录的状态
-            cursor.execute('''
-                UPDATE status_log
-                SET status = ?
-                WHERE hostname = ? AND COALESCE(server_timestamp, client_timestamp) = ?
-            ''', (new_status, status['hostname'], timestamp_str))
-            
-            # 如果状态从online变为offline，发送通知
-            if old_status == 'online' and new_status == 'offline':
-                # 检查是否在最近1小时内已发送过通知
-                if not has_sent_alert_recently(status['hostname'], timestamp_str):
-                    print(f"检测到VPS断联: {status['hostname']}, 断联时间: {minutes_diff:.1f}分钟")
-                    if send_offline_notification(status['hostname'], minutes_diff):
-                        # 记录已发送的通知
-                        record_alert(status['hostname'], timestamp_str)
-                        
-        except Exception as e:
-            print(f"检查状态错误: {e}")
+                # 更新该主机最新记录的状态
+                cursor.execute('''
+                    UPDATE status_report
+                    SET status = ?
+                    WHERE id = ?
+                ''', (new_status, host["last_report_id"]))
+                host["status"] = new_status
+                _host_cache_version += 1
+                switched.append(hostname)
+                
+                if new_status == 'offline':
+                    # 断联从超过阈值的时刻算起，与检测线程的运行时机无关
+                    _open_interval(cursor, host, 'offline', host["last_ts"] + threshold)
+                    went_offline.append((hostname, host["last_ts"]))
+                change_id = _record_change(cursor, 'status', hostname, now_ts,
+                                           {'status': new_status, 'start_ts': host["last_ts"] + threshold}) or change_id
+            except Exception as e:
+                logger.error("检查状态错误: %s", e, extra={'hostname': hostname})
+        conn.commit()
+        conn.close()
+    _publish_changes(change_id)
+    for hostname in switched:
+        _note_latest_change(hostname)
     
-    conn.commit()
+    # 如果状态从online变为offline，发送通知（在锁外进行，避免阻塞上报）
+    for hostname, last_ts in went_offline:
+        timestamp_str = datetime.fromtimestamp(last_ts / 1000).strftime(TIME_FORMAT)
+        minutes_diff = (now_ts - last_ts) / 60000
+        # 检查是否在最近1小时内已发送过通知
+        if not has_sent_alert_recently(hostname, timestamp_str):
+            logger.warning("检测到VPS断联: %s, 断联时间: %.1f分钟", hostname, minutes_diff,
+                           extra={'event': 'offline', 'hostname': hostname})
+            if send_offline_notification(hostname, minutes_diff):
+                # 记录已发送的通知
+                record_alert(hostname, timestamp_str)
+
+@timed('sql.get_availability')
+def get_availability(start_ts, end_ts, hostname=None):
+    """统计时间范围内每个主机的在线率和断联列表
+
+    只读取与范围相交的可用性区间，代价与状态切换次数成正比，与上报记录数无关。
+    主机首次上报之前的时间不计入统计；未结束的区间按当前时间截止。
+    """
+    conn = connect_db()
+    cursor = conn.cursor()
+    host_sql = " WHERE h.hostname = ?" if hostname else ""
+    cursor.execute(f'''
+        SELECT h.hostname, a.state, a.start_ts, a.end_ts
+        FROM host h
+        JOIN host_availability a ON a.host_id = h.host_id
+            AND a.start_ts <= ? AND (a.end_ts IS NULL OR a.end_ts > ?)
+        {host_sql}
+        ORDER BY h.hostname, a.start_ts
+    ''', [end_ts, start_ts] + ([hostname] if hostname else []))
+    
+    now_ts = int(time.time() * 1000)
+    results = {}
+    for hostname_val, state, interval_start, interval_end in cursor:
+        begin = max(interval_start, start_ts)
+        finish = min(interval_end if interval_end is not None else now_ts, end_ts)
+        if finish <= begin:
+            continue
+        host = results.setdefault(hostname_val, {
+            'hostname': hostname_val,
+            'online_seconds': 0,
+            'offline_seconds': 0,
+            'outages': [],
+        })
+        host[f'{state}_seconds'] += (finish - begin) // 1000
+        if state == 'offline':
+            host['outages'].append({
+                'start': datetime.fromtimestamp(interval_start / 1000).strftime(TIME_FORMAT),
+                'end': datetime.fromtimestamp(interval_end / 1000).strftime(TIME_FORMAT) if interval_end else None,
+                'duration_minutes': round((finish - begin) / 60000, 1),
+            })
     conn.close()
+    
+    for host in results.values():
+        monitored = host['online_seconds'] + host['offline_seconds']
+        host['uptime_percent'] = round(host['online_seconds'] * 100 / monitored, 3) if monitored else None
+    return list(results.values())
+
+def _prometheus_label(value):
+    """转义 Prometheus 标签值"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# 已渲染的 /metrics 正文：(缓存版本, 静态部分, [(标签, 最近上报时间戳秒)])
+_prometheus_cache = (None, '', [])
+# 每个主机已渲染的样本行：hostname -> ((last_ts, status), 标签, 每个指标族一行)，只重新渲染变化的主机
+_prometheus_host_lines = {}
+
+def _prometheus_families():
+    """/metrics 中（除距最近上报秒数外）的指标族 [(名称, 说明)]，顺序与主机样本行一致"""
+    return ([('vps_up', 'Whether the host is reporting (1) or offline (0).')]
+            + list(PROMETHEUS_GAUGES.values())
+            + [('vps_last_report_timestamp_seconds', 'Unix time of the last report.')])
+
+def _render_host_lines(label, host):
+    """渲染一个主机在各指标族中的样本行（没有取值的指标为 None）"""
+    lines = [f'vps_up{{{label}}} {0 if host["status"] == "offline" else 1}']
+    for metric, (name, _) in PROMETHEUS_GAUGES.items():
+        value = host["gauges"].get(metric)
+        lines.append(f'{name}{{{label}}} {value!r}' if value is not None else None)
+    lines.append(f'vps_last_report_timestamp_seconds{{{label}}} {host["last_ts"] / 1000:.3f}')
+    return tuple(lines)
+
+# 额外的 /metrics 行（如只读副本的复制延迟）：无参可调用对象，返回文本行列表
+_metric_renderers = []
+
+def render_prometheus_metrics():
+    """渲染 /metrics 正文
+
+    除“距最近上报秒数”外的内容只在主机缓存变化（上报、状态切换、删除）时重新拼接，
+    且只重新渲染发生变化的主机；每次抓取只需拼接随时间变化的那一个指标。
+    """
+    global _prometheus_cache, _prometheus_host_lines
+    version, static_body, last_reports = _prometheus_cache
+    if version != _host_cache_version:
+        version = _host_cache_version
+        hosts = sorted(
+            (hostname, host) for hostname, host in list(_host_cache.items())
+            if host["last_report_id"]
+        )
+        host_lines = {}
+        last_reports = []
+        for hostname, host in hosts:
+            key = (host["last_ts"], host["status"])
+            cached = _prometheus_host_lines.get(hostname)
+            if cached is None or cached[0] != key:
+                label = f'hostname="{_prometheus_label(hostname)}"'
+                cached = (key, label, _render_host_lines(label, host))
+            host_lines[hostname] = cached
+            last_reports.append((cached[1], host["last_ts"] / 1000))
+        _prometheus_host_lines = host_lines
+        
+        parts = []
+        rows = [lines for _, _, lines in host_lines.values()]
+        for index, (name, help_text) in enumerate(_prometheus_families()):
+            parts.append(f'# HELP {name} {help_text}\n# TYPE {name} gauge\n')
+            samples = '\n'.join(row[index] for row in rows if row[index] is not None)
+            if samples:
+                parts.append(samples + '\n')
+        static_body = ''.join(parts)
+        _prometheus_cache = (version, static_body, last_reports)
+    
+    now = time.time()
+    dynamic = [
+        '# HELP vps_seconds_since_last_report Seconds since the last report was received.',
+        '# TYPE vps_seconds_since_last_report gauge',
+    ]
+    dynamic.extend(f'vps_seconds_since_last_report{{{label}}} {now - ts:.3f}' for label, ts in last_reports)
+    
+    # 服务端自身的上报准入状态
+    with _stats_lock:
+        shed = {reason: _counters.get(f'ingest.shed.{reason}', 0) for reason in ('queue_full', 'timeout')}
+        queue_wait = _histograms.get('ingest.queue_wait')
+        wait_count, wait_sum = (queue_wait.count, queue_wait.total / 1000) if queue_wait else (0, 0.0)
+    dynamic += [
+        '# HELP vps_monitor_ingest_in_flight Reports currently being written.',
+        '# TYPE vps_monitor_ingest_in_flight gauge',
+        f'vps_monitor_ingest_in_flight {ingest_gate.in_flight}',
+        '# HELP vps_monitor_ingest_queue_depth Reports waiting for admission.',
+        '# TYPE vps_monitor_ingest_queue_depth gauge',
+        f'vps_monitor_ingest_queue_depth {ingest_gate.waiting}',
+        '# HELP vps_monitor_ingest_shed_total Reports rejected by admission control.',
+        '# TYPE vps_monitor_ingest_shed_total counter',
+    ]
+    dynamic.extend(f'vps_monitor_ingest_shed_total{{reason="{reason}"}} {count}' for reason, count in shed.items())
+    for render in _metric_renderers:
+        dynamic.extend(render())
+    dynamic += [
+        '# HELP vps_monitor_ingest_queue_wait_seconds Time reports waited for admission.',
+        '# TYPE vps_monitor_ingest_queue_wait_seconds summary',
+        f'vps_monitor_ingest_queue_wait_seconds_sum {wait_sum:.6f}',
+        f'vps_monitor_ingest_queue_wait_seconds_count {wait_count}',
+    ]
+    return static_body + '\n'.join(dynamic) + '\n'
+
+# 上报准入控制：同时写入的上报数、排队名额和最长排队时间（秒）
+# 超出时 /api/status 返回 429/503 和 Retry-After；仪表盘、/metrics 等读接口不经过这里
+INGEST_MAX_IN_FLIGHT = _config.get("ingest_max_in_flight", 2)
+INGEST_QUEUE_SIZE = _config.get("ingest_queue_size", 64)
+INGEST_QUEUE_TIMEOUT = _config.get("ingest_queue_timeout_seconds", 5)
+ingest_gate = AdmissionGate('ingest', INGEST_MAX_IN_FLIGHT, INGEST_QUEUE_SIZE, INGEST_QUEUE_TIMEOUT)
+
+def admitted_ingest(status_data, reserved_at=None):
+    """经准入控制写入一次上报；reserved_at 为已在别处（如事件循环中）调用 ingest_gate.reserve() 的时刻"""
+    if reserved_at is None:
+        reserved_at = ingest_gate.reserve()
+    started = ingest_gate.start(reserved_at)
+    try:
+        return ingest_report(status_data)
+    finally:
+        ingest_gate.finish(started)
+
+def shard_for(hostname, shard_count):
+    """主机所属的分片序号（router.py 和各分片使用同一算法）"""
+    return zlib.crc32(hostname.encode('utf-8')) % shard_count
+
+def owns_host(hostname):
+    """本节点是否负责该主机"""
+    return SHARD_COUNT <= 1 or shard_for(hostname or '', SHARD_COUNT) == SHARD_INDEX
+
+def misdirected_response(hostname):
+    """主机不属于本分片时的响应（421），附上应发往的分片序号"""
+    return jsonify({"error": "Host belongs to another shard",
+                    "shard": shard_for(hostname or '', SHARD_COUNT)}), 421
+
+def overloaded_response(error):
+    """准入控制拒绝上报时的响应：Retry-After 告诉客户端何时重试"""
+    response = jsonify({"error": "Server busy", "retry_after": error.retry_after})
+    response.headers['Retry-After'] = str(error.retry_after)
+    response.headers['X-Report-Interval'] = str(suggested_report_interval())
+    return response, error.status
+
+def ingest_report(status_data):
+    """写入一次上报并增量评估告警规则和异常检测，返回 (是否新VPS, 触发的规则, 异常)
+
+    Flask 和 asyncio 两种入口共用；整个过程持有 db_lock。
+    """
+    hostname = status_data.get('hostname')
+    with db_lock:
+        is_new_vps = insert_status(status_data)
+        metrics = extract_metrics(status_data)
+        fired = evaluate_alert_rules(hostname, metrics)
+        anomalies = detect_anomalies(hostname, metrics)
+    incr('ingest.reports')
+    if is_new_vps:
+        incr('ingest.new_hosts')
+    return is_new_vps, fired, anomalies
+
+def suggested_report_interval():
+    """建议客户端使用的上报间隔（秒）
+
+    主机数 / 间隔 超过 MAX_INGEST_RATE 时按比例拉长，但不超过断联阈值（留一分钟余量），
+    否则正常上报的主机会被误判为断联。
+    """
+    interval = REPORT_INTERVAL_SECONDS
+    if MAX_INGEST_RATE > 0:
+        interval = max(interval, math.ceil(len(_host_cache) / MAX_INGEST_RATE))
+        interval = min(interval, max(REPORT_INTERVAL_SECONDS, ALERT_INTERVAL_MINUTES * 60 - 60))
+    return interval
+
+def send_report_notifications(status_data, is_new_vps, fired, anomalies):
+    """发送一次上报引起的通知（在锁外调用）"""
+    hostname = status_data.get('hostname')
+    # 如果是新VPS，发送通知
+    if is_new_vps:
+        logger.info("检测到新VPS上线: %s", hostname, extra={'event': 'new_host', 'hostname': hostname})
+        send_new_vps_notification(
+            status_data.get('hostname', 'Unknown'),
+            status_data.get('local_ip', 'Unknown')
+        )
+    
+    # 阈值规则告警和异常检测通知
+    if fired:
+        notify_rule_alerts(hostname, fired)
+    if anomalies:
+        notify_anomalies(hostname, anomalies)
 
 @app.route('/api/status', methods=['POST'])
 def receive_status():
     """接收VPS状态信息"""
+    if READ_ONLY:
+        return jsonify({"error": "Read-only replica"}), 403
     try:
         data = request.json
         
@@ -494,39 +2285,330 @@ def receive_status():
         status_data = data.get('data')
         if not status_data:
             return jsonify({"error": "No data provided"}), 400
+        if not owns_host(status_data.get('hostname')):
+            return misdirected_response(status_data.get('hostname'))
         
-        # 插入数据库并检测是否是新VPS
-        is_new_vps = False
-        with db_lock:
-            is_new_vps = insert_status(status_data)
-        
-        # 如果是新VPS，发送通知
-        if is_new_vps:
-            print(f"检测到新VPS上线: {status_data.get('hostname')}")
-            send_new_vps_notification(
-                status_data.get('hostname', 'Unknown'),
-                status_data.get('local_ip', 'Unknown')
-            )
+        # 插入数据库并检测是否是新VPS（排队已满或超时则拒绝）
+        is_new_vps, fired, anomalies = admitted_ingest(status_data)
+        send_report_notifications(status_data, is_new_vps, fired, anomalies)
         
         # 接收状态后检查所有VPS的断联情况
         check_connection_status()
         
-        return jsonify({"success": True, "message": "Status received"}), 200
+        # 下发建议的上报间隔，客户端据此调整节奏
+        interval = suggested_report_interval()
+        response = jsonify({"success": True, "message": "Status received", "report_interval": interval})
+        response.headers['X-Report-Interval'] = str(interval)
+        return response, 200
         
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
-        print(f"接收状态错误: {e}")
+        logger.error("接收状态错误: %s", e, exc_info=True)
+        incr('ingest.errors')
         return jsonify({"error": str(e)}), 500
 
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """存活检查：不访问数据库、不等待任何锁，上报高峰期间也能立即响应"""
+    return jsonify({"status": "ok", "ingest_in_flight": ingest_gate.in_flight, "ingest_waiting": ingest_gate.waiting})
+
+# /api/hosts 每次最多返回的主机名数
+HOSTS_DEFAULT_LIMIT = 50
+HOSTS_MAX_LIMIT = 1000
+
+@app.route('/api/hosts', methods=['GET'])
+def get_hosts():
+    """主机名单（来自内存中的主机缓存，不查询数据库）：prefix 前缀搜索，limit 条数上限
+
+    version 为名单版本，带上 since=<version> 再次请求时，名单未变化则只返回 {"version", "unchanged": true}。
+    """
+    if not _host_cache_loaded:
+        load_host_cache()
+    version, names = host_names()
+    # 进程重启后版本号从头计数，带上启动时间避免误判为未变化
+    token = f"{int(_started_at)}.{version}"
+    if request.args.get('since') == token:
+        return jsonify({"version": token, "unchanged": True})
+    
+    prefix = request.args.get('prefix', '')
+    limit = min(max(request.args.get('limit', HOSTS_DEFAULT_LIMIT, type=int), 1), HOSTS_MAX_LIMIT)
+    # 名单已排序，前缀匹配的主机名是连续的一段
+    start = bisect.bisect_left(names, prefix)
+    end = bisect.bisect_left(names, prefix + '\U0010ffff') if prefix else len(names)
+    return jsonify({
+        "version": token,
+        "total": end - start,
+        "hosts": names[start:min(end, start + limit)],
+    })
+
+# 带任一参数时 /api/latest 返回分页结果，否则返回全部主机的数组（兼容旧版）
+LATEST_QUERY_ARGS = ('page', 'page_size', 'status', 'search', 'min_cpu', 'max_cpu', 'sort', 'order')
+# 列表接口的响应格式：rows 每行一个对象（默认）；columnar 为一个列名数组加每列一个值数组，由行元组直接转置
+RESPONSE_FORMATS = ('rows', 'columnar')
+
+def wants_columnar():
+    """解析 format= 参数，未知格式抛出ValueError"""
+    response_format = request.args.get('format', 'rows')
+    if response_format not in RESPONSE_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(RESPONSE_FORMATS)}")
+    return response_format == 'columnar'
+
 @app.route('/api/latest', methods=['GET'])
 def get_latest():
-    """获取最新状态（API）"""
+    """获取最新状态（API）
+
+    分页查询：status=online|offline、search=主机名子串、min_cpu/max_cpu、
+    sort=last_seen|hostname|cpu|memory|disk、order=asc|desc、page、page_size，
+    返回 {"total", "page", "page_size", "total_pages", "version", "data"}。
+
+    增量查询：since=<version>（取自上一次响应的 version 或 X-Latest-Version 头），
+    只返回之后有变化的主机和被删除的主机名 {"version", "reset", "data", "deleted"}。
+
+    format=columnar 时以上各种结果中的 "data" 换为 "columns"、"values"（全部主机时即 {"columns", "values"}）。
+    """
+    try:
+        as_columnar = wants_columnar()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     check_connection_status()
-    latest = get_latest_status_by_hostname()
-    return jsonify(latest)
+    if 'since' in request.args:
+        return jsonify(latest_delta(request.args.get('since'), as_columnar=as_columnar))
+    # 先取版本再读数据：期间发生的变化会在下一次增量中重复出现，但不会遗漏
+    version = latest_version()
+    if not any(arg in request.args for arg in LATEST_QUERY_ARGS):
+        latest = get_latest_status_by_hostname(as_columnar=as_columnar)
+        response = jsonify(latest)
+        response.headers['X-Latest-Version'] = version
+        return response
+    
+    status = request.args.get('status') or None
+    sort = request.args.get('sort', 'last_seen')
+    order = request.args.get('order')
+    if status not in (None, 'online', 'offline'):
+        return jsonify({"error": "status must be online or offline"}), 400
+    if sort not in LATEST_SORTS:
+        return jsonify({"error": f"sort must be one of: {', '.join(LATEST_SORTS)}"}), 400
+    if order not in (None, 'asc', 'desc'):
+        return jsonify({"error": "order must be asc or desc"}), 400
+    result = query_latest(
+        status=status,
+        search=request.args.get('search'),
+        min_cpu=request.args.get('min_cpu', type=float),
+        max_cpu=request.args.get('max_cpu', type=float),
+        sort=sort,
+        descending=None if order is None else order == 'desc',
+        page=max(request.args.get('page', 1, type=int), 1),
+        page_size=min(max(request.args.get('page_size', 50, type=int), 1), LATEST_MAX_PAGE_SIZE),
+        as_columnar=as_columnar,
+    )
+    result['version'] = version
+    return jsonify(result)
+
+@app.route('/api/latest/summary', methods=['GET'])
+def get_latest_summary():
+    """仪表盘汇总：主机总数、在线/断联数量和在线主机的平均负载"""
+    check_connection_status()
+    return jsonify(latest_summary())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus 文本格式导出（只读内存中的主机缓存，不查询数据库、不写库）"""
+    if not _host_cache_loaded:
+        load_host_cache()
+    return Response(render_prometheus_metrics(),
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# 请求级统计和抽样分析器：按概率 PROFILE_SAMPLE_RATE 抽取请求用 cProfile 分析，结果累计后在 /debug/profile 查看
+PROFILE_SAMPLE_RATE = _config.get("profile_sample_rate", 0.0)
+_profile_lock = Lock()  # 同一时刻只分析一个请求
+_profile_stats = None
+_profile_samples = 0
+_in_flight = 0
+
+@app.before_request
+def _before_request():
+    global _in_flight
+    g.request_start = time.perf_counter()
+    with _stats_lock:
+        _in_flight += 1
+    if (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE
+            and not request.path.startswith('/debug/') and _profile_lock.acquire(blocking=False)):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def _after_request(response):
+    # 流式响应只统计到开始发送为止
+    observe(f'http.{request.endpoint}', (time.perf_counter() - g.request_start) * 1000)
+    incr(f'http.status.{response.status_code}')
+    return response
+
+app.after_request(compress_response)
+
+@app.teardown_request
+def _teardown_request(exc):
+    global _in_flight, _profile_stats, _profile_samples
+    with _stats_lock:
+        _in_flight -= 1
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        try:
+            if _profile_stats is None:
+                _profile_stats = pstats.Stats(profiler)
+            else:
+                _profile_stats.add(profiler)
+            _profile_samples += 1
+        finally:
+            _profile_lock.release()
+
+def _file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+# 长轮询最长等待时间（秒）和每次最多返回的变更条数
+CHANGES_MAX_WAIT = 30
+CHANGES_MAX_LIMIT = 10000
+
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    """变更流：返回 id 大于 after 的变更（按 id 升序），没有新变更时最多等待 wait 秒（长轮询）
+
+    after 早于保留范围时返回 410，副本需要先拉取 /api/changes/snapshot。
+    """
+    if not CHANGE_FEED_ENABLED:
+        return jsonify({"error": "Change feed is disabled"}), 404
+    if request.args.get('key') != SERVER_KEY:
+        return jsonify({"error": "Invalid key"}), 401
+    after = request.args.get('after', 0, type=int)
+    limit = min(max(request.args.get('limit', 1000, type=int), 1), CHANGES_MAX_LIMIT)
+    wait = min(max(request.args.get('wait', 0, type=float), 0), CHANGES_MAX_WAIT)
+    
+    head = wait_for_changes(after, wait)
+    conn = connect_db()
+    try:
+        oldest = conn.execute('SELECT MIN(id) FROM change_log').fetchone()[0]
+        if oldest is not None and after < oldest - 1:
+            return jsonify({"error": "Cursor expired", "oldest": oldest, "head": head}), 410
+        rows = conn.execute('''
+            SELECT id, ts, kind, hostname, payload FROM change_log
+            WHERE id > ? ORDER BY id LIMIT ?
+        ''', (after, limit)).fetchall()
+    finally:
+        conn.close()
+    changes = [
+        {'id': change_id, 'ts': ts, 'kind': kind, 'hostname': hostname,
+         'payload': json.loads(payload) if payload is not None else None}
+        for change_id, ts, kind, hostname, payload in rows
+    ]
+    return jsonify({'head': max(head, changes[-1]['id'] if changes else 0), 'changes': changes})
+
+@app.route('/api/changes/snapshot', methods=['GET'])
+def get_changes_snapshot():
+    """数据库快照（SQLite 在线备份，在一个读事务内完成，不阻塞上报），X-Change-Cursor 为快照包含的最后一条变更 id"""
+    if not CHANGE_FEED_ENABLED:
+        return jsonify({"error": "Change feed is disabled"}), 404
+    if request.args.get('key') != SERVER_KEY:
+        return jsonify({"error": "Invalid key"}), 401
+    fd, path = tempfile.mkstemp(prefix='snapshot-', suffix='.db', dir=os.path.dirname(os.path.abspath(DB_FILE)))
+    os.close(fd)
+    source = connect_db()
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target)
+        cursor_id = target.execute('SELECT COALESCE(MAX(id), 0) FROM change_log').fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+    
+    def body():
+        try:
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            os.remove(path)
+    return Response(body(), mimetype='application/vnd.sqlite3',
+                    headers={'X-Change-Cursor': str(cursor_id), 'Content-Length': str(os.path.getsize(path))})
+
+@app.route('/debug/stats', methods=['GET'])
+def debug_stats():
+    """服务端自身统计：各路径耗时分位数、计数器、队列深度和数据库连接"""
+    with _stats_lock:
+        histograms = {name: histogram.summary() for name, histogram in sorted(_histograms.items())}
+        counters = dict(sorted(_counters.items()))
+    opened = counters.get('db.connections_opened', 0)
+    closed = counters.get('db.connections_closed', 0)
+    return jsonify({
+        'uptime_seconds': round(time.time() - _started_at),
+        'latency': histograms,
+        'counters': counters,
+        'queues': {
+            'db_lock_waiting': db_lock.waiting,
+            'in_flight_requests': _in_flight,
+            'ingest_in_flight': ingest_gate.in_flight,
+            'ingest_waiting': ingest_gate.waiting,
+            'log_queue': _log_queue.qsize() if _log_queue is not None else None,
+            'log_dropped': NonBlockingQueueHandler.dropped,
+        },
+        'db': {
+            'connections_opened': opened,
+            'connections_closed': closed,
+            'connections_open': opened - closed,
+            'file_bytes': _file_size(DB_FILE),
+            'wal_bytes': _file_size(DB_FILE + '-wal'),
+        },
+        'cache': {
+            'hosts': len(_host_cache),
+            'series_hosts': len(_series_cache),
+        },
+        'profiler': {
+            'sample_rate': PROFILE_SAMPLE_RATE,
+            'samples': _profile_samples,
+        },
+    })
+
+@app.route('/debug/profile', methods=['GET', 'POST'])
+def debug_profile():
+    """查看抽样分析结果；POST（需 key）设置抽样率 rate（0 关闭）或 reset=1 清空结果"""
+    global PROFILE_SAMPLE_RATE, _profile_stats, _profile_samples
+    if request.method == 'POST':
+        if request.values.get('key') != SERVER_KEY:
+            return jsonify({"error": "Invalid key"}), 401
+        try:
+            if 'rate' in request.values:
+                rate = float(request.values['rate'])
+                if not 0 <= rate <= 1:
+                    raise ValueError(rate)
+                PROFILE_SAMPLE_RATE = rate
+        except ValueError:
+            return jsonify({"error": "rate must be between 0 and 1"}), 400
+        if request.values.get('reset') == '1':
+            with _profile_lock:
+                _profile_stats = None
+                _profile_samples = 0
+        return jsonify({"success": True, "sample_rate": PROFILE_SAMPLE_RATE, "samples": _profile_samples})
+    
+    sort = request.args.get('sort', 'cumulative')
+    limit = request.args.get('limit', 40, type=int)
+    if sort not in ('cumulative', 'tottime', 'ncalls'):
+        return jsonify({"error": "sort must be one of cumulative, tottime, ncalls"}), 400
+    output = io.StringIO()
+    with _profile_lock:
+        if _profile_stats is None:
+            output.write(f"no samples (sample_rate={PROFILE_SAMPLE_RATE})\n")
+        else:
+            output.write(f"samples: {_profile_samples}\n")
+            _profile_stats.stream = output
+            _profile_stats.sort_stats(sort).print_stats(limit)
+    return Response(output.getvalue(), mimetype='text/plain')
 
 @app.route('/api/history', methods=['GET'])
 def get_history():
-    """获取历史记录（API），支持分页和日期区间查询"""
+    """获取历史记录（API），支持分页、日期区间查询和字段选择（fields=a,b,c），结果流式输出；format=columnar 为列式"""
     limit = request.args.get('limit', 100, type=int)
     page = request.args.get('page', 1, type=int)
     page_size = request.args.get('page_size', limit, type=int)
@@ -540,16 +2622,173 @@ def get_history():
     if end_date and len(end_date) == 10:
         end_date += ' 23:59:59'
     
-    history = get_all_statuses(limit=limit, page=page, page_size=page_size, 
-                               start_date=start_date, end_date=end_date, hostname=hostname)
-    return jsonify(history)
+    try:
+        fields = parse_fields(request.args.get('fields', None), HISTORY_FIELDS)
+        as_columnar = wants_columnar()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        history = get_all_statuses(limit=limit, page=page, page_size=page_size, 
+                                   start_date=start_date, end_date=end_date, hostname=hostname,
+                                   fields=fields)
+    except ValueError:
+        return jsonify({"error": "Invalid date format"}), 400
+    
+    meta = {key: history[key] for key in ('total', 'page', 'page_size', 'total_pages')}
+    if as_columnar:
+        # 列式需要整页转置，不再流式输出（一页的行数有限）
+        rows = [row for rows in history['data'] for row in rows]
+        return jsonify({**meta, **columnar(history['columns'], rows)})
+    body = stream_json_rows(meta, 'data', history['columns'], history['data'])
+    return Response(body, mimetype='application/json')
+
+@app.route('/api/export', methods=['GET'])
+def export_history():
+    """流式导出历史记录：format=csv|ndjson|columnar，gzip=1 压缩（columnar 默认压缩）"""
+    export_format = request.args.get('format', 'csv')
+    start_date = request.args.get('start_date', None)
+    end_date = request.args.get('end_date', None)
+    hostname = request.args.get('hostname', None)
+    
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    
+    # 如果提供了日期，确保格式正确
+    if start_date and len(start_date) == 10:
+        start_date += ' 00:00:00'
+    if end_date and len(end_date) == 10:
+        end_date += ' 23:59:59'
+    
+    try:
+        fields = parse_fields(request.args.get('fields', None), HISTORY_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    try:
+        # 提前校验日期，避免在流式输出过程中才报错
+        _build_report_filters(start_date, end_date, hostname)
+    except ValueError:
+        return jsonify({"error": "Invalid date format"}), 400
+    
+    batches = iter_export_batches(start_date=start_date, end_date=end_date, hostname=hostname, fields=fields)
+    if export_format == 'csv':
+        body, mimetype, ext = export_csv(fields, batches), 'text/csv', 'csv'
+    elif export_format == 'ndjson':
+        body, mimetype, ext = export_ndjson(fields, batches), 'application/x-ndjson', 'ndjson'
+    else:
+        body, mimetype, ext = export_columnar(fields, batches), 'application/x-ndjson', 'columnar.ndjson'
+    
+    compress = request.args.get('gzip', '1' if export_format == 'columnar' else '0') == '1'
+    if compress:
+        body, mimetype, ext = gzip_stream(body), 'application/gzip', ext + '.gz'
+    
+    filename = f"status_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{ext}"
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"'
+    })
+
+@app.route('/api/history/chart', methods=['GET'])
+def get_history_chart():
+    """获取历史记录图表数据（format=columnar 为列式）"""
+    start_date = request.args.get('start_date', None)
+    end_date = request.args.get('end_date', None)
+    hostname = request.args.get('hostname', None)
+    
+    # 如果提供了日期，确保格式正确
+    if start_date and len(start_date) == 10:
+        start_date += ' 00:00:00'
+    if end_date and len(end_date) == 10:
+        end_date += ' 23:59:59'
+    
+    try:
+        as_columnar = wants_columnar()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        chart_data = get_chart_data(start_date=start_date, end_date=end_date, hostname=hostname,
+                                    as_columnar=as_columnar)
+    except ValueError:
+        return jsonify({"error": "Invalid date format"}), 400
+    return jsonify(chart_data)
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """获取主机上报过的指标名列表"""
+    hostname = request.args.get('hostname', None)
+    if not hostname:
+        return jsonify({"error": "hostname is required"}), 400
+    return jsonify(get_metric_names(hostname))
+
+@app.route('/api/series', methods=['GET'])
+def get_series_data():
+    """按时间范围获取单个指标序列的数据"""
+    hostname = request.args.get('hostname', None)
+    metric = request.args.get('metric', None)
+    start_date = request.args.get('start_date', None)
+    end_date = request.args.get('end_date', None)
+    limit = request.args.get('limit', 10000, type=int)
+    if not hostname or not metric:
+        return jsonify({"error": "hostname and metric are required"}), 400
+    
+    # 如果提供了日期，确保格式正确
+    if start_date and len(start_date) == 10:
+        start_date += ' 00:00:00'
+    if end_date and len(end_date) == 10:
+        end_date += ' 23:59:59'
+    
+    try:
+        series = get_series(hostname, metric, start_date=start_date, end_date=end_date, limit=limit)
+    except ValueError:
+        return jsonify({"error": "Invalid date format"}), 400
+    if series is None:
+        return jsonify({"error": "Series not found"}), 404
+    return jsonify(series)
+
+@app.route('/api/availability', methods=['GET'])
+def get_availability_api():
+    """获取在线率和断联记录：start_date/end_date（默认最近30天）、hostname"""
+    start_date = request.args.get('start_date', None)
+    end_date = request.args.get('end_date', None)
+    hostname = request.args.get('hostname', None)
+    
+    # 如果提供了日期，确保格式正确
+    if start_date and len(start_date) == 10:
+        start_date += ' 00:00:00'
+    if end_date and len(end_date) == 10:
+        end_date += ' 23:59:59'
+    
+    try:
+        end_ts = to_epoch_ms(end_date) + 999 if end_date else int(time.time() * 1000)
+        start_ts = to_epoch_ms(start_date) if start_date else end_ts - 30 * 86400000
+    except ValueError:
+        return jsonify({"error": "Invalid date format"}), 400
+    
+    return jsonify({
+        'start': datetime.fromtimestamp(start_ts / 1000).strftime(TIME_FORMAT),
+        'end': datetime.fromtimestamp(end_ts / 1000).strftime(TIME_FORMAT),
+        'hosts': get_availability(start_ts, end_ts, hostname),
+    })
 
-@app.route('/api/history/chart', methods=['GET'])
-def get_history_chart():
-    """获取历史记录图表数据"""
+@app.route('/api/analytics', methods=['GET'])
+def get_analytics():
+    """全机群指标分析：每台主机的分位数、移动平均、线性趋势，到达上限的预测和Top-N排名
+
+    参数：metric（默认cpu_percent）、start_date/end_date（默认最近7天）、hostname、
+    q=50,95,99、window（移动平均点数）、limit（趋势预测的上限，默认100）、
+    horizon_days（只列出该天数内到达上限的主机，默认30）、top、rank_by（默认p95）。
+    """
+    if np is None:
+        return jsonify({"error": "NumPy is not installed on the server"}), 501
+    
+    metric = request.args.get('metric', 'cpu_percent')
     start_date = request.args.get('start_date', None)
     end_date = request.args.get('end_date', None)
     hostname = request.args.get('hostname', None)
+    window = max(request.args.get('window', 4, type=int), 1)
+    limit = request.args.get('limit', 100.0, type=float)
+    horizon_days = request.args.get('horizon_days', 30.0, type=float)
+    top = request.args.get('top', 10, type=int)
     
     # 如果提供了日期，确保格式正确
     if start_date and len(start_date) == 10:
@@ -557,43 +2796,171 @@ def get_history_chart():
     if end_date and len(end_date) == 10:
         end_date += ' 23:59:59'
     
-    chart_data = get_chart_data(start_date=start_date, end_date=end_date, hostname=hostname)
-    return jsonify(chart_data)
-
-@app.route('/api/delete/<path:hostname>', methods=['DELETE', 'POST'])
-def delete_vps(hostname):
-    """删除指定VPS的所有记录"""
     try:
-        from urllib.parse import unquote
-        # URL解码hostname
-        hostname = unquote(hostname)
-        print(f"[删除] 收到删除请求，hostname: {repr(hostname)}")
-        
-        conn = sqlite3.connect(DB_FILE)
+        quantiles = [float(q) for q in request.args.get('q', '50,95,99').split(',')]
+        if not all(0 <= q <= 100 for q in quantiles):
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "q must be a comma separated list of numbers in [0, 100]"}), 400
+    default_rank = 'p95' if 95 in quantiles else f'p{quantiles[-1]:g}'
+    rank_by = request.args.get('rank_by', default_rank)
+    
+    try:
+        end_ts = to_epoch_ms(end_date) + 999 if end_date else int(time.time() * 1000)
+        start_ts = to_epoch_ms(start_date) if start_date else end_ts - 7 * 86400000
+    except ValueError:
+        return jsonify({"error": "Invalid date format"}), 400
+    
+    timings = {}
+    started = time.perf_counter()
+    series_ids, timestamps, values, hostnames = load_metric_arrays(metric, start_ts, end_ts, hostname)
+    timings['load_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    
+    started = time.perf_counter()
+    hosts = []
+    if len(values):
+        stats = compute_analytics(series_ids, timestamps, values, quantiles, window, limit)
+        if rank_by not in stats:
+            return jsonify({"error": f"Unknown rank_by: {rank_by}"}), 400
+        columns = [key for key in stats if key != 'series_id']
+        for i, series_id in enumerate(stats['series_id'].tolist()):
+            host = {'hostname': hostnames.get(series_id)}
+            for key in columns:
+                value = stats[key][i].item()
+                host[key] = round(value, 4) if math.isfinite(value) else None
+            hosts.append(host)
+        ranking = np.argsort(-stats[rank_by], kind='stable')[:top]
+        fill = np.flatnonzero(stats['days_to_limit'] <= horizon_days)
+        fill = fill[np.argsort(stats['days_to_limit'][fill], kind='stable')]
+    else:
+        ranking = fill = []
+    timings['compute_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    
+    result = {
+        'metric': metric,
+        'start': start_ts,
+        'end': end_ts,
+        'points': int(len(values)),
+        'hosts': hosts,
+        'top': [hosts[i] | {'rank_value': hosts[i][rank_by]} for i in ranking.tolist()] if len(hosts) else [],
+        'rank_by': rank_by,
+        'projected_to_limit': [
+            {'hostname': hosts[i]['hostname'], 'last': hosts[i]['last'],
+             'trend_per_day': hosts[i]['trend_per_day'], 'days_to_limit': hosts[i]['days_to_limit']}
+            for i in (fill.tolist() if len(hosts) else [])
+        ],
+        'limit': limit,
+        'horizon_days': horizon_days,
+        'timings': timings,
+    }
+    # 指定单台主机时附带完整序列和移动平均曲线
+    if hostname and len(values):
+        result['series'] = {
+            'timestamps': timestamps.tolist(),
+            'values': values.tolist(),
+            'moving_average': np.round(moving_average(values, window), 4).tolist(),
+        }
+    return jsonify(result)
+
+def delete_host_records(hostname):
+    """删除指定主机的所有记录（指标数据、序列字典、上报记录、主机属性、可用性区间和通知记录）
+
+    返回 (删除的上报条数, 删除的通知条数)，主机不存在时返回 None。
+    """
+    global _host_cache_version, _host_registry_version
+    with db_lock:
+        conn = connect_db()
         cursor = conn.cursor()
         
         # 检查是否存在该VPS的记录
-        cursor.execute('SELECT COUNT(*) FROM status_log WHERE hostname = ?', (hostname,))
+        cursor.execute('SELECT host_id FROM host WHERE hostname = ?', (hostname,))
+        row = cursor.fetchone()
+        host_id = row[0] if row else None
+        cursor.execute('SELECT COUNT(*) FROM status_report WHERE host_id = ?', (host_id,))
         count = cursor.fetchone()[0]
-        print(f"[删除] 找到 {count} 条记录")
+        logger.info("[删除] 找到 %d 条记录", count)
         
-        if count == 0:
+        if host_id is None:
             conn.close()
-            print(f"[删除] VPS不存在: {hostname}")
-            return jsonify({"success": False, "error": "VPS不存在"}), 404
+            return None
         
-        # 删除该VPS的所有记录（包括status_log和alert_log）
-        cursor.execute('DELETE FROM status_log WHERE hostname = ?', (hostname,))
+        cursor.execute('''
+            DELETE FROM metric_points
+            WHERE series_id IN (SELECT series_id FROM metric_series WHERE host_id = ?)
+        ''', (host_id,))
+        cursor.execute('DELETE FROM metric_series WHERE host_id = ?', (host_id,))
+        cursor.execute('DELETE FROM status_report WHERE host_id = ?', (host_id,))
         deleted_count = cursor.rowcount
+        cursor.execute('DELETE FROM host_version WHERE host_id = ?', (host_id,))
+        cursor.execute('DELETE FROM host_availability WHERE host_id = ?', (host_id,))
+        cursor.execute('DELETE FROM host WHERE host_id = ?', (host_id,))
         
         # 同时删除该VPS的通知记录
         cursor.execute('DELETE FROM alert_log WHERE hostname = ?', (hostname,))
         alert_deleted = cursor.rowcount
         
+        change_id = _record_change(cursor, 'delete', hostname, int(time.time() * 1000))
         conn.commit()
         conn.close()
+        _host_cache.pop(hostname, None)
+        _host_cache_version += 1
+        _host_registry_version += 1
+        _note_latest_change(hostname, deleted=True)
+        _series_cache.pop(host_id, None)
+        _rule_state.pop(hostname, None)
+        _anomaly_state.pop(hostname, None)
+    _publish_changes(change_id)
+    return deleted_count, alert_deleted
+
+def apply_change(change):
+    """只读副本重放主库的一条变更；同一条变更重放多次不会产生重复数据"""
+    global _host_cache_version
+    kind, hostname, ts, payload = change['kind'], change['hostname'], change['ts'], change.get('payload')
+    if kind == 'delete':
+        delete_host_records(hostname)
+        return
+    with db_lock:
+        conn = connect_db()
+        cursor = conn.cursor()
+        try:
+            host = _get_host(cursor, hostname)
+            if kind == 'report':
+                # 同一主机的服务端时间严格递增，不大于最近一次上报的说明已经重放过
+                if host is None or ts > host["last_ts"]:
+                    insert_status(payload, ts=ts)
+            elif kind == 'status':
+                if host is None or not host["last_report_id"] or host["status"] == payload['status']:
+                    return
+                cursor.execute('UPDATE status_report SET status = ? WHERE id = ?',
+                               (payload['status'], host["last_report_id"]))
+                host["status"] = payload['status']
+                if payload['status'] == 'offline':
+                    _open_interval(cursor, host, 'offline', payload['start_ts'])
+                conn.commit()
+                _host_cache_version += 1
+                _note_latest_change(hostname)
+        finally:
+            conn.close()
+
+@app.route('/api/delete/<path:hostname>', methods=['DELETE', 'POST'])
+def delete_vps(hostname):
+    """删除指定VPS的所有记录"""
+    if READ_ONLY:
+        return jsonify({"success": False, "error": "Read-only replica"}), 403
+    try:
+        from urllib.parse import unquote
+        # URL解码hostname
+        hostname = unquote(hostname)
+        logger.info("[删除] 收到删除请求，hostname: %r", hostname)
+        
+        deleted = delete_host_records(hostname)
+        if deleted is None:
+            logger.warning("[删除] VPS不存在: %s", hostname)
+            return jsonify({"success": False, "error": "VPS不存在"}), 404
+        deleted_count, alert_deleted = deleted
         
-        print(f"[删除] 成功删除VPS '{hostname}' 的 {deleted_count} 条状态记录和 {alert_deleted} 条通知记录")
+        logger.info("[删除] 成功删除VPS '%s' 的 %d 条状态记录和 %d 条通知记录", hostname, deleted_count, alert_deleted,
+                    extra={'event': 'delete_host', 'hostname': hostname})
         
         # 发送删除成功通知
         send_delete_vps_notification(hostname, deleted_count)
@@ -604,16 +2971,38 @@ def delete_vps(hostname):
         }), 200
         
     except Exception as e:
-        import traceback
         error_msg = str(e)
-        print(f"[删除] 错误: {error_msg}")
-        traceback.print_exc()
+        logger.error("[删除] 错误: %s", error_msg, exc_info=True)
         return jsonify({"success": False, "error": error_msg}), 500
 
 @app.route('/')
 def index():
-    """Web界面"""
-    return render_template_string(HTML_TEMPLATE)
+    """Web界面：启动时已渲染并压缩好，浏览器每次按 ETag 确认（页面很小，引用的样式和脚本长期缓存）"""
+    return _prebuilt_response(_index_page, 'no-cache')
+
+@app.route('/assets/<name>')
+def dashboard_asset(name):
+    """仪表盘样式和脚本：文件名带内容哈希，内容变化时地址随之变化，因此可以永久缓存"""
+    asset = _assets.get(name)
+    if asset is None:
+        return jsonify({"error": "Not found"}), 404
+    return _prebuilt_response(asset, 'public, max-age=31536000, immutable')
+
+def _prebuilt_response(prebuilt, cache_control):
+    """返回预先压缩好的内容：按 Accept-Encoding 选择版本，ETag 匹配时返回 304"""
+    etag = prebuilt['etag']
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        encoding = accepted_encoding()
+        body = prebuilt.get(encoding) or prebuilt['identity']
+        response = Response(body, mimetype=prebuilt['mimetype'])
+        if body is not prebuilt['identity']:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    return response
 
 # HTML模板
 HTML_TEMPLATE = '''
@@ -627,7 +3016,103 @@ HTML_TEMPLATE = '''
     <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
     <link href="https://fonts.googleapis.com/css2?family=Orbitron:wght@400;700&family=Rajdhani:wght@300;500;700&display=swap" rel="stylesheet">
     <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css">
-    <style>
+    <link rel="stylesheet" href="{{ asset_url('dashboard.css') }}">
+</head>
+<body>
+    <div class="container">
+        <div class="header glass-panel">
+            <h1>Nexus Monitor</h1>
+            <div class="header-controls">
+                <div class="refresh-info">
+                    AUTO REFRESH: <span id="autoRefresh">30</span>s
+                </div>
+                <button class="cyber-btn" onclick="loadData()">
+                    <i class="fas fa-sync-alt"></i> REFRESH
+                </button>
+            </div>
+        </div>
+        
+        <div class="fleet-bar glass-panel">
+            <div id="fleetSummary" class="fleet-summary"></div>
+            <div class="filter-controls">
+                <select id="latestStatus" class="cyber-input" onchange="applyLatestFilters()">
+                    <option value="">ALL STATES</option>
+                    <option value="online">ONLINE</option>
+                    <option value="offline">DISCONNECTED</option>
+                </select>
+                <input type="text" id="latestSearch" class="cyber-input" placeholder="SEARCH HOSTNAME"
+                       autocomplete="off" oninput="onLatestSearchInput()">
+                <input type="number" id="latestMinCpu" class="cyber-input" placeholder="MIN CPU %"
+                       min="0" max="100" onchange="applyLatestFilters()">
+                <select id="latestSort" class="cyber-input" onchange="applyLatestFilters()">
+                    <option value="last_seen">SORT: LAST SEEN</option>
+                    <option value="hostname">SORT: HOSTNAME</option>
+                    <option value="cpu">SORT: CPU</option>
+                    <option value="memory">SORT: MEMORY</option>
+                    <option value="disk">SORT: DISK</option>
+                </select>
+            </div>
+        </div>
+        
+        <div id="statusGrid" class="status-grid">
+            <div class="loading">INITIALIZING SYSTEM...</div>
+        </div>
+        <div class="pagination" id="latestPagination" style="display: none; margin: -20px 0 40px; justify-content: center; gap: 10px;">
+            <button class="cyber-btn" onclick="changeLatestPage(-1)" id="latestPrevBtn">PREV</button>
+            <span id="latestPageInfo" style="display: flex; align-items: center; color: var(--text-dim);"></span>
+            <button class="cyber-btn" onclick="changeLatestPage(1)" id="latestNextBtn">NEXT</button>
+        </div>
+        
+        <div class="chart-container glass-panel">
+            <h2 class="section-title"><i class="fas fa-chart-line"></i> SYSTEM ANALYTICS</h2>
+            <canvas id="statusChart" style="max-height: 200px;"></canvas>
+        </div>
+        
+        <div class="history-container glass-panel">
+            <h2 class="section-title"><i class="fas fa-history"></i> DATA LOGS</h2>
+            <div class="filter-controls">
+                <input type="date" id="startDate" class="cyber-input" placeholder="Start Date">
+                <input type="date" id="endDate" class="cyber-input" placeholder="End Date">
+                <input type="text" id="hostnameFilter" class="cyber-input" list="hostnameOptions"
+                       placeholder="ALL HOSTS" autocomplete="off" oninput="onHostnameInput()">
+                <datalist id="hostnameOptions"></datalist>
+                <button class="cyber-btn" onclick="applyFilters()">QUERY</button>
+                <button class="cyber-btn" onclick="resetFilters()">RESET</button>
+            </div>
+            <div id="historyTable">
+                <div class="loading">WAITING FOR DATA...</div>
+            </div>
+            <div class="pagination" id="pagination" style="display: none; margin-top: 20px; justify-content: center; gap: 10px;">
+                <button class="cyber-btn" onclick="changePage(-1)" id="prevBtn">PREV</button>
+                <span id="pageInfo" style="display: flex; align-items: center; color: var(--text-dim);"></span>
+                <button class="cyber-btn" onclick="changePage(1)" id="nextBtn">NEXT</button>
+            </div>
+        </div>
+    </div>
+    
+    <!-- Delete Modal -->
+    <div id="deleteModal" class="modal">
+        <div class="modal-content glass-panel">
+            <div class="modal-header">WARNING: TERMINATION PROTOCOL</div>
+            <div class="modal-body" style="color: #ccc;">
+                Are you sure you want to purge all data for host "<span id="deleteHostname" style="color: #fff; font-weight: bold;"></span>"? This action is irreversible.
+            </div>
+            <div class="modal-footer">
+                <button class="cyber-btn" onclick="closeDeleteModal()">CANCEL</button>
+                <button class="cyber-btn" style="border-color: var(--neon-red); color: var(--neon-red);" onclick="confirmDelete()">CONFIRM PURGE</button>
+            </div>
+        </div>
+    </div>
+    
+    <script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js"></script>
+    <script src="{{ asset_url('dashboard.js') }}"></script>
+</body>
+</html>
+
+'''
+
+# 仪表盘样式（以带内容哈希的文件名 /assets/dashboard.<hash>.css 提供）
+DASHBOARD_CSS = '''
         :root {
             --bg-dark: #050510;
             --card-bg: rgba(20, 20, 35, 0.6);
@@ -785,6 +3270,23 @@ HTML_TEMPLATE = '''
             left: 100%;
         }
 
+        /* Fleet Bar */
+        .fleet-bar {
+            padding: 20px;
+            margin-bottom: 30px;
+        }
+
+        .fleet-summary {
+            display: grid;
+            grid-template-columns: repeat(auto-fill, minmax(140px, 1fr));
+            gap: 15px;
+            margin-bottom: 20px;
+        }
+
+        .fleet-bar .filter-controls {
+            margin-bottom: 0;
+        }
+
         /* Status Grid */
         .status-grid {
             display: grid;
@@ -1167,69 +3669,10 @@ HTML_TEMPLATE = '''
                 font-size: 0.85rem;
             }
         }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header glass-panel">
-            <h1>Nexus Monitor</h1>
-            <div class="header-controls">
-                <div class="refresh-info">
-                    AUTO REFRESH: <span id="autoRefresh">30</span>s
-                </div>
-                <button class="cyber-btn" onclick="loadData()">
-                    <i class="fas fa-sync-alt"></i> REFRESH
-                </button>
-            </div>
-        </div>
-        
-        <div id="statusGrid" class="status-grid">
-            <div class="loading">INITIALIZING SYSTEM...</div>
-        </div>
-        
-        <div class="chart-container glass-panel">
-            <h2 class="section-title"><i class="fas fa-chart-line"></i> SYSTEM ANALYTICS</h2>
-            <canvas id="statusChart" style="max-height: 200px;"></canvas>
-        </div>
-        
-        <div class="history-container glass-panel">
-            <h2 class="section-title"><i class="fas fa-history"></i> DATA LOGS</h2>
-            <div class="filter-controls">
-                <input type="date" id="startDate" class="cyber-input" placeholder="Start Date">
-                <input type="date" id="endDate" class="cyber-input" placeholder="End Date">
-                <select id="hostnameFilter" class="cyber-input">
-                    <option value="">ALL HOSTS</option>
-                </select>
-                <button class="cyber-btn" onclick="applyFilters()">QUERY</button>
-                <button class="cyber-btn" onclick="resetFilters()">RESET</button>
-            </div>
-            <div id="historyTable">
-                <div class="loading">WAITING FOR DATA...</div>
-            </div>
-            <div class="pagination" id="pagination" style="display: none; margin-top: 20px; justify-content: center; gap: 10px;">
-                <button class="cyber-btn" onclick="changePage(-1)" id="prevBtn">PREV</button>
-                <span id="pageInfo" style="display: flex; align-items: center; color: var(--text-dim);"></span>
-                <button class="cyber-btn" onclick="changePage(1)" id="nextBtn">NEXT</button>
-            </div>
-        </div>
-    </div>
-    
-    <!-- Delete Modal -->
-    <div id="deleteModal" class="modal">
-        <div class="modal-content glass-panel">
-            <div class="modal-header">WARNING: TERMINATION PROTOCOL</div>
-            <div class="modal-body" style="color: #ccc;">
-                Are you sure you want to purge all data for host "<span id="deleteHostname" style="color: #fff; font-weight: bold;"></span>"? This action is irreversible.
-            </div>
-            <div class="modal-footer">
-                <button class="cyber-btn" onclick="closeDeleteModal()">CANCEL</button>
-                <button class="cyber-btn" style="border-color: var(--neon-red); color: var(--neon-red);" onclick="confirmDelete()">CONFIRM PURGE</button>
-            </div>
-        </div>
-    </div>
-    
-    <script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js"></script>
-    <script>
+'''
+
+# 仪表盘脚本（/assets/dashboard.<hash>.js）
+DASHBOARD_JS = '''
         // Global Variables
         let autoRefreshInterval;
         let countdown = 30;
@@ -1239,8 +3682,17 @@ HTML_TEMPLATE = '''
         let currentEndDate = null;
         let currentHostname = null;
         let statusChart = null;
-        let allHostnames = [];
+        let hostsVersion = null;
+        let hostsPrefix = '';
+        let hostnameInputTimer = null;
         let deleteTargetHostname = null;
+        // Node grid: one server-side page at a time, cards keyed by hostname
+        let latestPage = 1;
+        const latestPageSize = 60;
+        let latestTotalPages = 1;
+        let latestSearchTimer = null;
+        let latestVersion = null;
+        const latestCards = new Map();
 
         // Utility Functions
         function formatBytes(bytes) {
@@ -1265,107 +3717,238 @@ HTML_TEMPLATE = '''
         Chart.defaults.font.family = "'Rajdhani', sans-serif";
 
         // Main Logic
+        function renderStatusCard(status) {
+            const isOffline = status.status === 'offline';
+            const statusClass = isOffline ? 'offline' : 'online';
+            
+            return `
+                <div class="status-card glass-panel ${statusClass}">
+                    <div class="card-header">
+                        <div>
+                            <div class="hostname">${status.hostname}</div>
+                            <div class="ip-address"><i class="fas fa-network-wired"></i> ${status.local_ip || 'Unknown'}</div>
+                        </div>
+                        <div class="status-badge ${statusClass}">
+                            ${isOffline ? 'DISCONNECTED' : 'ONLINE'}
+                        </div>
+                    </div>
+                    
+                    <div class="card-body">
+                        <div class="metric-group">
+                            <div class="metric-row">
+                                <span class="metric-label"><i class="fas fa-microchip"></i> CPU Load</span>
+                                <span class="metric-value">${status.cpu_percent || 0}%</span>
+                            </div>
+                            <div class="progress-container">
+                                <div class="progress-bar progress-cpu" style="width: ${status.cpu_percent || 0}%"></div>
+                            </div>
+                        </div>
+
+                        <div class="metric-group">
+                            <div class="metric-row">
+                                <span class="metric-label"><i class="fas fa-memory"></i> Memory</span>
+                                <span class="metric-value">${status.memory_percent || 0}%</span>
+                            </div>
+                            <div class="progress-container">
+                                <div class="progress-bar progress-mem" style="width: ${status.memory_percent || 0}%"></div>
+                            </div>
+                            <div style="text-align: right; font-size: 0.75rem; color: var(--text-dim); margin-top: 2px;">
+                                ${formatBytes(status.memory_used_gb)} / ${formatBytes(status.memory_total_gb)}
+                            </div>
+                        </div>
+
+                        <div class="metric-group">
+                            <div class="metric-row">
+                                <span class="metric-label"><i class="fas fa-hdd"></i> Disk</span>
+                                <span class="metric-value">${status.disk_percent || 0}%</span>
+                            </div>
+                            <div class="progress-container">
+                                <div class="progress-bar progress-disk" style="width: ${status.disk_percent || 0}%"></div>
+                            </div>
+                            <div style="text-align: right; font-size: 0.75rem; color: var(--text-dim); margin-top: 2px;">
+                                ${formatBytes(status.disk_used_gb)} / ${formatBytes(status.disk_total_gb)}
+                            </div>
+                        </div>
+
+                        <div class="info-grid">
+                            <div class="mini-stat">
+                                <span class="mini-label">LAST SEEN</span>
+                                <span class="mini-value" style="color: var(--neon-blue)">
+                                    ${formatTime(status.server_timestamp || status.display_timestamp || status.timestamp)}
+                                </span>
+                            </div>
+                            <div class="mini-stat">
+                                <span class="mini-label">UPTIME</span>
+                                <span class="mini-value">${formatUptime(status.uptime_seconds || 0)}</span>
+                            </div>
+                        </div>
+
+                        ${status.minutes_since_last !== undefined && status.minutes_since_last !== null ? `
+                        <div style="margin-top: 10px; font-size: 0.8rem; text-align: center; color: ${status.minutes_since_last > 20 ? 'var(--neon-red)' : 'var(--neon-green)'}">
+                            <i class="fas fa-clock"></i> Last signal: ${Math.round(status.minutes_since_last)} min ago
+                        </div>
+                        ` : ''}
+
+                        <button class="delete-btn" data-hostname="${(status.hostname || '').replace(/"/g, '&quot;')}" onclick="handleDeleteClick(this)" type="button">
+                            <i class="fas fa-trash-alt"></i> PURGE NODE
+                        </button>
+                    </div>
+                </div>
+            `;
+        }
+
+        // Only re-render a card when something it displays has changed
+        function cardSignature(status) {
+            const minutes = status.minutes_since_last;
+            return JSON.stringify({ ...status, minutes_since_last: minutes == null ? null : Math.round(minutes) });
+        }
+
+        function showGridMessage(html) {
+            latestCards.clear();
+            document.getElementById('statusGrid').innerHTML = html;
+        }
+
+        function patchStatusGrid(rows) {
+            const grid = document.getElementById('statusGrid');
+            grid.querySelectorAll('.loading').forEach(el => el.remove());
+            const seen = new Set();
+            rows.forEach((status, index) => {
+                const signature = cardSignature(status);
+                let card = latestCards.get(status.hostname);
+                if (!card || card.signature !== signature) {
+                    const template = document.createElement('template');
+                    template.innerHTML = renderStatusCard(status).trim();
+                    const element = template.content.firstElementChild;
+                    if (card) card.element.replaceWith(element);
+                    card = { element, signature };
+                    latestCards.set(status.hostname, card);
+                }
+                seen.add(status.hostname);
+                if (grid.children[index] !== card.element) {
+                    grid.insertBefore(card.element, grid.children[index] || null);
+                }
+            });
+            for (const [hostname, card] of latestCards) {
+                if (!seen.has(hostname)) {
+                    card.element.remove();
+                    latestCards.delete(hostname);
+                }
+            }
+        }
+
         function loadLatestStatus() {
-            fetch('/api/latest')
+            const params = new URLSearchParams({
+                page: latestPage,
+                page_size: latestPageSize,
+                sort: document.getElementById('latestSort').value
+            });
+            const status = document.getElementById('latestStatus').value;
+            const search = document.getElementById('latestSearch').value.trim();
+            const minCpu = document.getElementById('latestMinCpu').value;
+            if (status) params.append('status', status);
+            if (search) params.append('search', search);
+            if (minCpu !== '') params.append('min_cpu', minCpu);
+
+            fetch(`/api/latest?${params}`)
                 .then(response => response.json())
-                .then(data => {
-                    const grid = document.getElementById('statusGrid');
-                    if (data.length === 0) {
-                        grid.innerHTML = '<div class="loading">NO ACTIVE NODES DETECTED</div>';
+                .then(result => {
+                    if (result.error) throw new Error(result.error);
+                    latestVersion = result.version;
+                    latestTotalPages = result.total_pages;
+                    if (result.total > 0 && latestPage > result.total_pages) {
+                        // Hosts were removed or the filter narrowed: jump to the last page
+                        latestPage = result.total_pages;
+                        loadLatestStatus();
                         return;
                     }
-                    
-                    grid.innerHTML = data.map(status => {
-                        const isOffline = status.status === 'offline';
-                        const statusClass = isOffline ? 'offline' : 'online';
-                        
-                        return `
-                            <div class="status-card glass-panel ${statusClass}">
-                                <div class="card-header">
-                                    <div>
-                                        <div class="hostname">${status.hostname}</div>
-                                        <div class="ip-address"><i class="fas fa-network-wired"></i> ${status.local_ip || 'Unknown'}</div>
-                                    </div>
-                                    <div class="status-badge ${statusClass}">
-                                        ${isOffline ? 'DISCONNECTED' : 'ONLINE'}
-                                    </div>
-                                </div>
-                                
-                                <div class="card-body">
-                                    <div class="metric-group">
-                                        <div class="metric-row">
-                                            <span class="metric-label"><i class="fas fa-microchip"></i> CPU Load</span>
-                                            <span class="metric-value">${status.cpu_percent || 0}%</span>
-                                        </div>
-                                        <div class="progress-container">
-                                            <div class="progress-bar progress-cpu" style="width: ${status.cpu_percent || 0}%"></div>
-                                        </div>
-                                    </div>
-
-                                    <div class="metric-group">
-                                        <div class="metric-row">
-                                            <span class="metric-label"><i class="fas fa-memory"></i> Memory</span>
-                                            <span class="metric-value">${status.memory_percent || 0}%</span>
-                                        </div>
-                                        <div class="progress-container">
-                                            <div class="progress-bar progress-mem" style="width: ${status.memory_percent || 0}%"></div>
-                                        </div>
-                                        <div style="text-align: right; font-size: 0.75rem; color: var(--text-dim); margin-top: 2px;">
-                                            ${formatBytes(status.memory_used_gb)} / ${formatBytes(status.memory_total_gb)}
-                                        </div>
-                                    </div>
-
-                                    <div class="metric-group">
-                                        <div class="metric-row">
-                                            <span class="metric-label"><i class="fas fa-hdd"></i> Disk</span>
-                                            <span class="metric-value">${status.disk_percent || 0}%</span>
-                                        </div>
-                                        <div class="progress-container">
-                                            <div class="progress-bar progress-disk" style="width: ${status.disk_percent || 0}%"></div>
-                                        </div>
-                                        <div style="text-align: right; font-size: 0.75rem; color: var(--text-dim); margin-top: 2px;">
-                                            ${formatBytes(status.disk_used_gb)} / ${formatBytes(status.disk_total_gb)}
-                                        </div>
-                                    </div>
-
-                                    <div class="info-grid">
-                                        <div class="mini-stat">
-                                            <span class="mini-label">LAST SEEN</span>
-                                            <span class="mini-value" style="color: var(--neon-blue)">
-                                                ${formatTime(status.server_timestamp || status.display_timestamp || status.timestamp)}
-                                            </span>
-                                        </div>
-                                        <div class="mini-stat">
-                                            <span class="mini-label">UPTIME</span>
-                                            <span class="mini-value">${formatUptime(status.uptime_seconds || 0)}</span>
-                                        </div>
-                                    </div>
-
-                                    ${status.minutes_since_last !== undefined && status.minutes_since_last !== null ? `
-                                    <div style="margin-top: 10px; font-size: 0.8rem; text-align: center; color: ${status.minutes_since_last > 20 ? 'var(--neon-red)' : 'var(--neon-green)'}">
-                                        <i class="fas fa-clock"></i> Last signal: ${Math.round(status.minutes_since_last)} min ago
-                                    </div>
-                                    ` : ''}
-
-                                    <button class="delete-btn" data-hostname="${(status.hostname || '').replace(/"/g, '&quot;')}" onclick="handleDeleteClick(this)" type="button">
-                                        <i class="fas fa-trash-alt"></i> PURGE NODE
-                                    </button>
-                                </div>
-                            </div>
-                        `;
-                    }).join('');
+                    if (result.total === 0) {
+                        showGridMessage('<div class="loading">NO ACTIVE NODES DETECTED</div>');
+                    } else {
+                        patchStatusGrid(result.data);
+                    }
+                    const pagination = document.getElementById('latestPagination');
+                    pagination.style.display = result.total_pages > 1 ? 'flex' : 'none';
+                    document.getElementById('latestPageInfo').textContent =
+                        `PAGE ${result.page} / ${result.total_pages} (${result.total} NODES)`;
+                    document.getElementById('latestPrevBtn').disabled = result.page <= 1;
+                    document.getElementById('latestNextBtn').disabled = result.page >= result.total_pages;
                 })
                 .catch(error => {
                     console.error('Load failed:', error);
-                    document.getElementById('statusGrid').innerHTML = '<div class="loading" style="color: var(--neon-red)">SYSTEM ERROR: CONNECTION FAILED</div>';
+                    showGridMessage('<div class="loading" style="color: var(--neon-red)">SYSTEM ERROR: CONNECTION FAILED</div>');
                 });
         }
 
+        function loadFleetSummary() {
+            fetch('/api/latest/summary')
+                .then(response => response.json())
+                .then(summary => {
+                    const percent = metric => {
+                        const value = summary.metrics[metric].avg;
+                        return value === null ? '-' : `${value}%`;
+                    };
+                    const items = [
+                        ['TOTAL NODES', summary.total, 'var(--neon-blue)'],
+                        ['ONLINE', summary.online, 'var(--neon-green)'],
+                        ['DISCONNECTED', summary.offline, summary.offline > 0 ? 'var(--neon-red)' : null],
+                        ['AVG CPU', percent('cpu_percent'), null],
+                        ['AVG MEMORY', percent('memory_percent'), null],
+                        ['AVG DISK', percent('disk_percent'), null]
+                    ];
+                    document.getElementById('fleetSummary').innerHTML = items.map(([label, value, color]) => `
+                        <div class="mini-stat">
+                            <span class="mini-label">${label}</span>
+                            <span class="mini-value"${color ? ` style="color: ${color}"` : ''}>${value}</span>
+                        </div>
+                    `).join('');
+                })
+                .catch(error => console.error('Summary failed:', error));
+        }
+
+        // Auto refresh: ask only for what changed since the page was loaded,
+        // and reload the page and summary only when some host reported, switched state or was removed
+        function refreshLatest() {
+            if (!latestVersion) {
+                loadLatestStatus();
+                loadFleetSummary();
+                return;
+            }
+            fetch(`/api/latest?since=${encodeURIComponent(latestVersion)}`)
+                .then(response => response.json())
+                .then(delta => {
+                    if (!delta.reset && delta.data.length === 0 && delta.deleted.length === 0) {
+                        latestVersion = delta.version;
+                        return;
+                    }
+                    loadLatestStatus();
+                    loadFleetSummary();
+                })
+                .catch(error => console.error('Refresh failed:', error));
+        }
+
+        function applyLatestFilters() {
+            latestPage = 1;
+            loadLatestStatus();
+        }
+
+        function onLatestSearchInput() {
+            clearTimeout(latestSearchTimer);
+            latestSearchTimer = setTimeout(applyLatestFilters, 250);
+        }
+
+        function changeLatestPage(delta) {
+            const page = latestPage + delta;
+            if (page < 1 || page > latestTotalPages) return;
+            latestPage = page;
+            loadLatestStatus();
+        }
+
         function loadHistory(page = 1) {
             currentPage = page;
             const params = new URLSearchParams({
                 page: page,
-                page_size: currentPageSize
+                page_size: currentPageSize,
+                fields: 'server_timestamp,hostname,local_ip,status,cpu_percent,memory_percent,disk_percent'
             });
             
             if (currentStartDate) params.append('start_date', currentStartDate);
@@ -1510,24 +4093,37 @@ HTML_TEMPLATE = '''
         }
 
         // Filter & Pagination Logic
-        function updateHostnameFilter() {
-            fetch('/api/latest')
+        // Hostname typeahead: only the hosts matching the typed prefix are fetched;
+        // periodic refreshes send the last version and get a tiny reply when nothing changed
+        function updateHostnameFilter(force = false) {
+            const prefix = document.getElementById('hostnameFilter').value;
+            const params = new URLSearchParams({ prefix: prefix, limit: 50 });
+            if (!force && prefix === hostsPrefix && hostsVersion) params.append('since', hostsVersion);
+            fetch(`/api/hosts?${params}`)
                 .then(response => response.json())
                 .then(data => {
-                    const select = document.getElementById('hostnameFilter');
-                    // Keep current selection if possible
-                    const currentVal = select.value;
-                    allHostnames = [...new Set(data.map(s => s.hostname))];
-                    select.innerHTML = '<option value="">ALL HOSTS</option>' +
-                        allHostnames.map(h => `<option value="${h}">${h}</option>`).join('');
-                    if(allHostnames.includes(currentVal)) select.value = currentVal;
+                    hostsVersion = data.version;
+                    if (data.unchanged) return;
+                    hostsPrefix = prefix;
+                    const options = document.getElementById('hostnameOptions');
+                    options.innerHTML = '';
+                    data.hosts.forEach(h => {
+                        const option = document.createElement('option');
+                        option.value = h;
+                        options.appendChild(option);
+                    });
                 });
         }
 
+        function onHostnameInput() {
+            clearTimeout(hostnameInputTimer);
+            hostnameInputTimer = setTimeout(() => updateHostnameFilter(true), 150);
+        }
+
         function applyFilters() {
             currentStartDate = document.getElementById('startDate').value || null;
             currentEndDate = document.getElementById('endDate').value || null;
-            currentHostname = document.getElementById('hostnameFilter').value || null;
+            currentHostname = document.getElementById('hostnameFilter').value.trim() || null;
             currentPage = 1;
             loadHistory(1);
             loadChart();
@@ -1537,6 +4133,7 @@ HTML_TEMPLATE = '''
             document.getElementById('startDate').value = '';
             document.getElementById('endDate').value = '';
             document.getElementById('hostnameFilter').value = '';
+            updateHostnameFilter(true);
             currentStartDate = null;
             currentEndDate = null;
             currentHostname = null;
@@ -1551,7 +4148,7 @@ HTML_TEMPLATE = '''
         }
 
         function loadData() {
-            loadLatestStatus();
+            refreshLatest();
             loadHistory(currentPage);
             loadChart();
             updateHostnameFilter();
@@ -1623,12 +4220,32 @@ HTML_TEMPLATE = '''
         // Init
         loadData();
         startAutoRefresh();
-    </script>
-</body>
-</html>
-
 '''
 
+def _prebuild(text, mimetype):
+    """把页面或资源编码并预先压缩（gzip，以及安装了 brotli 时的 br）"""
+    body = text.encode('utf-8')
+    prebuilt = {'mimetype': mimetype, 'identity': body, 'etag': hashlib.sha256(body).hexdigest()[:16],
+                'gzip': compress_bytes(body, 'gzip', best=True)}
+    if brotli:
+        prebuilt['br'] = compress_bytes(body, 'br', best=True)
+    return prebuilt
+
+def build_dashboard():
+    """启动时编译一次页面模板：样式和脚本按内容哈希命名，页面中的引用在渲染时写入，之后每次请求直接返回"""
+    assets, urls = {}, {}
+    for name, text, mimetype in (('dashboard.css', DASHBOARD_CSS, 'text/css'),
+                                 ('dashboard.js', DASHBOARD_JS, 'application/javascript')):
+        prebuilt = _prebuild(text, mimetype)
+        stem, ext = name.rsplit('.', 1)
+        hashed = f"{stem}.{prebuilt['etag'][:10]}.{ext}"
+        assets[hashed] = prebuilt
+        urls[name] = f"/assets/{hashed}"
+    html = app.jinja_env.from_string(HTML_TEMPLATE).render(asset_url=urls.__getitem__)
+    return _prebuild(html, 'text/html'), assets
+
+_index_page, _assets = build_dashboard()
+
 def background_checker():
     """后台定期检查断联状态"""
     while True:
@@ -1636,10 +4253,12 @@ def background_checker():
             time.sleep(60)  # 每分钟检查一次
             check_connection_status()
         except Exception as e:
-            print(f"后台检查错误: {e}")
+            logger.error("后台检查错误: %s", e, exc_info=True)
             time.sleep(60)
 
 if __name__ == '__main__':
+    setup_logging()
+    
     # 初始化数据库
     init_database()
     
@@ -1653,10 +4272,10 @@ if __name__ == '__main__':
     checker_thread = Thread(target=background_checker, daemon=True)
     checker_thread.start()
     
-    print("监控服务器启动")
-    print(f"访问 http://localhost:{SERVER_PORT} 查看监控界面")
-    print("PushPlus通知已启用，断联时将自动发送通知")
-    print("按 Ctrl+C 停止服务器")
+    logger.info("监控服务器启动")
+    logger.info("访问 http://localhost:%s 查看监控界面", SERVER_PORT)
+    logger.info("PushPlus通知已启用，断联时将自动发送通知")
+    logger.info("按 Ctrl+C 停止服务器")
     
     app.run(host='0.0.0.0', port=SERVER_PORT, debug=False)
 